@@ -17,11 +17,52 @@ Common bus class for Commissaire.
 """
 
 import json
+import random
+import socket
+import threading
+import time
+import types
 import uuid
 
+from concurrent.futures import Future, TimeoutError
+from queue import Empty
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from kombu import Consumer, Producer, Queue, serialization
+from kombu.exceptions import (
+    EncodeError, OperationalError, SerializerNotInstalled)
+
 from commissaire import constants as C
+from commissaire.bus import binary
 from commissaire.errors import CommissaireError
 
+# Make the compact encoding available to every bus user.
+binary.register()
+
+#: Seconds request() waits for a response unless told otherwise
+REQUEST_TIMEOUT = 10
+#: Request member holding the time, in seconds since the epoch, after
+#: which the caller no longer waits for the response
+DEADLINE_MEMBER = 'deadline'
+
+#: Reply mode using a persistent reply queue per connection
+REPLY_MODE_QUEUE = 'queue'
+#: Reply mode using RabbitMQ direct reply-to
+REPLY_MODE_DIRECT = 'direct'
+#: Reply mode using direct reply-to where the transport supports it
+REPLY_MODE_AUTO = 'auto'
+#: All reply modes
+REPLY_MODES = (REPLY_MODE_AUTO, REPLY_MODE_DIRECT, REPLY_MODE_QUEUE)
+#: Pseudo-queue RabbitMQ sends direct replies to
+DIRECT_REPLY_TO = 'amq.rabbitmq.reply-to'
+#: bus_uri query parameter selecting the reply mode
+REPLY_MODE_PARAMETER = 'reply_mode'
+
+#: Content type of messages kombu decodes as JSON
+_JSON_CONTENT_TYPE = serialization.registry.name_to_type['json']
+# Guards creating the persistent reply queue of a BusMixin.
+_REPLY_QUEUE_LOCK = threading.Lock()
+
 
 class RemoteProcedureCallError(CommissaireError):
     """
@@ -89,6 +130,553 @@ class ContainerManagerError(RemoteProcedureCallError):
         super().__init__(message, code, data)
 
 
+def _decode_payload(payload, content_type, logger=None):
+    """
+    Returns the payload of a response message. kombu already decoded
+    bodies sent with a serializer, so only bodies it left as text are
+    decoded here: text/plain ones, and JSON ones from services which
+    encode their response before handing it to kombu, which encodes it
+    again. Payloads which are not JSON-RPC responses become INVALID_JSON
+    errors.
+
+    :param payload: The message payload as decoded by kombu.
+    :type payload: dict or list or str
+    :param content_type: The content type of the message.
+    :type content_type: str
+    :param logger: Logger noting responses which were encoded twice.
+    :type logger: logging.Logger or None
+    :returns: The decoded payload.
+    :rtype: dict or list
+    """
+    if isinstance(payload, (str, bytes)):
+        if content_type == _JSON_CONTENT_TYPE and logger is not None:
+            logger.debug('Decoding a response which was encoded twice')
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            pass
+    if not isinstance(payload, (dict, list)):
+        payload = {
+            'jsonrpc': '2.0',
+            'id': None,
+            'error': {
+                'code': C.JSONRPC_ERRORS['INVALID_JSON'],
+                'message': 'Response is not a JSON-RPC object: {!r}'.format(
+                    payload)[:200],
+            },
+        }
+    return payload
+
+
+def parse_reply_mode(bus_uri, default=REPLY_MODE_QUEUE):
+    """
+    Splits the reply mode off a bus URI, such as
+    "amqp://127.0.0.1:5672/?reply_mode=direct". The rest of the URI can
+    be handed to kombu.Connection.
+
+    :param bus_uri: The message bus connection URI.
+    :type bus_uri: str
+    :param default: The reply mode if the URI does not name one.
+    :type default: str
+    :returns: The URI without the reply mode and the reply mode.
+    :rtype: tuple
+    :raises: ValueError
+    """
+    parts = urlsplit(bus_uri)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    reply_mode = default
+    remaining = []
+    for key, value in query:
+        if key == REPLY_MODE_PARAMETER:
+            reply_mode = value
+        else:
+            remaining.append((key, value))
+    if reply_mode not in REPLY_MODES:
+        raise ValueError('Unknown reply mode "{}", expected one of: {}'.format(
+            reply_mode, ', '.join(REPLY_MODES)))
+    return urlunsplit(parts._replace(query=urlencode(remaining))), reply_mode
+
+
+class _ReplyQueue(object):
+    """
+    Persistent response queue shared by all requests over a connection.
+
+    Responses are matched to requests by their JSON-RPC id. Only one
+    thread reads the queue at a time; responses for other requests are
+    stashed until their caller looks for them. Responses nobody is
+    waiting for, such as those arriving after a timeout, are dropped.
+    """
+
+    def __init__(self, connection, logger):
+        """
+        Creates a new _ReplyQueue and declares its queue.
+
+        :param connection: Connection to the bus.
+        :type connection: kombu.connection.Connection
+        :param logger: Logger for dropped responses.
+        :type logger: logging.Logger
+        """
+        self.connection = connection
+        self.logger = logger
+        self.name = 'response-{}'.format(uuid.uuid4())
+        self.queue = connection.SimpleQueue(
+            self.name, queue_opts={'auto_delete': True, 'durable': False})
+        #: Producer requests must be published with, or None for any
+        self.producer = None
+        self._pending = {}
+        self._content_types = {}
+        self._waiting = set()
+        self._reading = False
+        self._condition = threading.Condition()
+
+    def expect(self, id):
+        """
+        Registers a request whose response should be kept. Call it before
+        publishing the request.
+
+        :param id: The request id.
+        :type id: str
+        """
+        with self._condition:
+            self._waiting.add(id)
+
+    def forget(self, id):
+        """
+        Unregisters a request, dropping its response if it arrives later.
+
+        :param id: The request id.
+        :type id: str
+        """
+        with self._condition:
+            self._waiting.discard(id)
+            self._pending.pop(id, None)
+            self._content_types.pop(id, None)
+
+    def pop_content_type(self, id):
+        """
+        Returns the content type of the response to a request returned by
+        wait(), and forgets it.
+
+        :param id: The request id.
+        :type id: str
+        :returns: The content type, or None if it is not known.
+        :rtype: str or None
+        """
+        with self._condition:
+            return self._content_types.pop(id, None)
+
+    def _reply_id(self, payload, id):
+        """
+        Returns the request id a response belongs to. Batch responses
+        belong to whichever of their calls is waited for. Responses
+        without an id belong to the request of the reader.
+
+        :param payload: The response payload.
+        :type payload: dict or list
+        :param id: The request id of the reader.
+        :type id: str
+        :returns: The request id.
+        :rtype: str
+        """
+        if isinstance(payload, list):
+            for item in payload:
+                if isinstance(item, dict) and item.get('id') in self._waiting:
+                    return item['id']
+            return id
+        return payload.get('id') or id
+
+    def _read(self, id, timeout):
+        """
+        Reads one response from the queue and stashes it for its request.
+        See _reply_id().
+
+        :param id: The request id of the reader.
+        :type id: str
+        :param timeout: Seconds to wait for a response.
+        :type timeout: float
+        :raises: queue.Empty
+        """
+        payload = content_type = None
+        try:
+            payload, content_type = self._receive(timeout)
+        finally:
+            with self._condition:
+                self._reading = False
+                if payload is not None:
+                    reply_id = self._reply_id(payload, id)
+                    if reply_id in self._waiting:
+                        self._pending[reply_id] = payload
+                        self._content_types[reply_id] = content_type
+                    else:
+                        self.logger.debug(
+                            'Dropping response for unknown id "%s"',
+                            reply_id)
+                self._condition.notify_all()
+
+    def _receive(self, timeout):
+        """
+        Returns the next response payload from the queue and its content
+        type.
+
+        :param timeout: Seconds to wait for a response.
+        :type timeout: float
+        :returns: The response payload and content type.
+        :rtype: tuple
+        :raises: queue.Empty
+        """
+        message = self.queue.get(block=True, timeout=timeout)
+        message.ack()
+        return (_decode_payload(
+            message.payload, message.content_type, self.logger),
+            message.content_type)
+
+    def wait(self, id, timeout):
+        """
+        Returns the response to a request registered with expect(). The
+        request stays registered if no response arrives in time, so the
+        caller may wait again or forget() it.
+
+        :param id: The request id.
+        :type id: str
+        :param timeout: Seconds to wait for the response.
+        :type timeout: float
+        :returns: The response payload.
+        :rtype: dict
+        :raises: queue.Empty
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._condition:
+                while True:
+                    if id in self._pending:
+                        self._waiting.discard(id)
+                        return self._pending.pop(id)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Empty()
+                    if not self._reading:
+                        self._reading = True
+                        break
+                    self._condition.wait(remaining)
+            self._read(id, remaining)
+
+    def close(self):
+        """
+        Closes the queue.
+        """
+        self.queue.close()
+
+
+class _DirectReplyQueue(_ReplyQueue):
+    """
+    Reply queue using RabbitMQ direct reply-to. Responses are sent
+    straight to the consumer of the DIRECT_REPLY_TO pseudo-queue, so no
+    queue is declared. RabbitMQ requires requests to be published on
+    the channel consuming the replies, which is why this class has its
+    own producer.
+
+    Responders must publish their response to the default exchange ("")
+    with the reply_to property of the request as routing key. Responders
+    which instead declare a queue named after reply_to, such as with
+    SimpleQueue(reply_to), are refused by the broker (ACCESS_REFUSED), so
+    use REPLY_MODE_QUEUE with them.
+    """
+
+    def __init__(self, connection, logger, exchange):
+        """
+        Creates a new _DirectReplyQueue and starts consuming replies.
+
+        :param connection: Connection to the bus.
+        :type connection: kombu.connection.Connection
+        :param logger: Logger for dropped responses.
+        :type logger: logging.Logger
+        :param exchange: Exchange requests are published to.
+        :type exchange: kombu.Exchange
+        """
+        self.connection = connection
+        self.logger = logger
+        self.name = DIRECT_REPLY_TO
+        self.channel = connection.channel()
+        try:
+            self.consumer = Consumer(
+                self.channel, queues=[Queue(DIRECT_REPLY_TO, no_ack=True)],
+                callbacks=[self._on_message], no_ack=True)
+            self.consumer.consume()
+        except Exception:
+            self.channel.close()
+            raise
+        self.producer = Producer(self.channel, exchange=exchange)
+        self._received = []
+        self._pending = {}
+        self._content_types = {}
+        self._waiting = set()
+        self._reading = False
+        self._condition = threading.Condition()
+
+    def _on_message(self, body, message):
+        """
+        Consumer callback collecting responses.
+
+        :param body: The decoded message body.
+        :type body: dict or list or str
+        :param message: The message.
+        :type message: kombu.message.Message
+        """
+        self._received.append((
+            _decode_payload(body, message.content_type, self.logger),
+            message.content_type))
+
+    def _receive(self, timeout):
+        """
+        Returns the next response payload and its content type, draining
+        connection events until one arrives.
+
+        :param timeout: Seconds to wait for a response.
+        :type timeout: float
+        :returns: The response payload and content type.
+        :rtype: tuple
+        :raises: queue.Empty
+        """
+        deadline = time.monotonic() + timeout
+        while not self._received:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise Empty()
+            try:
+                self.connection.drain_events(timeout=remaining)
+            except socket.timeout:
+                raise Empty() from None
+        return self._received.pop(0)
+
+    def close(self):
+        """
+        Stops consuming replies and closes the channel.
+        """
+        try:
+            self.consumer.cancel()
+        finally:
+            self.channel.close()
+
+
+def deadline_expired(jsonrpc_msg, now=None):
+    """
+    Returns True if the caller of a request stopped waiting for the
+    response, so a service can drop the request instead of handling it.
+    Requests without a deadline never expire.
+
+    :param jsonrpc_msg: The request message.
+    :type jsonrpc_msg: dict
+    :param now: The current time in seconds since the epoch, or None.
+    :type now: float or None
+    :returns: True if the deadline passed.
+    :rtype: bool
+    """
+    deadline = jsonrpc_msg.get(DEADLINE_MEMBER)
+    if not isinstance(deadline, (int, float)):
+        return False
+    if now is None:
+        now = time.time()
+    return now > deadline
+
+
+def _routing_prefix(routing_key):
+    """
+    Returns the part of a routing key naming the service, without the
+    method.
+
+    :param routing_key: The routing key, such as "storage.get".
+    :type routing_key: str
+    :returns: The routing key prefix, such as "storage".
+    :rtype: str
+    """
+    return routing_key.rsplit('.', 1)[0]
+
+
+def _message_id(jsonrpc_msg):
+    """
+    Returns the id of a request message. Batches are identified by the id
+    of their first call.
+
+    :param jsonrpc_msg: The request message, or a batch of them.
+    :type jsonrpc_msg: dict or list
+    :returns: The id.
+    :rtype: str
+    """
+    if isinstance(jsonrpc_msg, list):
+        jsonrpc_msg = jsonrpc_msg[0]
+    return jsonrpc_msg.get('id')
+
+
+def _error_from_payload(payload):
+    """
+    Returns the exception for a JSON-RPC error response, or None if the
+    response is not an error.
+
+    :param payload: The response payload.
+    :type payload: dict or list
+    :returns: The exception or None.
+    :rtype: RemoteProcedureCallError or None
+    """
+    if not isinstance(payload, dict) or 'error' not in payload:
+        return None
+    error_data = payload['error']
+    message = error_data.get('message', 'Internal error')
+    code = error_data.get('code', C.JSONRPC_ERRORS['INTERNAL_ERROR'])
+    data = error_data.get('data', {})
+    if code == C.JSONRPC_ERRORS['STORAGE_LOOKUP_ERROR']:
+        return StorageLookupError(message, data=data)
+    elif code == C.JSONRPC_ERRORS['CONTAINER_MANAGER_ERROR']:
+        return ContainerManagerError(message, data=data)
+    return RemoteProcedureCallError(message, code, data)
+
+
+class RequestFuture(Future):
+    """
+    Future for the response to a request sent by BusMixin.request_async().
+
+    No thread is dedicated to responses: the first thread asking for the
+    result reads the shared reply queue until the response arrives,
+    stashing responses to other requests on the way. Until then done()
+    is False and callbacks do not run. Waiting on several futures in turn,
+    such as with gather(), therefore takes about as long as the slowest
+    response rather than the sum of them.
+    """
+
+    def __init__(self, bus_mixin, reply_queue, id, timeout=REQUEST_TIMEOUT,
+                 routing_key=None):
+        """
+        Creates a new RequestFuture.
+
+        :param bus_mixin: The object which sent the request.
+        :type bus_mixin: BusMixin
+        :param reply_queue: The reply queue the response arrives on.
+        :type reply_queue: _ReplyQueue
+        :param id: The request id.
+        :type id: str
+        :param timeout: Seconds result() waits by default.
+        :type timeout: float
+        :param routing_key: The routing key the request was sent on.
+        :type routing_key: str or None
+        """
+        super().__init__()
+        self.id = id
+        self.timeout = timeout
+        self.routing_key = routing_key
+        self._bus_mixin = bus_mixin
+        self._reply_queue = reply_queue
+        self._resolve_lock = threading.Lock()
+
+    def _resolve(self, timeout):
+        """
+        Reads the response unless the future is done already.
+
+        :param timeout: Seconds to wait, or None for the request timeout.
+        :type timeout: float or None
+        :raises: concurrent.futures.TimeoutError
+        """
+        if timeout is None:
+            timeout = self.timeout
+        with self._resolve_lock:
+            if self.done():
+                return
+            try:
+                payload = self._reply_queue.wait(self.id, timeout)
+            except Empty:
+                raise TimeoutError() from None
+            self._bus_mixin._note_reply_content_type(
+                self.routing_key, self._reply_queue.pop_content_type(self.id))
+            error = _error_from_payload(payload)
+            if error is None:
+                self.set_result(payload)
+            else:
+                self._bus_mixin.logger.warn(
+                    'Message "%s" contains error: %s',
+                    self.id, payload['error'])
+                self.set_exception(error)
+
+    def result(self, timeout=None):
+        """
+        Returns the response, raising the error of an error response.
+
+        :param timeout: Seconds to wait, or None for the request timeout.
+        :type timeout: float or None
+        :returns: The response payload.
+        :rtype: dict
+        :raises: RemoteProcedureCallError, concurrent.futures.TimeoutError,
+                 concurrent.futures.CancelledError
+        """
+        self._resolve(timeout)
+        return super().result(0)
+
+    def exception(self, timeout=None):
+        """
+        Returns the error of an error response, or None.
+
+        :param timeout: Seconds to wait, or None for the request timeout.
+        :type timeout: float or None
+        :returns: The error or None.
+        :rtype: RemoteProcedureCallError or None
+        :raises: concurrent.futures.TimeoutError,
+                 concurrent.futures.CancelledError
+        """
+        self._resolve(timeout)
+        return super().exception(0)
+
+    def cancel(self):
+        """
+        Stops waiting for the response. A response arriving later is
+        dropped.
+
+        :returns: True if the future was cancelled.
+        :rtype: bool
+        """
+        with self._resolve_lock:
+            cancelled = super().cancel()
+        if cancelled:
+            self._reply_queue.forget(self.id)
+        return cancelled
+
+
+def gather(futures, timeout=REQUEST_TIMEOUT, return_exceptions=False):
+    """
+    Returns the results of futures, in order, waiting at most timeout
+    seconds for all of them together. Futures still pending when time
+    runs out are cancelled.
+
+    If return_exceptions is False the first error is raised once every
+    future is finished or cancelled. Otherwise errors, including
+    concurrent.futures.TimeoutError for cancelled futures, are returned
+    in place of their results.
+
+    :param futures: The futures, such as from BusMixin.request_async().
+    :type futures: iterable
+    :param timeout: Seconds to wait for all results together.
+    :type timeout: float
+    :param return_exceptions: Return errors instead of raising them.
+    :type return_exceptions: bool
+    :returns: The results.
+    :rtype: list
+    :raises: RemoteProcedureCallError, concurrent.futures.TimeoutError
+    """
+    deadline = time.monotonic() + timeout
+    results = []
+    first_error = None
+    for future in futures:
+        try:
+            results.append(future.result(
+                max(0, deadline - time.monotonic())))
+        except TimeoutError as error:
+            future.cancel()
+            results.append(error)
+            first_error = first_error or error
+        except Exception as error:
+            results.append(error)
+            first_error = first_error or error
+    if first_error is not None and not return_exceptions:
+        raise first_error
+    return results
+
+
 class BusMixin:
     """
     Common methods for classes which utilize the Commissaire bus.
@@ -113,21 +701,545 @@ class BusMixin:
         """
         return str(uuid.uuid4())
 
-    def request(self, routing_key, params={}, **kwargs):
+    #: Seconds to wait for responses by routing key, overriding
+    #: REQUEST_TIMEOUT. The default is read-only since it is shared by
+    #: every instance; assign a dict to an instance or subclass instead.
+    request_timeouts = types.MappingProxyType({})
+    #: Routing keys of methods which are safe to call more than once
+    idempotent_routing_keys = frozenset(('storage.get', 'storage.list'))
+    #: How many times request() retries idempotent methods
+    request_retries = 2
+    #: Seconds of the first retry backoff, which doubles on each retry
+    retry_backoff = 0.1
+    #: Most seconds to back off between retries
+    retry_backoff_max = 2.0
+
+    def _timeout_for(self, routing_key, timeout=None):
         """
-        Sends a request to a simple queue. Requests create the initial response
-        queue and wait for a response.
+        Returns the timeout of a request: the one given, or the one for
+        the routing key in request_timeouts, or REQUEST_TIMEOUT.
+
+        :param routing_key: The routing key to publish on.
+        :type routing_key: str
+        :param timeout: Seconds to wait for the response, or None.
+        :type timeout: float or None
+        :returns: Seconds to wait for the response.
+        :rtype: float
+        """
+        if timeout is None:
+            timeout = self.request_timeouts.get(routing_key, REQUEST_TIMEOUT)
+        return timeout
+
+    def _backoff(self, attempt):
+        """
+        Returns the seconds to wait before a retry: a random fraction of
+        an exponentially growing backoff ("full jitter"), so callers
+        retrying at the same time spread out.
+
+        :param attempt: The number of failed attempts so far, from 1.
+        :type attempt: int
+        :returns: Seconds to wait.
+        :rtype: float
+        """
+        return random.uniform(0, min(
+            self.retry_backoff_max,
+            self.retry_backoff * 2 ** (attempt - 1)))
+
+    def _jsonrpc_message(self, routing_key, params, deadline):
+        """
+        Returns a new request message carrying the deadline of the caller.
 
         :param routing_key: The routing key to publish on.
         :type routing_key: str
         :param params: Keyword parameters to pass to the remote method.
         :type params: dict
+        :param deadline: The time.monotonic() value at which the caller
+                         stops waiting for the response.
+        :type deadline: float
+        :returns: The request message.
+        :rtype: dict
+        """
+        # Deadlines are kept on the monotonic clock so changes to the
+        # system clock do not move them. Services run in other processes,
+        # so the message carries the deadline as seconds since the epoch.
+        return {
+            'jsonrpc': '2.0',
+            'id': self.create_id(),
+            'method': routing_key.split('.')[-1],
+            'params': params,
+            DEADLINE_MEMBER: time.time() + deadline - time.monotonic(),
+        }
+
+    def request(self, routing_key, params={}, serializer=None, timeout=None,
+                **kwargs):
+        """
+        Sends a request to a simple queue and waits for a response.
+
+        Responses arrive on a reply queue which is created by the first
+        request and shared by every later request over the same
+        connection; see close_reply_queue(). Passing SimpleQueue keyword
+        arguments creates a response queue just for this request instead.
+
+        By default requests are sent as JSON. Passing a serializer name,
+        such as commissaire.bus.binary.SERIALIZER, opts in to it: requests
+        still go out as JSON but list the content types the response may
+        use in their "accept" header, preferred first. Once a service has
+        answered with that content type, later requests to it are encoded
+        with the serializer too, falling back to JSON if it can not encode
+        them. See _publish_request().
+
+        The request waits timeout seconds for the response, or as long as
+        request_timeouts gives for the routing key, or REQUEST_TIMEOUT.
+        The message carries the resulting deadline; see
+        deadline_expired(). Requests for idempotent_routing_keys are
+        retried request_retries times after timeouts and connection
+        errors, with a jittered exponential backoff in between. Retries
+        share the deadline of the first attempt: each waits only for the
+        time left, and no retry is sent once the backoff would pass it.
+
+        :param routing_key: The routing key to publish on.
+        :type routing_key: str
+        :param params: Keyword parameters to pass to the remote method.
+        :type params: dict
+        :param serializer: Name of a kombu serializer to use, or None.
+        :type serializer: str or None
+        :param timeout: Seconds to wait for the response, or None.
+        :type timeout: float or None
         :param kwargs: Keyword arguments to pass to SimpleQueue
         :type kwargs: dict
         :returns: Result
         :rtype: tuple
+        :raises: RemoteProcedureCallError, queue.Empty,
+                 kombu.exceptions.OperationalError
+        """
+        timeout = self._timeout_for(routing_key, timeout)
+        deadline = time.monotonic() + timeout
+        retries = 0
+        if routing_key in self.idempotent_routing_keys:
+            retries = self.request_retries
+        attempt = 0
+        while True:
+            try:
+                return self._request_once(
+                    routing_key, params, serializer, timeout, dict(kwargs))
+            except (Empty, OperationalError) as error:
+                attempt += 1
+                if attempt > retries:
+                    raise
+                delay = self._backoff(attempt)
+                timeout = deadline - time.monotonic() - delay
+                if timeout <= 0:
+                    raise
+                self.logger.warn(
+                    'Retrying "%s" in %.2f seconds after attempt %s '
+                    'failed: %r', routing_key, delay, attempt, error)
+                time.sleep(delay)
+
+    def _request_once(self, routing_key, params, serializer, timeout,
+                      kwargs):
         """
-        id = self.create_id()
+        Sends a request and waits for the response. See request().
+
+        :param routing_key: The routing key to publish on.
+        :type routing_key: str
+        :param params: Keyword parameters to pass to the remote method.
+        :type params: dict
+        :param serializer: Name of a kombu serializer to use, or None.
+        :type serializer: str or None
+        :param timeout: Seconds to wait for the response.
+        :type timeout: float
+        :param kwargs: Keyword arguments to pass to SimpleQueue
+        :type kwargs: dict
+        :returns: Result
+        :rtype: dict
+        :raises: RemoteProcedureCallError, queue.Empty
+        """
+        if not kwargs:
+            future = self.request_async(
+                routing_key, params=params, serializer=serializer,
+                timeout=timeout)
+            try:
+                return future.result()
+            except TimeoutError:
+                future.cancel()
+                raise Empty() from None
+
+        jsonrpc_msg = self._jsonrpc_message(
+            routing_key, params, time.monotonic() + timeout)
+        id = jsonrpc_msg['id']
+        self.logger.debug(
+            'jsonrpc message for id "%s": "%s"', id, jsonrpc_msg)
+        payload = self._request_with_queue(
+            jsonrpc_msg, routing_key, serializer, timeout, **kwargs)
+
+        error = _error_from_payload(payload)
+        if error is not None:
+            self.logger.warn(
+                'Message "%s" contains error: %s', id, payload['error'])
+            raise error
+
+        return payload
+
+    def request_async(self, routing_key, params={}, serializer=None,
+                      timeout=None):
+        """
+        Sends a request like request() and returns a future for the
+        response instead of waiting for it. Any number of requests can be
+        in flight at once; they share the reply queue of the connection.
+        See RequestFuture and gather(). Requests are not retried.
+
+        :param routing_key: The routing key to publish on.
+        :type routing_key: str
+        :param params: Keyword parameters to pass to the remote method.
+        :type params: dict
+        :param serializer: Name of a kombu serializer to use, or None.
+        :type serializer: str or None
+        :param timeout: Seconds result() waits by default, or None.
+        :type timeout: float or None
+        :returns: The future for the response.
+        :rtype: RequestFuture
+        """
+        timeout = self._timeout_for(routing_key, timeout)
+        jsonrpc_msg = self._jsonrpc_message(
+            routing_key, params, time.monotonic() + timeout)
+        id = jsonrpc_msg['id']
+        self.logger.debug(
+            'jsonrpc message for id "%s": "%s"', id, jsonrpc_msg)
+        reply_queue = self._get_reply_queue()
+        reply_queue.expect(id)
+        try:
+            self._publish_request(
+                jsonrpc_msg, routing_key, serializer, reply_queue.name,
+                reply_queue.producer)
+        except Exception:
+            reply_queue.forget(id)
+            raise
+        self.logger.debug(
+            'Sent message id "%s" to "%s"', id, reply_queue.name)
+        return RequestFuture(self, reply_queue, id, timeout, routing_key)
+
+    #: Routing key prefixes of services which answer JSON-RPC 2.0 batches
+    #: published to "<prefix>.batch". Batches for other services are sent
+    #: one call at a time.
+    batch_prefixes = frozenset()
+
+    def request_batch(self, calls, serializer=None, return_exceptions=False,
+                      timeout=None):
+        """
+        Sends several requests to one service and returns their
+        responses, in order.
+
+        The calls must share everything in their routing keys but the
+        method. If that prefix is in batch_prefixes the calls are sent as
+        a single JSON-RPC 2.0 batch message published to the prefix
+        followed by ".batch". If the service answers the batch with a
+        "method not found" or "invalid request" error, none of the calls
+        were run and they are sent one by one with request_async() in the
+        time left. Batches which are not answered in time are not sent
+        again, since the service may have run some of the calls. All of
+        this shares one deadline.
+
+        If return_exceptions is False the first error is raised.
+        Otherwise errors are returned in place of their responses.
+
+        :param calls: (routing key, params) pairs.
+        :type calls: list
+        :param serializer: Name of a kombu serializer to use, or None.
+        :type serializer: str or None
+        :param return_exceptions: Return errors instead of raising them.
+        :type return_exceptions: bool
+        :param timeout: Seconds to wait for the responses, or None for
+                        the longest timeout of the calls.
+        :type timeout: float or None
+        :returns: The response payloads.
+        :rtype: list
+        :raises: ValueError, RemoteProcedureCallError, queue.Empty
+        """
+        if not calls:
+            return []
+        prefixes = set(_routing_prefix(key) for key, _ in calls)
+        if len(prefixes) != 1:
+            raise ValueError(
+                'Batched calls must share a routing key prefix, '
+                'got {}'.format(', '.join(sorted(prefixes))))
+        if timeout is None:
+            timeout = max(self._timeout_for(key) for key, _ in calls)
+        prefix = prefixes.pop()
+        if prefix not in self.batch_prefixes:
+            return self._request_unbatched(
+                calls, serializer, return_exceptions, timeout)
+        deadline = time.monotonic() + timeout
+        batch = [self._jsonrpc_message(key, params, deadline)
+                 for key, params in calls]
+        routing_key = prefix + '.batch'
+        self.logger.debug('jsonrpc batch message: "%s"', batch)
+
+        id = _message_id(batch)
+        reply_queue = self._get_reply_queue()
+        reply_queue.expect(id)
+        try:
+            self._publish_request(
+                batch, routing_key, serializer, reply_queue.name,
+                reply_queue.producer)
+        except Exception:
+            reply_queue.forget(id)
+            raise
+        future = RequestFuture(self, reply_queue, id, timeout, routing_key)
+        try:
+            payload = future.result()
+        except TimeoutError:
+            future.cancel()
+            raise Empty() from None
+        except RemoteProcedureCallError as error:
+            if error.code not in (C.JSONRPC_ERRORS['METHOD_NOT_FOUND'],
+                                  C.JSONRPC_ERRORS['INVALID_REQUEST']):
+                raise
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise Empty() from None
+            self.logger.warn(
+                'Batches are not supported on "%s", sending calls one by '
+                'one: %s', routing_key, error)
+            return self._request_unbatched(
+                calls, serializer, return_exceptions, remaining)
+        return self._batch_results(batch, payload, return_exceptions)
+
+    def _batch_results(self, batch, payload, return_exceptions):
+        """
+        Returns the responses to a batch in the order of its requests.
+        See request_batch().
+
+        :param batch: The request messages.
+        :type batch: list
+        :param payload: The batch response payload.
+        :type payload: dict or list
+        :param return_exceptions: Return errors instead of raising them.
+        :type return_exceptions: bool
+        :returns: The response payloads.
+        :rtype: list
+        :raises: RemoteProcedureCallError
+        """
+        if isinstance(payload, dict):
+            payload = [payload]
+        responses = {}
+        for response in payload:
+            if isinstance(response, dict):
+                responses[response.get('id')] = response
+        results = []
+        first_error = None
+        for jsonrpc_msg in batch:
+            response = responses.get(jsonrpc_msg['id'])
+            if response is None:
+                error = RemoteProcedureCallError(
+                    'No response for id "{}" in batch'.format(
+                        jsonrpc_msg['id']),
+                    C.JSONRPC_ERRORS['INTERNAL_ERROR'])
+            else:
+                error = _error_from_payload(response)
+            if error is not None:
+                self.logger.warn(
+                    'Message "%s" contains error: %s',
+                    jsonrpc_msg['id'], error)
+                first_error = first_error or error
+            results.append(response if error is None else error)
+        if first_error is not None and not return_exceptions:
+            raise first_error
+        return results
+
+    def _request_unbatched(self, calls, serializer, return_exceptions,
+                           timeout):
+        """
+        Sends the calls of a batch one by one. See request_batch().
+
+        :param calls: (routing key, params) pairs.
+        :type calls: list
+        :param serializer: Name of a kombu serializer to use, or None.
+        :type serializer: str or None
+        :param return_exceptions: Return errors instead of raising them.
+        :type return_exceptions: bool
+        :param timeout: Seconds to wait for the responses.
+        :type timeout: float
+        :returns: The response payloads.
+        :rtype: list
+        :raises: RemoteProcedureCallError, queue.Empty
+        """
+        try:
+            return gather(
+                [self.request_async(key, params, serializer, timeout)
+                 for key, params in calls],
+                timeout, return_exceptions)
+        except TimeoutError:
+            raise Empty() from None
+
+    #: How responses reach requests: REPLY_MODE_QUEUE, REPLY_MODE_DIRECT
+    #: or REPLY_MODE_AUTO. See parse_reply_mode(). Direct reply-to is
+    #: opt-in since responders must publish to the default exchange with
+    #: the reply_to property as routing key; see _DirectReplyQueue.
+    reply_mode = REPLY_MODE_QUEUE
+
+    def _get_reply_queue(self):
+        """
+        Returns the reply queue for the current connection, creating it
+        if needed.
+
+        :returns: The reply queue.
+        :rtype: _ReplyQueue
+        """
+        reply_queue = self._current_reply_queue()
+        if reply_queue is None:
+            with _REPLY_QUEUE_LOCK:
+                reply_queue = self._current_reply_queue()
+                if reply_queue is None:
+                    reply_queue = self._create_reply_queue()
+                    self.logger.debug(
+                        'Created reply queue "%s"', reply_queue.name)
+                    self._reply_queue = reply_queue
+        return reply_queue
+
+    def _current_reply_queue(self):
+        """
+        Returns the reply queue if it belongs to the current connection.
+
+        :returns: The reply queue, or None.
+        :rtype: _ReplyQueue or None
+        """
+        reply_queue = getattr(self, '_reply_queue', None)
+        if getattr(reply_queue, 'connection', None) is self.connection:
+            return reply_queue
+        return None
+
+    def _create_reply_queue(self):
+        """
+        Creates a reply queue for the reply mode. Direct reply-to is used
+        on AMQP transports; elsewhere, or if the broker refuses it, a
+        persistent reply queue is used instead.
+
+        :returns: The reply queue.
+        :rtype: _ReplyQueue
+        """
+        mode = self.reply_mode
+        if mode != REPLY_MODE_QUEUE:
+            driver_type = getattr(
+                self.connection.transport, 'driver_type', None)
+            if driver_type == 'amqp':
+                try:
+                    return _DirectReplyQueue(
+                        self.connection, self.logger, self.producer.exchange)
+                except Exception as error:
+                    reason = error
+            else:
+                reason = 'not supported by the {} transport'.format(
+                    driver_type)
+            log = (self.logger.warn if mode == REPLY_MODE_DIRECT
+                   else self.logger.debug)
+            log('Direct reply-to unavailable, using a reply queue: %s',
+                reason)
+        return _ReplyQueue(self.connection, self.logger)
+
+    def close_reply_queue(self):
+        """
+        Closes the persistent reply queue, if one was created. The next
+        request creates a new one.
+        """
+        with _REPLY_QUEUE_LOCK:
+            reply_queue = getattr(self, '_reply_queue', None)
+            self._reply_queue = None
+        if reply_queue is not None:
+            self.logger.debug('Closing queue %s', reply_queue.name)
+            reply_queue.close()
+
+    def _publish_request(self, jsonrpc_msg, routing_key, serializer,
+                         reply_to, producer=None):
+        """
+        Publishes a request message.
+
+        Requests are encoded with a serializer other than JSON only once
+        the service on the routing key prefix has answered with its
+        content type, so services which do not know it keep getting JSON.
+        Until then the request is sent as JSON and advertises the content
+        type in its "accept" header.
+
+        :param jsonrpc_msg: The request message, or a batch of them.
+        :type jsonrpc_msg: dict or list
+        :param routing_key: The routing key to publish on.
+        :type routing_key: str
+        :param serializer: Name of a kombu serializer to use, or None.
+        :type serializer: str or None
+        :param reply_to: Name of the queue to send the response to.
+        :type reply_to: str
+        :param producer: Producer to publish with instead of self.producer.
+        :type producer: kombu.messaging.Producer or None
+        """
+        producer = producer or self.producer
+        publish_kwargs = {
+            'declare': [self._exchange],
+            'reply_to': reply_to,
+            'correlation_id': _message_id(jsonrpc_msg),
+        }
+        if serializer is None or serializer == 'json':
+            producer.publish(jsonrpc_msg, routing_key, **publish_kwargs)
+            return
+        content_type = serialization.registry.name_to_type.get(serializer)
+        negotiated = self._reply_content_types().get(
+            _routing_prefix(routing_key))
+        if content_type is not None and content_type != negotiated:
+            producer.publish(
+                jsonrpc_msg, routing_key,
+                headers={'accept': [content_type, _JSON_CONTENT_TYPE]},
+                **publish_kwargs)
+            return
+        self._publish_with_fallback(
+            jsonrpc_msg, routing_key, serializer, producer=producer,
+            **publish_kwargs)
+
+    def _reply_content_types(self):
+        """
+        Returns the content types services last answered with, by routing
+        key prefix, creating the mapping if needed.
+
+        :returns: Content types by routing key prefix.
+        :rtype: dict
+        """
+        content_types = getattr(self, '_content_types', None)
+        if content_types is None:
+            content_types = self._content_types = {}
+        return content_types
+
+    def _note_reply_content_type(self, routing_key, content_type):
+        """
+        Records the content type of a response so later requests to the
+        same service can use it. See _publish_request().
+
+        :param routing_key: The routing key the request was sent on.
+        :type routing_key: str or None
+        :param content_type: The content type of the response, or None.
+        :type content_type: str or None
+        """
+        if routing_key is not None and content_type is not None:
+            self._reply_content_types()[
+                _routing_prefix(routing_key)] = content_type
+
+    def _request_with_queue(self, jsonrpc_msg, routing_key, serializer,
+                            timeout, **kwargs):
+        """
+        Sends a request with a response queue created just for it and
+        returns the response payload.
+
+        :param jsonrpc_msg: The request message.
+        :type jsonrpc_msg: dict
+        :param routing_key: The routing key to publish on.
+        :type routing_key: str
+        :param serializer: Name of a kombu serializer to use, or None.
+        :type serializer: str or None
+        :param timeout: Seconds to wait for the response.
+        :type timeout: float
+        :param kwargs: Keyword arguments to pass to SimpleQueue
+        :type kwargs: dict
+        :returns: The response payload.
+        :rtype: dict
+        :raises: queue.Empty
+        """
+        id = jsonrpc_msg['id']
         response_queue_name = 'response-{}'.format(id)
         self.logger.debug('Creating response queue "%s"', response_queue_name)
         queue_opts = {
@@ -143,56 +1255,60 @@ class BusMixin:
             response_queue_name,
             queue_opts=queue_opts,
             **kwargs)
+        try:
+            self._publish_request(
+                jsonrpc_msg, routing_key, serializer, response_queue_name)
+            self.logger.debug(
+                'Sent message id "%s" to "%s". Waiting on response...',
+                id, response_queue_name)
 
-        method = routing_key.split('.')[-1]
-
-        jsonrpc_msg = {
-            'jsonrpc': '2.0',
-            'id': id,
-            'method': method,
-            'params': params,
-        }
-        self.logger.debug(
-            'jsonrpc message for id "%s": "%s"', id, jsonrpc_msg)
-
-        self.producer.publish(
-            jsonrpc_msg,
-            routing_key,
-            declare=[self._exchange],
-            reply_to=response_queue_name)
-
-        self.logger.debug(
-            'Sent message id "%s" to "%s". Waiting on response...',
-            id, response_queue_name)
-
-        result = response_queue.get(block=True, timeout=10)
-        result.ack()
-
-        payload = result.payload
-        if isinstance(payload, str):
-            payload = json.loads(payload)
-
-        self.logger.debug(
-            'Result retrieved from response queue "%s": result="%s"',
-            response_queue_name, result)
-        self.logger.debug('Closing queue %s', response_queue_name)
-        response_queue.close()
+            result = response_queue.get(block=True, timeout=timeout)
+            result.ack()
+            self.logger.debug(
+                'Result retrieved from response queue "%s": result="%s"',
+                response_queue_name, result)
+        finally:
+            self.logger.debug('Closing queue %s', response_queue_name)
+            response_queue.close()
+        self._note_reply_content_type(routing_key, result.content_type)
+        return _decode_payload(
+            result.payload, result.content_type, self.logger)
 
-        if 'error' in payload:
-            error_data = payload['error']
-            self.logger.warn(
-                'Message "%s" contains error: %s', id, error_data)
-            message = error_data.get('message', 'Internal error')
-            code = error_data.get('code', C.JSONRPC_ERRORS['INTERNAL_ERROR'])
-            data = error_data.get('data', {})
-            if code == C.JSONRPC_ERRORS['STORAGE_LOOKUP_ERROR']:
-                raise StorageLookupError(message, data=data)
-            elif code == C.JSONRPC_ERRORS['CONTAINER_MANAGER_ERROR']:
-                raise ContainerManagerError(message, data=data)
-            else:
-                raise RemoteProcedureCallError(message, code, data)
+    def _publish_with_fallback(self, message, routing_key, serializer,
+                               producer=None, **kwargs):
+        """
+        Publishes a message with a serializer other than JSON, falling back
+        to JSON if the serializer is not installed or can not encode the
+        message.
 
-        return payload
+        :param message: The message to publish.
+        :type message: dict or list
+        :param routing_key: The routing key to publish on.
+        :type routing_key: str
+        :param serializer: Name of a kombu serializer.
+        :type serializer: str
+        :param producer: Producer to publish with instead of self.producer.
+        :type producer: kombu.messaging.Producer or None
+        :param kwargs: Keyword arguments to pass to Producer.publish
+        :type kwargs: dict
+        """
+        producer = producer or self.producer
+        content_type = serialization.registry.name_to_type.get(serializer)
+        if content_type is None:
+            reason = 'serializer is not installed'
+        else:
+            try:
+                producer.publish(
+                    message, routing_key, serializer=serializer,
+                    headers={'accept': [content_type, 'application/json']},
+                    **kwargs)
+                return
+            except (EncodeError, SerializerNotInstalled) as error:
+                reason = error
+        self.logger.warn(
+            'Unable to send message id "%s" as %s, using json: %s',
+            _message_id(message), serializer, reason)
+        producer.publish(message, routing_key, **kwargs)
 
     def notify(self, routing_key, params={}):
         """
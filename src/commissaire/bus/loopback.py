@@ -0,0 +1,369 @@
+# Copyright (C) 2017  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+In-process bus transport for services running in one process.
+"""
+
+import copy
+import threading
+import time
+
+from concurrent.futures import Future
+
+from commissaire import constants as C
+from commissaire.bus import (
+    BusMixin, RemoteProcedureCallError, _error_from_payload, gather)
+
+
+def topic_matches(pattern, routing_key):
+    """
+    Returns True if a routing key matches a binding pattern the way an
+    AMQP topic exchange matches them: "*" matches exactly one word and
+    "#" matches zero or more words.
+
+    :param pattern: The binding pattern, such as "notify.storage.*.*".
+    :type pattern: str
+    :param routing_key: The routing key of a message.
+    :type routing_key: str
+    :returns: True if the routing key matches.
+    :rtype: bool
+    """
+    def match(words, keys):
+        if not words:
+            return not keys
+        if words[0] == '#':
+            return any(match(words[1:], keys[i:])
+                       for i in range(len(keys) + 1))
+        if not keys or words[0] not in ('*', keys[0]):
+            return False
+        return match(words[1:], keys[1:])
+    return match(pattern.split('.'), routing_key.split('.'))
+
+
+class LoopbackMessage(object):
+    """
+    Stands in for the kombu message handed to handlers and callbacks.
+    """
+
+    def __init__(self, payload, routing_key, properties=None):
+        """
+        Creates a new LoopbackMessage.
+
+        :param payload: The message body.
+        :type payload: mixed
+        :param routing_key: The routing key the message was sent on.
+        :type routing_key: str
+        :param properties: The message properties, or None.
+        :type properties: dict or None
+        """
+        self.payload = payload
+        self.delivery_info = {'routing_key': routing_key}
+        self.properties = properties or {}
+        self.acknowledged = False
+
+    def ack(self):
+        """
+        Acknowledges the message. Nothing is redelivered either way.
+        """
+        self.acknowledged = True
+
+
+def _error_response(id, error):
+    """
+    Returns the JSON-RPC error response for an exception raised by a
+    handler. RemoteProcedureCallErrors, such as StorageLookupError and
+    ContainerManagerError, keep their code and data so the caller raises
+    the same class again.
+
+    :param id: The request id.
+    :type id: str
+    :param error: The exception.
+    :type error: Exception
+    :returns: The error response.
+    :rtype: dict
+    """
+    code = C.JSONRPC_ERRORS['INTERNAL_ERROR']
+    message = str(error)
+    data = {'exception': str(type(error))}
+    if isinstance(error, RemoteProcedureCallError):
+        code, message, data = error.code, error.message, error.data
+    return {
+        'jsonrpc': '2.0',
+        'id': id,
+        'error': {'code': code, 'message': message, 'data': data},
+    }
+
+
+class LoopbackRouter(object):
+    """
+    Routes requests and notifications between objects in one process.
+
+    Services are registered under the routing key prefix they serve, such
+    as "storage", and requests for "storage.get" call their on_get()
+    method like CommissaireService does. Notification callbacks are
+    subscribed with AMQP topic patterns. Messages are handed over as they
+    are, without being serialized, so handlers and callbacks must not
+    change them. Results are copied, so callers never share objects
+    with the handler, as they would not over the bus.
+    """
+
+    def __init__(self):
+        """
+        Creates a new LoopbackRouter.
+        """
+        self._services = {}
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def register_service(self, prefix, service):
+        """
+        Registers the object serving requests for a routing key prefix,
+        replacing any previous one.
+
+        :param prefix: The routing key prefix, such as "storage".
+        :type prefix: str
+        :param service: Object with an on_METHOD method per method.
+        :type service: object
+        """
+        with self._lock:
+            self._services[prefix] = service
+
+    def unregister_service(self, prefix):
+        """
+        Forgets the object serving requests for a routing key prefix.
+
+        :param prefix: The routing key prefix, such as "storage".
+        :type prefix: str
+        """
+        with self._lock:
+            self._services.pop(prefix, None)
+
+    def subscribe(self, pattern, callback):
+        """
+        Subscribes a callback to notifications. It is called with the
+        message body and a LoopbackMessage, like a kombu consumer callback.
+
+        :param pattern: The binding pattern, such as "notify.storage.*.*".
+        :type pattern: str
+        :param callback: The callback.
+        :type callback: callable
+        """
+        with self._lock:
+            self._subscribers.append((pattern, callback))
+
+    def unsubscribe(self, pattern, callback):
+        """
+        Unsubscribes a callback subscribed with subscribe().
+
+        :param pattern: The binding pattern it was subscribed with.
+        :type pattern: str
+        :param callback: The callback.
+        :type callback: callable
+        """
+        with self._lock:
+            self._subscribers = [
+                subscriber for subscriber in self._subscribers
+                if subscriber != (pattern, callback)]
+
+    def dispatch(self, routing_key, jsonrpc_msg):
+        """
+        Calls the handler of a request and returns the JSON-RPC response
+        with a deep copy of its result. Exceptions raised by the handler
+        become error responses.
+
+        :param routing_key: The routing key of the request.
+        :type routing_key: str
+        :param jsonrpc_msg: The request message.
+        :type jsonrpc_msg: dict
+        :returns: The response message.
+        :rtype: dict
+        """
+        id = jsonrpc_msg.get('id')
+        prefix = routing_key.rsplit('.', 1)[0]
+        service = self._services.get(prefix)
+        handler = getattr(
+            service, 'on_{}'.format(jsonrpc_msg['method']), None)
+        if handler is None:
+            return {
+                'jsonrpc': '2.0',
+                'id': id,
+                'error': {
+                    'code': C.JSONRPC_ERRORS['METHOD_NOT_FOUND'],
+                    'message': 'No handler for "{}"'.format(routing_key),
+                    'data': {},
+                },
+            }
+        message = LoopbackMessage(
+            jsonrpc_msg, routing_key, {'correlation_id': id})
+        try:
+            result = handler(message, **jsonrpc_msg.get('params', {}))
+        except Exception as error:
+            return _error_response(id, error)
+        return {'jsonrpc': '2.0', 'id': id, 'result': copy.deepcopy(result)}
+
+    def publish(self, routing_key, body):
+        """
+        Calls the callbacks subscribed to a notification, in the order
+        they were subscribed. Callback exceptions are not caught.
+
+        :param routing_key: The routing key of the notification.
+        :type routing_key: str
+        :param body: The message body.
+        :type body: mixed
+        :returns: The number of callbacks called.
+        :rtype: int
+        """
+        callbacks = [callback for pattern, callback in self._subscribers
+                     if topic_matches(pattern, routing_key)]
+        for callback in callbacks:
+            callback(body, LoopbackMessage(body, routing_key))
+        return len(callbacks)
+
+
+#: Router shared by everything in the process which opts in
+PROCESS_ROUTER = LoopbackRouter()
+
+
+class LoopbackBusMixin(BusMixin):
+    """
+    BusMixin which sends requests and notifications through a
+    LoopbackRouter instead of a broker.
+
+    Requests keep their JSON-RPC form, including the deadline, and error
+    responses raise the same exceptions as BusMixin.request() does, but
+    handlers run in the calling thread and nothing is serialized. The
+    serializer and SimpleQueue arguments of requests are ignored, and
+    requests are never retried.
+
+    The mixed class requires the following:
+
+    :param logger: The class level logger.
+    :type logging: logging.Logger
+    :param router: The router to use, PROCESS_ROUTER by default.
+    :type router: LoopbackRouter
+    """
+
+    router = PROCESS_ROUTER
+
+    def request(self, routing_key, params={}, serializer=None, timeout=None,
+                **kwargs):
+        """
+        Calls the handler of a request and returns its response.
+
+        :param routing_key: The routing key of the request.
+        :type routing_key: str
+        :param params: Keyword parameters to pass to the handler.
+        :type params: dict
+        :param serializer: Ignored.
+        :type serializer: str or None
+        :param timeout: Seconds until the deadline of the request, or None.
+        :type timeout: float or None
+        :param kwargs: Ignored.
+        :type kwargs: dict
+        :returns: Result
+        :rtype: dict
+        :raises: RemoteProcedureCallError
+        """
+        jsonrpc_msg = self._jsonrpc_message(
+            routing_key, params,
+            time.monotonic() + self._timeout_for(routing_key, timeout))
+        self.logger.debug(
+            'jsonrpc loopback message for id "%s": "%s"',
+            jsonrpc_msg['id'], jsonrpc_msg)
+        payload = self.router.dispatch(routing_key, jsonrpc_msg)
+        error = _error_from_payload(payload)
+        if error is not None:
+            self.logger.warn(
+                'Message "%s" contains error: %s',
+                jsonrpc_msg['id'], payload['error'])
+            raise error
+        return payload
+
+    def request_async(self, routing_key, params={}, serializer=None,
+                      timeout=None):
+        """
+        Calls the handler of a request and returns a completed future for
+        its response.
+
+        :param routing_key: The routing key of the request.
+        :type routing_key: str
+        :param params: Keyword parameters to pass to the handler.
+        :type params: dict
+        :param serializer: Ignored.
+        :type serializer: str or None
+        :param timeout: Seconds until the deadline of the request, or None.
+        :type timeout: float or None
+        :returns: The future for the response.
+        :rtype: concurrent.futures.Future
+        """
+        future = Future()
+        try:
+            future.set_result(self.request(
+                routing_key, params, timeout=timeout))
+        except RemoteProcedureCallError as error:
+            future.set_exception(error)
+        return future
+
+    def request_batch(self, calls, serializer=None, return_exceptions=False,
+                      timeout=None):
+        """
+        Calls the handlers of several requests in order and returns their
+        responses. See BusMixin.request_batch().
+
+        :param calls: Pairs of routing key and params.
+        :type calls: list
+        :param serializer: Ignored.
+        :type serializer: str or None
+        :param return_exceptions: Return errors instead of raising them.
+        :type return_exceptions: bool
+        :param timeout: Seconds until the deadline of the requests, or None.
+        :type timeout: float or None
+        :returns: The response payloads.
+        :rtype: list
+        :raises: ValueError, RemoteProcedureCallError
+        """
+        prefixes = set(key.rsplit('.', 1)[0] for key, _ in calls)
+        if len(prefixes) > 1:
+            raise ValueError(
+                'Batched calls must share a routing key prefix, '
+                'got {}'.format(', '.join(sorted(prefixes))))
+        return gather(
+            [self.request_async(key, params, timeout=timeout)
+             for key, params in calls],
+            return_exceptions=return_exceptions)
+
+    def notify(self, routing_key, params={}):
+        """
+        Calls the callbacks subscribed to a notification.
+
+        :param routing_key: The routing key of the notification.
+        :type routing_key: str
+        :param params: Keyword parameters of the notification.
+        :type params: dict
+        """
+        jsonrpc_msg = {
+            'jsonrpc': '2.0',
+            'method': routing_key.split('.')[-1],
+            'params': params,
+        }
+        count = self.router.publish(routing_key, jsonrpc_msg)
+        self.logger.debug(
+            'Sent loopback notification to %s callbacks of "%s".',
+            count, routing_key)
+
+    def close_reply_queue(self):
+        """
+        Does nothing since loopback requests need no reply queue.
+        """
@@ -17,13 +17,18 @@ Basic Model structure for commissaire.
 """
 
 import copy
+import functools
+import hashlib
+import keyword
 import re
+import types
 import json
 
 from datetime import datetime
 
 from commissaire import constants as C
 from commissaire.errors import CommissaireError
+from commissaire.util.date import format_dt, parse_dt
 
 
 class ModelError(CommissaireError):
@@ -47,7 +52,611 @@ class CoercionError(ModelError):
     pass
 
 
-class Model(object):
+#: Attribute types whose values can be shared between serialized structures
+_IMMUTABLE_TYPES = (str, int, float, bool)
+
+#: How many projected serializers each model class keeps compiled
+_PROJECTION_CACHE_SIZE = 32
+
+
+def _copy_json_value(value):
+    """
+    Returns a copy of a JSON compatible value. Containers are copied so the
+    result does not share mutable state with the source, the same as a round
+    trip through json.dumps and json.loads would.
+
+    :param value: The value to copy.
+    :type value: mixed
+    :returns: A copy of the value.
+    :rtype: mixed
+    """
+    if isinstance(value, dict):
+        return {str(k): _copy_json_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_copy_json_value(v) for v in value]
+    return value
+
+
+def _is_immutable(value):
+    """
+    Returns True if a value can safely be shared between instances.
+
+    :param value: The value to check.
+    :type value: mixed
+    :returns: True if the value is immutable.
+    :rtype: bool
+    """
+    if value is None or isinstance(value, _IMMUTABLE_TYPES + (datetime, )):
+        return True
+    if isinstance(value, (tuple, frozenset)):
+        return all(_is_immutable(x) for x in value)
+    return False
+
+
+class HostSet(list):
+    """
+    List of host addresses backed by a set. Membership checks are O(1)
+    and an address is held at most once; adding an address which is
+    already present does nothing. Order is kept and it serializes as a
+    plain list.
+    """
+
+    __slots__ = ('_index', )
+
+    def __init__(self, iterable=()):
+        """
+        Creates a new HostSet.
+
+        :param iterable: Initial addresses.
+        :type iterable: iterable
+        """
+        super().__init__()
+        self._index = set()
+        self.extend(iterable)
+
+    def __contains__(self, address):
+        return address in self._index
+
+    def __reduce_ex__(self, protocol):
+        # Rebuild from the items so copies and pickles keep the index.
+        return (type(self), (list(self), ))
+
+    def __iadd__(self, iterable):
+        self.extend(iterable)
+        return self
+
+    def __imul__(self, count):
+        if count < 1:
+            self.clear()
+        return self
+
+    def __setitem__(self, index, value):
+        items = list(self)
+        items[index] = value
+        self._reset(items)
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._index = set(self)
+
+    def _reset(self, items):
+        """
+        Replaces all addresses.
+
+        :param items: The new addresses.
+        :type items: iterable
+        """
+        super().clear()
+        self._index = set()
+        self.extend(items)
+
+    def add(self, address):
+        """
+        Adds an address if it is not present.
+
+        :param address: The address to add.
+        :type address: str
+        """
+        if address not in self._index:
+            self._index.add(address)
+            super().append(address)
+
+    def append(self, address):
+        """
+        Same as add().
+
+        :param address: The address to add.
+        :type address: str
+        """
+        self.add(address)
+
+    def extend(self, iterable):
+        """
+        Adds every address which is not present.
+
+        :param iterable: The addresses to add.
+        :type iterable: iterable
+        """
+        for address in iterable:
+            self.add(address)
+
+    def insert(self, index, address):
+        """
+        Inserts an address before index if it is not present.
+
+        :param index: The position to insert at.
+        :type index: int
+        :param address: The address to insert.
+        :type address: str
+        """
+        if address not in self._index:
+            self._index.add(address)
+            super().insert(index, address)
+
+    def discard(self, address):
+        """
+        Removes an address if it is present.
+
+        :param address: The address to remove.
+        :type address: str
+        """
+        if address in self._index:
+            self._index.remove(address)
+            super().remove(address)
+
+    def remove(self, address):
+        """
+        Removes an address.
+
+        :param address: The address to remove.
+        :type address: str
+        :raises: ValueError
+        """
+        if address not in self._index:
+            raise ValueError('{!r} is not in HostSet'.format(address))
+        self.discard(address)
+
+    def pop(self, index=-1):
+        """
+        Removes and returns the address at index.
+
+        :param index: The position to remove.
+        :type index: int
+        :returns: The removed address.
+        :rtype: str
+        :raises: IndexError
+        """
+        address = super().pop(index)
+        self._index.discard(address)
+        return address
+
+    def clear(self):
+        """
+        Removes all addresses.
+        """
+        super().clear()
+        self._index.clear()
+
+
+def _decode_datetime(value):
+    """
+    Returns the datetime for a value of a datetime attribute. Empty
+    strings decode to None. Strings which can not be parsed are returned
+    unchanged so validation can report them.
+
+    :param value: The value to decode.
+    :type value: mixed
+    :returns: The decoded value.
+    :rtype: datetime.datetime, None or mixed
+    """
+    if isinstance(value, str):
+        if not value:
+            return None
+        try:
+            return parse_dt(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _encode_datetime(value):
+    """
+    Returns the JSON representation of a datetime attribute value. None
+    encodes to an empty string.
+
+    :param value: The value to encode.
+    :type value: datetime.datetime, None or mixed
+    :returns: The encoded value.
+    :rtype: str or mixed
+    """
+    if isinstance(value, datetime):
+        return format_dt(value)
+    if value is None:
+        return ''
+    return value
+
+
+def _decode_hostset(value):
+    """
+    Returns the HostSet for a value of a HostSet attribute. Values which
+    are not a collection of hashable items are returned unchanged so
+    validation can report them.
+
+    :param value: The value to decode.
+    :type value: mixed
+    :returns: The decoded value.
+    :rtype: HostSet or mixed
+    """
+    if type(value) is HostSet:
+        return value
+    if isinstance(value, (list, tuple, set, frozenset)):
+        try:
+            return HostSet(value)
+        except TypeError:
+            pass
+    return value
+
+
+def _decoding_property(attr, slot, decode):
+    """
+    Returns a property storing values in a slot as they are assigned and
+    decoding strings the first time they are read, so values assigned to
+    an instance are converted like the ones passed to __init__ without
+    paying for it when the value is only serialized again. The function
+    returning the stored value, decoded or not, is available as
+    fget.stored.
+
+    :param attr: The attribute name.
+    :type attr: str
+    :param slot: The member descriptor of the slot.
+    :type slot: member_descriptor
+    :param decode: The function converting assigned values.
+    :type decode: callable
+    :returns: The property.
+    :rtype: property
+    """
+    def fget(self):
+        value = slot.__get__(self)
+        if isinstance(value, str):
+            decoded = decode(value)
+            if decoded is not value:
+                slot.__set__(self, decoded)
+            return decoded
+        return value
+
+    def stored(self):
+        try:
+            return slot.__get__(self)
+        except AttributeError:
+            # Lets lazy instances hydrate.
+            return getattr(self, attr)
+
+    fget.stored = stored
+    return property(fget, slot.__set__, slot.__delete__)
+
+
+#: Attribute types which are not native to JSON mapped to the functions
+#: converting values from and to JSON: type -> (decode, encode). Values
+#: are converted when instances are created and when they are serialized.
+_ATTRIBUTE_CODECS = {
+    datetime: (_decode_datetime, _encode_datetime),
+    HostSet: (_decode_hostset, list),
+}
+
+#: Attribute types whose values are decoded when read instead of when
+#: instances are created or the values are assigned
+_DECODED_ON_READ = (datetime, )
+
+#: Types accepted by validation for attribute types, when they differ.
+#: Strings which are not valid datetimes are kept, as stored records may
+#: hold any string.
+_ACCEPTED_TYPES = {
+    datetime: (datetime, type(None), str),
+    HostSet: (list, ),
+}
+
+
+def _default_factory(value):
+    """
+    Returns a callable producing fresh copies of a mutable default value.
+
+    :param value: The default value.
+    :type value: mixed
+    :returns: A callable taking no arguments.
+    :rtype: callable
+    """
+    if type(value) in (list, dict, set) and not value:
+        return type(value)
+    return functools.partial(copy.deepcopy, value)
+
+
+def _schema_fingerprint(attribute_map):
+    """
+    Returns a fingerprint of a model schema. Models with the same
+    attribute names, types and regular expressions have the same
+    fingerprint, regardless of the order of the attributes.
+
+    :param attribute_map: The _attribute_map of a model class.
+    :type attribute_map: dict
+    :returns: The fingerprint as a hex string.
+    :rtype: str
+    """
+    parts = []
+    for attr in sorted(attribute_map.keys()):
+        spec = attribute_map[attr]
+        parts.append('{}:{}.{}:{}'.format(
+            attr, spec['type'].__module__, spec['type'].__qualname__,
+            spec.get('regex') or ''))
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def _attribute_expression(attr, namespace=None, readers={}):
+    """
+    Returns a Python expression reading an attribute from "self".
+
+    :param attr: The attribute name.
+    :type attr: str
+    :param namespace: The namespace of the compiled function, required
+                      if attr is in readers.
+    :type namespace: dict or None
+    :param readers: Attribute names mapped to a function reading the
+                    stored value instead of the attribute.
+    :type readers: dict
+    :returns: The Python expression.
+    :rtype: str
+    """
+    if attr in readers:
+        name = '_read_{}'.format(len(namespace))
+        namespace[name] = readers[attr]
+        return '{}(self)'.format(name)
+    if attr.isidentifier() and not keyword.iskeyword(attr):
+        return 'self.{}'.format(attr)
+    return 'getattr(self, {!r})'.format(attr)
+
+
+def _compile_struct_function(name, attributes, copy_attributes=(),
+                             encoders={}, readers={}):
+    """
+    Compiles a function which returns a dict holding the given attributes
+    of the instance it is passed.
+
+    :param name: Name for the generated function.
+    :type name: str
+    :param attributes: The attribute names to include, in order.
+    :type attributes: tuple
+    :param copy_attributes: Attribute names whose values must be copied.
+    :type copy_attributes: tuple
+    :param encoders: Attribute names mapped to a function converting
+                     their values to JSON.
+    :type encoders: dict
+    :param readers: Attribute names mapped to a function reading the
+                    stored value instead of the attribute.
+    :type readers: dict
+    :returns: The generated function.
+    :rtype: function
+    """
+    namespace = {'_copy': _copy_json_value}
+    items = []
+    for index, attr in enumerate(attributes):
+        expression = _attribute_expression(attr, namespace, readers)
+        if attr in encoders:
+            namespace['_encode{}'.format(index)] = encoders[attr]
+            expression = '_encode{}({})'.format(index, expression)
+        elif attr in copy_attributes:
+            expression = '_copy({})'.format(expression)
+        items.append('{!r}: {}'.format(attr, expression))
+    source = 'def {}(self):\n    return {{{}}}\n'.format(
+        name, ', '.join(items))
+    exec(source, namespace)
+    return namespace[name]
+
+
+def _compile_init_function(class_name, attributes, decoders={}):
+    """
+    Compiles an __init__ function which assigns each of the given
+    attributes from keyword arguments. Unknown keyword arguments are
+    ignored and a TypeError is raised if any attribute is missing.
+
+    :param class_name: Name of the class the function is compiled for.
+    :type class_name: str
+    :param attributes: The attribute names to assign, in order.
+    :type attributes: tuple
+    :param decoders: Attribute names mapped to a function converting
+                     their values from JSON.
+    :type decoders: dict
+    :returns: The generated function.
+    :rtype: function
+    """
+    namespace = {}
+    lines = ['def __init__(self, **kwargs):']
+    if attributes:
+        lines.append('    try:')
+        for index, attr in enumerate(attributes):
+            value = 'kwargs[{!r}]'.format(attr)
+            if attr in decoders:
+                namespace['_decode{}'.format(index)] = decoders[attr]
+                value = '_decode{}({})'.format(index, value)
+            lines.append('        {} = {}'.format(
+                _attribute_expression(attr), value))
+        lines.append('    except KeyError:')
+        lines.append('        raise TypeError(_MESSAGE.format(')
+        lines.append('            self.__class__.__name__)) from None')
+    else:
+        lines.append('    pass')
+    namespace['_MESSAGE'] = (
+        '{{}}.__init__() missing 1 or more required '
+        'keyword arguments: {}'.format(', '.join(attributes)))
+    exec('\n'.join(lines) + '\n', namespace)
+    init = namespace['__init__']
+    init.__qualname__ = '{}.__init__'.format(class_name)
+    init._replaceable = True
+    return init
+
+
+def _compile_check_function(validators, readers={}):
+    """
+    Compiles a function which returns True if an instance passes all of
+    the given validators. It is used as a fast path before collecting
+    individual error messages.
+
+    :param validators: Tuples of (attribute, type, compiled regex, pattern).
+    :type validators: tuple
+    :param readers: Attribute names mapped to a function reading the
+                    stored value instead of the attribute.
+    :type readers: dict
+    :returns: The generated function.
+    :rtype: function
+    """
+    namespace = {}
+    checks = []
+    for index, (attr, attr_type, regex, _) in enumerate(validators):
+        expression = _attribute_expression(attr, namespace, readers)
+        namespace['_type{}'.format(index)] = attr_type
+        checks.append('isinstance({}, _type{})'.format(expression, index))
+        if regex is not None:
+            namespace['_regex{}'.format(index)] = regex
+            checks.append('_regex{}.match({})'.format(index, expression))
+    source = (
+        'def _attributes_valid(self):\n'
+        '    try:\n'
+        '        return bool({})\n'
+        '    except TypeError:\n'
+        '        return False\n').format(' and '.join(checks) or 'True')
+    exec(source, namespace)
+    return namespace['_attributes_valid']
+
+
+class ModelType(type):
+    """
+    Metaclass for models. When a model class is defined its
+    _attribute_map is compiled into __slots__ and specialized helper
+    functions so instances do not need to walk the map on every call.
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        """
+        Creates a new model class, generating __slots__ for any attribute
+        not already provided by a base class.
+
+        :param name: The name of the class.
+        :type name: str
+        :param bases: The base classes.
+        :type bases: tuple
+        :param namespace: The class namespace.
+        :type namespace: dict
+        :returns: The new class.
+        :rtype: commissaire.models.ModelType
+        """
+        if '__slots__' not in namespace:
+            inherited = set()
+            for base in bases:
+                for klass in base.__mro__:
+                    inherited.update(klass.__dict__.get('__slots__', ()))
+            attribute_map = namespace.get('_attribute_map')
+            if attribute_map is None:
+                attribute_map = getattr(bases[0], '_attribute_map', {})
+            extra = namespace.get('_extra_attributes', ())
+            slots = []
+            for attr in tuple(attribute_map.keys()) + tuple(extra):
+                if attr not in inherited and attr not in slots:
+                    slots.append(attr)
+            namespace['__slots__'] = tuple(slots)
+        return super().__new__(mcs, name, bases, namespace)
+
+    def __init__(cls, name, bases, namespace):
+        """
+        Initializes a new model class.
+
+        :param name: The name of the class.
+        :type name: str
+        :param bases: The base classes.
+        :type bases: tuple
+        :param namespace: The class namespace.
+        :type namespace: dict
+        """
+        super().__init__(name, bases, namespace)
+        secure = tuple(cls._attribute_map.keys())
+        safe = tuple(
+            x for x in secure if x not in cls._hidden_attributes)
+        # Attributes whose types are not native to JSON are converted
+        # when instances are created and when they are serialized.
+        cls._codecs = {
+            attr: _ATTRIBUTE_CODECS[spec['type']]
+            for attr, spec in cls._attribute_map.items()
+            if spec.get('type') in _ATTRIBUTE_CODECS}
+        encoders = {attr: codec[1] for attr, codec in cls._codecs.items()}
+        # Strings, such as stored values or formatted_dt() results, are
+        # kept as is until the attribute is read. Serialization and
+        # validation read the stored value so they do not decode it. The
+        # property lives on the class holding the slot, so subclasses
+        # inherit it.
+        readers = {}
+        for attr, codec in cls._codecs.items():
+            if cls._attribute_map[attr]['type'] in _DECODED_ON_READ:
+                slot = cls.__dict__.get(attr)
+                if isinstance(slot, types.MemberDescriptorType):
+                    setattr(cls, attr, _decoding_property(
+                        attr, slot, codec[0]))
+                readers[attr] = getattr(cls, attr).fget.stored
+        cls._readers = readers
+        mutable = tuple(
+            attr for attr, spec in cls._attribute_map.items()
+            if spec.get('type') not in _IMMUTABLE_TYPES
+            if attr not in cls._codecs)
+        cls._struct_secure = _compile_struct_function(
+            '_struct_secure', secure, (), encoders, readers)
+        cls._struct_safe = _compile_struct_function(
+            '_struct_safe', safe, (), encoders, readers)
+        cls._dict_secure = _compile_struct_function(
+            '_dict_secure', secure, mutable, encoders, readers)
+        cls._dict_safe = _compile_struct_function(
+            '_dict_safe', safe, mutable, encoders, readers)
+        cls._mutable_attributes = mutable
+        # Serializers for fields= projections, compiled on first use.
+        cls._projections = {}
+
+        # Immutable defaults are shared by all instances, mutable ones
+        # are rebuilt for each instance by a factory.
+        cls._shared_defaults = {}
+        factories = []
+        for attr, value in cls._attribute_defaults.items():
+            if _is_immutable(value):
+                cls._shared_defaults[attr] = value
+            else:
+                factories.append((attr, _default_factory(value)))
+        cls._default_factories = tuple(factories)
+
+        # Validation data: (attribute, type, compiled regex, raw regex)
+        validators = []
+        for attr, spec in cls._attribute_map.items():
+            regex = spec.get('regex')
+            validators.append((
+                attr, _ACCEPTED_TYPES.get(spec['type'], spec['type']),
+                re.compile(regex) if regex else None, regex))
+        cls._validators = tuple(validators)
+        cls._attributes_valid = _compile_check_function(
+            cls._validators, readers)
+        # A hand written _validate can check more than the schema covers,
+        # so records of such classes have no fingerprint to be trusted by.
+        cls._schema_fingerprint = None
+        if getattr(cls._validate, '_schema_only', False):
+            cls._schema_fingerprint = _schema_fingerprint(cls._attribute_map)
+
+        # Classes with a hand written __init__ reach the generated one
+        # through Model.__init__.
+        cls._init_attributes = _compile_init_function(
+            name, secure,
+            {attr: codec[0] for attr, codec in cls._codecs.items()
+             if attr not in readers})
+        replaceable = getattr(cls.__init__, '_replaceable', False)
+        if replaceable and '__init__' not in namespace:
+            cls.__init__ = cls._init_attributes
+
+        if '_thawed_class' not in namespace:
+            cls._thawed_class = cls
+
+
+class Model(object, metaclass=ModelType):
     """
     Parent class for models.
     """
@@ -58,27 +667,39 @@ class Model(object):
     _hidden_attributes = ()
     #: The primary way of looking up an instance
     _primary_key = None
-    #: Defaults to use for attributes when calling new()
+    #: Defaults to use for attributes when calling new(). Mutable values
+    #: are copied for each new instance.
     _attribute_defaults = {}
 
+    #: Instance attributes which are not part of _attribute_map
+    _extra_attributes = ()
+    #: String attributes with few distinct values (used by columnar views)
+    _categorical_attributes = ()
+
+    # Lazy, frozen and identity mapped instances are instances of variant
+    # classes (see _variant_class()) so plain instances need no slots for
+    # their extra state.
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         """
         Creates a new instance of a Model.
 
+        .. note::
+
+           Subclasses which do not define their own __init__ receive a
+           generated one with the same behavior.
+
         :param kwargs: All keyword arguments to create the model.
         :type kwargs: dict
         :returns: The Model instance.
         :rtype: commissaire.model.Model
+        :raises: TypeError
         """
-        # self._attributes = self._attribute_map.keys()
-        for key in list(self._attribute_map.keys()):
-            if key not in kwargs:
-                raise TypeError(
-                    '{}.__init__() missing 1 or more required '
-                    'keyword arguments: {}'.format(
-                        self.__class__.__name__,
-                        ', '.join(self._attribute_map.keys())))
-            setattr(self, key, kwargs[key])
+        self._init_attributes(**kwargs)
+
+    # Let the metaclass swap in the generated __init__ for subclasses.
+    __init__._replaceable = True
 
     @classmethod
     def new(cls, **kwargs):
@@ -89,11 +710,60 @@ class Model(object):
         :type kwargs: dict
         """
         instance = cls.__new__(cls)
-        init_args = copy.deepcopy(cls._attribute_defaults)
+        instance.__init__(**cls._init_args(kwargs))
+        return instance
+
+    @classmethod
+    def _init_args(cls, kwargs):
+        """
+        Returns the keyword arguments for __init__ with defaults applied.
+
+        :param kwargs: Any arguments explicitly set.
+        :type kwargs: dict
+        :returns: The complete keyword arguments.
+        :rtype: dict
+        """
+        init_args = cls._shared_defaults.copy()
+        for key, factory in cls._default_factories:
+            if key not in kwargs:
+                init_args[key] = factory()
         init_args.update(kwargs)
-        instance.__init__(**init_args)
+        return init_args
+
+    @classmethod
+    def new_lazy(cls, raw):
+        """
+        Returns an instance which is hydrated from raw data the first
+        time one of its attributes is read. Attributes assigned before
+        then take precedence over the raw data.
+
+        .. note::
+
+           The instance is validated when it is hydrated. Errors in the
+           raw data, such as invalid JSON, missing attributes or invalid
+           values, are raised on first attribute access and again on every
+           later access, since the raw data is kept until hydration works.
+
+        :param raw: A JSON string or bytes, or an already decoded dict.
+        :type raw: str, bytes or dict
+        :returns: The lazy instance.
+        :rtype: commissaire.models.Model
+        """
+        lazy_class = _lazy_class(cls)
+        instance = lazy_class.__new__(lazy_class)
+        _lazy_data[id(instance)] = raw
         return instance
 
+    @property
+    def _raw(self):
+        """
+        The raw data of an instance created by new_lazy() which has not
+        been hydrated yet, else None.
+
+        :rtype: str, bytes, dict or None
+        """
+        return _lazy_data.get(id(self))
+
     def __str__(self):  # pragma: no cover
         """
         Returns a string representation of the instance.
@@ -116,71 +786,150 @@ class Model(object):
         """
         return getattr(self, self._primary_key)
 
-    def _struct_for_json(self, secure=False):
+    @classmethod
+    def _projection(cls, fields, secure=False, copy_values=False):
+        """
+        Returns a compiled function which serializes only the given
+        fields. Hidden attributes are dropped unless secure is True.
+
+        :param fields: The attribute names to include.
+        :type fields: list
+        :param secure: If the structure needs to respect _hidden_attributes.
+        :type secure: bool
+        :param copy_values: If mutable values should be copied.
+        :type copy_values: bool
+        :returns: The generated function.
+        :rtype: function
+        :raises: commissaire.models.ModelError
+        """
+        key = (tuple(fields), secure, copy_values)
+        try:
+            return cls._projections[key]
+        except KeyError:
+            pass
+        unknown = [x for x in key[0] if x not in cls._attribute_map]
+        if unknown:
+            raise ModelError('{} has no attributes {}'.format(
+                cls.__name__, ', '.join(sorted(unknown))))
+        attributes = tuple(
+            x for x in cls._attribute_map.keys() if x in key[0] and (
+                secure or x not in cls._hidden_attributes))
+        function = _compile_struct_function(
+            '_projection', attributes,
+            cls._mutable_attributes if copy_values else (),
+            {attr: codec[1] for attr, codec in cls._codecs.items()},
+            cls._readers)
+        if len(cls._projections) >= _PROJECTION_CACHE_SIZE:
+            cls._projections.clear()
+        cls._projections[key] = function
+        return function
+
+    def _struct_for_json(self, secure=False, fields=None):
         """
         Returns the proper structure for a model to be used in JSON.
 
         :param secure: If the structure needs to respect _hidden_attributes.
         :type secure: bool
+        :param fields: Attribute names to limit the result to, or None.
+        :type fields: list or None
         :returns: A dict or list depending
         :rtype: dict or list
         """
-        data = {}
-        for key in list(self._attribute_map.keys()):
-            if secure:
-                data[key] = getattr(self, key)
-            elif key not in self._hidden_attributes:
-                data[key] = getattr(self, key)
-        return data
+        if fields is not None:
+            return self._projection(fields, secure)(self)
+        if secure:
+            return self._struct_secure()
+        return self._struct_safe()
 
-    def to_json(self, expose=[]):
+    def _struct_for_dict(self, secure=False, fields=None):
         """
-        Returns a JSON representation of this model.
+        Returns the proper structure for a model to be used as a native
+        dict. Unlike _struct_for_json, mutable values are copied so the
+        result does not share state with this instance.
+
+        :param secure: If the structure needs to respect _hidden_attributes.
+        :type secure: bool
+        :param fields: Attribute names to limit the result to, or None.
+        :type fields: list or None
+        :returns: A dict or list depending
+        :rtype: dict or list
+        """
+        if fields is not None:
+            return self._projection(fields, secure, copy_values=True)(self)
+        if secure:
+            return self._dict_secure()
+        return self._dict_safe()
+
+    def _expose(self, struct, expose, copy_values=False):
+        """
+        Adds non-exposed attributes to a structure.
 
+        :param struct: The structure to update.
+        :type struct: dict
         :param expose: List of non-exposed attributes to include in result.
         :type expose: list
-        :returns: The JSON representation.
-        :rtype: str
+        :param copy_values: If the exposed values should be copied.
+        :type copy_values: bool
+        :returns: The updated structure.
+        :rtype: dict
         """
-        struct = self._struct_for_json(secure=True)
         for key in expose:
             value = getattr(self, key)
             if value:
+                if copy_values:
+                    value = _copy_json_value(value)
                 struct[key] = value
-        return json.dumps(struct)
+        return struct
 
-    def to_json_safe(self, expose=[]):
+    def to_json(self, expose=[], fields=None):
+        """
+        Returns a JSON representation of this model.
+
+        :param expose: List of non-exposed attributes to include in result.
+        :type expose: list
+        :param fields: Attribute names to limit the result to, or None.
+        :type fields: list or None
+        :returns: The JSON representation.
+        :rtype: str
+        :raises: commissaire.models.ModelError
+        """
+        return json.dumps(self._expose(
+            self._struct_for_json(secure=True, fields=fields), expose))
+
+    def to_json_safe(self, expose=[], fields=None):
         """
         Returns a JSON representation of this model, omitting all hidden
         attributes.  Use this when preparing data for display to users.
 
         :param expose: List of non-exposed attributes to include in result.
         :type expose: list
+        :param fields: Attribute names to limit the result to, or None.
+        :type fields: list or None
         :returns: The JSON representation.
         :rtype: str
+        :raises: commissaire.models.ModelError
         """
-        struct = self._struct_for_json(secure=False)
-        for key in expose:
-            value = getattr(self, key)
-            if value:
-                struct[key] = value
-        return json.dumps(struct)
+        return json.dumps(self._expose(
+            self._struct_for_json(secure=False, fields=fields), expose))
 
-    def to_dict(self, expose=[]):
+    def to_dict(self, expose=[], fields=None):
         """
         Returns a dict representation of this model. This is different than
         using __dict__ as the returned data will be model specific only.
 
         :param expose: List of non-exposed attributes to include in result.
         :type expose: list
+        :param fields: Attribute names to limit the result to, or None.
+        :type fields: list or None
         :returns: the dict representation.
         :rtype: dict
+        :raises: commissaire.models.ModelError
         """
-        # Instead of reimplementing the logic take the performance hit of
-        # going between native and json
-        return json.loads(self.to_json(expose))
+        return self._expose(
+            self._struct_for_dict(secure=True, fields=fields),
+            expose, copy_values=True)
 
-    def to_dict_safe(self, expose=[]):
+    def to_dict_safe(self, expose=[], fields=None):
         """
         Returns a dict representation of this model, omitting all hidden
         attributes.  This is different than using __dict__ as the returned
@@ -189,47 +938,174 @@ class Model(object):
 
         :param expose: List of non-exposed attributes to include in result.
         :type expose: list
+        :param fields: Attribute names to limit the result to, or None.
+        :type fields: list or None
         :returns: the dict representation.
         :rtype: dict
+        :raises: commissaire.models.ModelError
         """
-        # Instead of reimplementing the logic take the performance hit of
-        # going between native and json
-        return json.loads(self.to_json_safe(expose))
+        return self._expose(
+            self._struct_for_dict(secure=False, fields=fields),
+            expose, copy_values=True)
 
-    def _validate(self, errors=[]):
+    def _attribute_errors(self):
         """
-        Validates the attribute data of the current instance.
+        Checks the attribute data of the current instance against the
+        validators compiled from _attribute_map.
 
-        :param errors: Errors from any pre-validation.
-        :type errors: list
-
-        :raises: ValidationError
+        :returns: A list of error strings. Empty if all attributes are valid.
+        :rtype: list
         """
-        all_errors = [] + errors
-        for attr, spec in self._attribute_map.items():
+        errors = []
+        if self._attributes_valid():
+            return errors
+        for attr, attr_type, regex, pattern in self._validators:
             value = getattr(self, attr)
-            if not isinstance(value, spec['type']):
-                all_errors.append(
+            if not isinstance(value, attr_type):
+                errors.append(
                     '{}.{}: Expected type {}. Got {}'.format(
                         self.__class__.__name__, attr,
-                        spec['type'], type(value)))
+                        attr_type, type(value)))
 
+            if regex is None:
+                continue
             try:
-                if spec.get('regex') and not re.match(spec['regex'], value):
-                    all_errors.append(
+                if not regex.match(value):
+                    errors.append(
                         '{}.{}: Value did validate against the '
                         'provided regular expression "{}"'.format(
-                            self.__class__.__name__, attr, spec['regex']))
+                            self.__class__.__name__, attr, pattern))
             except TypeError:
-                all_errors.append(
+                errors.append(
                     '{}.{}: Value can not be validated by a '
                     'regular expression'.format(self.__class__.__name__, attr))
+        return errors
+
+    def _validate(self, errors=[]):
+        """
+        Validates the attribute data of the current instance.
 
+        :param errors: Errors from any pre-validation.
+        :type errors: list
+
+        :raises: ValidationError
+        """
+        all_errors = errors + self._attribute_errors()
         if all_errors:
             raise ValidationError(
                 '{} instance is invalid due to {} errors.'.format(
                     self.__class__.__name__, len(all_errors)), all_errors)
 
+    # Marks the validation as covered by the schema fingerprint.
+    _validate._schema_only = True
+
+    def diff(self, other):
+        """
+        Returns a patch holding the attributes of other which differ from
+        this instance. Applying the patch to this instance with
+        apply_patch() makes it equal to other.
+
+        :param other: The instance to compare against.
+        :type other: commissaire.models.Model
+        :returns: Mapping of attribute name to the value in other.
+        :rtype: dict
+        :raises: commissaire.models.ModelError
+        """
+        if getattr(other, '_thawed_class', None) is not self._thawed_class:
+            raise ModelError('Can not diff {} against {}'.format(
+                self.__class__.__name__, type(other).__name__))
+        mine = self._struct_for_json(secure=True)
+        return {key: value
+                for key, value in other._struct_for_dict(secure=True).items()
+                if mine[key] != value}
+
+    def apply_patch(self, patch):
+        """
+        Updates this instance in place from a patch as returned by diff().
+
+        :param patch: Mapping of attribute name to new value.
+        :type patch: dict
+        :returns: This instance.
+        :rtype: commissaire.models.Model
+        :raises: commissaire.models.ModelError
+        """
+        unknown = set(patch.keys()).difference(self._attribute_map.keys())
+        if unknown:
+            raise ModelError('{} has no attributes {}'.format(
+                self.__class__.__name__, ', '.join(sorted(unknown))))
+        for key, value in patch.items():
+            if key in self._codecs:
+                value = self._codecs[key][0](value)
+            else:
+                value = _copy_json_value(value)
+            setattr(self, key, value)
+        return self
+
+    def _attribute_state(self):
+        """
+        Returns the values of all attributes which are set, including
+        _extra_attributes.
+
+        :returns: Mapping of attribute name to value.
+        :rtype: dict
+        """
+        state = {}
+        for attr in tuple(self._attribute_map.keys()) + tuple(
+                self._extra_attributes):
+            try:
+                state[attr] = getattr(self, attr)
+            except AttributeError:
+                pass
+        return state
+
+    def freeze(self):
+        """
+        Makes this instance immutable. Assigning attributes afterwards
+        raises ModelError, and the results of to_json() and to_json_safe()
+        are memoized so repeated calls are O(1). Memoized results are
+        strings, so no caller can change them; to_dict() and to_dict_safe()
+        still build a new dict on every call, which callers may modify.
+
+        .. note::
+
+           Freezing is shallow, so mutable attribute values must not be
+           modified. Use thaw() to get a modifiable copy.
+
+        The instance keeps its class name and remains an instance of its
+        original class.
+
+        :returns: This instance.
+        :rtype: commissaire.models.Model
+        """
+        if not self.frozen:
+            # Hydrate lazy instances before they become immutable.
+            if isinstance(self, _LazyModel):
+                self._hydrate()
+            self.__class__ = _frozen_class(type(self))
+        return self
+
+    @property
+    def frozen(self):
+        """
+        True if this instance has been frozen with freeze().
+
+        :rtype: bool
+        """
+        return isinstance(self, _FrozenModel)
+
+    def thaw(self):
+        """
+        Returns a modifiable deep copy of this instance.
+
+        :returns: A new, unfrozen model instance.
+        :rtype: commissaire.models.Model
+        """
+        model_class = self._thawed_class
+        instance = model_class.__new__(model_class)
+        for attr, value in self._attribute_state().items():
+            setattr(instance, attr, copy.deepcopy(value))
+        return instance
+
     def _must_be_in(self, attribute, allowed_types, errors):
         """
         Used to ensure an attribute is of one of the allowed types.
@@ -257,11 +1133,14 @@ class Model(object):
         errors = []
         for attr, spec in self._attribute_map.items():
             value = getattr(self, attr)
-            if not isinstance(value, spec['type']):
+            expected = _ACCEPTED_TYPES.get(spec['type'], spec['type'])
+            if not isinstance(value, expected):
                 try:
                     caster = spec['type']
                     if spec['type'] is str:
                         caster = str
+                    elif spec['type'] is datetime:
+                        caster = parse_dt
 
                     setattr(self, attr, caster(value))
                 except Exception as ex:
@@ -276,6 +1155,333 @@ class Model(object):
                     len(errors), errors))
 
 
+#: Raw data of lazy instances which have not been hydrated, by id()
+_lazy_data = {}
+#: Memoized serializations of frozen instances, by id()
+_frozen_memos = {}
+
+
+class _LazyModel(object):
+    """
+    Overrides mixed into the lazy variant of each model class.
+    See Model.new_lazy().
+    """
+
+    __slots__ = ()
+
+    def __del__(self):
+        """
+        Drops the raw data of instances which were never hydrated.
+        """
+        _lazy_data.pop(id(self), None)
+
+    def __reduce_ex__(self, protocol):
+        """
+        Supports copying and pickling of lazy instances by hydrating them.
+        """
+        self._hydrate()
+        return self.__reduce_ex__(protocol)
+
+    @classmethod
+    def new(cls, **kwargs):
+        """
+        Returns an instance with default values.
+
+        :param kwargs: Any arguments explicitly set.
+        :type kwargs: dict
+        """
+        return cls._eager_class.new(**kwargs)
+
+    @classmethod
+    def new_lazy(cls, raw):
+        """
+        Returns a lazy instance from raw data.
+
+        :param raw: A JSON string or bytes, or an already decoded dict.
+        :type raw: str, bytes or dict
+        """
+        return cls._eager_class.new_lazy(raw)
+
+    def __getattr__(self, name):
+        """
+        Hydrates the instance when an attribute which has not been set yet
+        is read.
+
+        :param name: The attribute name.
+        :type name: str
+        :returns: The attribute value.
+        :rtype: mixed
+        :raises: AttributeError
+        """
+        if id(self) in _lazy_data:
+            self._hydrate()
+            return getattr(self, name)
+        raise AttributeError('{!r} object has no attribute {!r}'.format(
+            self.__class__.__name__, name))
+
+    def _hydrate(self):
+        """
+        Initializes the instance from its raw data and turns it into an
+        instance of the class new_lazy() was called on.
+
+        :raises: TypeError, ValueError, commissaire.models.ValidationError
+        """
+        # Removed first so reading attributes below does not recurse.
+        raw = _lazy_data.pop(id(self), None)
+        if raw is not None:
+            preset = {}
+            for attr in self._attribute_map.keys():
+                try:
+                    preset[attr] = getattr(self, attr)
+                except AttributeError:
+                    pass
+            try:
+                data = raw
+                if isinstance(data, bytes):
+                    data = data.decode('utf-8')
+                if isinstance(data, str):
+                    data = json.loads(data)
+                self.__init__(**self._init_args(data))
+                for attr, value in preset.items():
+                    setattr(self, attr, value)
+                self._validate()
+            except Exception:
+                # Back to the lazy state so the error is not masked by
+                # half initialized attributes on the next access.
+                for attr in self._attribute_map.keys():
+                    if attr in preset:
+                        setattr(self, attr, preset[attr])
+                    else:
+                        try:
+                            delattr(self, attr)
+                        except AttributeError:
+                            pass
+                _lazy_data[id(self)] = raw
+                raise
+        self.__class__ = self._eager_class
+
+
+class _FrozenModel(object):
+    """
+    Overrides mixed into the frozen variant of each model class.
+    See Model.freeze().
+    """
+
+    __slots__ = ()
+
+    def __del__(self):
+        """
+        Drops the memoized serializations.
+        """
+        _frozen_memos.pop(id(self), None)
+
+    def __setattr__(self, name, value):
+        """
+        Refuses to modify frozen instances.
+
+        :raises: commissaire.models.ModelError
+        """
+        raise ModelError(
+            '{} instance is frozen and can not set "{}"'.format(
+                self.__class__.__name__, name))
+
+    def __delattr__(self, name):
+        """
+        Refuses to modify frozen instances.
+
+        :raises: commissaire.models.ModelError
+        """
+        raise ModelError(
+            '{} instance is frozen and can not delete "{}"'.format(
+                self.__class__.__name__, name))
+
+    def __reduce_ex__(self, protocol):
+        """
+        Supports copying and pickling of frozen instances.
+        """
+        return (_refreeze, (self._thawed_class, self._attribute_state()))
+
+    @classmethod
+    def new(cls, **kwargs):
+        """
+        Returns a frozen instance with default values.
+
+        :param kwargs: Any arguments explicitly set.
+        :type kwargs: dict
+        """
+        return cls._thawed_class.new(**kwargs).freeze()
+
+    @classmethod
+    def new_lazy(cls, raw):
+        """
+        Returns a frozen instance from raw data. Frozen instances can not
+        be lazy so the data is decoded immediately.
+
+        :param raw: A JSON string or bytes, or an already decoded dict.
+        :type raw: str, bytes or dict
+        """
+        return cls._thawed_class.new_lazy(raw).freeze()
+
+    def _memoize(self, method, expose, fields):
+        """
+        Returns the memoized result of a serialization method.
+
+        :param method: The name of the serialization method.
+        :type method: str
+        :param expose: List of non-exposed attributes to include in result.
+        :type expose: list
+        :param fields: Attribute names to limit the result to, or None.
+        :type fields: list or None
+        :returns: The serialized data.
+        :rtype: str
+        """
+        key = (method, tuple(expose),
+               None if fields is None else tuple(fields))
+        memo = _frozen_memos.setdefault(id(self), {})
+        try:
+            return memo[key]
+        except KeyError:
+            result = getattr(self._thawed_class, method)(
+                self, expose, fields)
+            memo[key] = result
+            return result
+
+    def to_json(self, expose=[], fields=None):
+        """
+        Memoized version of Model.to_json().
+        """
+        return self._memoize('to_json', expose, fields)
+
+    def to_json_safe(self, expose=[], fields=None):
+        """
+        Memoized version of Model.to_json_safe().
+        """
+        return self._memoize('to_json_safe', expose, fields)
+
+
+class _WeakModel(object):
+    """
+    Overrides mixed into the variant of each model class which supports
+    weak references. See commissaire.models.identity.
+    """
+
+    __slots__ = ()
+
+    def __reduce_ex__(self, protocol):
+        """
+        Supports pickling, which can not look up variant classes by name.
+        """
+        return (_rebuild, (self._thawed_class, self._attribute_state()))
+
+
+#: Variants of model classes, created on demand
+_variant_classes = {}
+
+
+def _variant_class(model_class, mixin, namespace):
+    """
+    Returns a variant of a model class which has the same name, is a
+    subclass of model_class and has mixin's overrides.
+
+    :param model_class: The model class.
+    :type model_class: commissaire.models.ModelType
+    :param mixin: The class with the overrides.
+    :type mixin: type
+    :param namespace: Extra attributes of the variant.
+    :type namespace: dict
+    :returns: The variant class.
+    :rtype: commissaire.models.ModelType
+    """
+    key = (model_class, mixin)
+    variant_class = _variant_classes.get(key)
+    if variant_class is None:
+        namespace = dict(namespace)
+        namespace.update({
+            '__module__': model_class.__module__,
+            '__doc__': model_class.__doc__,
+            '_thawed_class': model_class._thawed_class,
+        })
+        variant_class = type(model_class)(
+            model_class.__name__, (mixin, model_class), namespace)
+        _variant_classes[key] = variant_class
+    return variant_class
+
+
+def _frozen_class(model_class):
+    """
+    Returns the frozen variant of a model class. It has the same memory
+    layout as model_class so instances can switch between them.
+
+    :param model_class: The model class.
+    :type model_class: commissaire.models.ModelType
+    :returns: The frozen model class.
+    :rtype: commissaire.models.ModelType
+    """
+    return _variant_class(model_class, _FrozenModel, {})
+
+
+def _lazy_class(model_class):
+    """
+    Returns the lazy variant of a model class. It has the same memory
+    layout as model_class so instances switch to model_class once they
+    are hydrated.
+
+    :param model_class: The model class.
+    :type model_class: commissaire.models.ModelType
+    :returns: The lazy model class.
+    :rtype: commissaire.models.ModelType
+    """
+    return _variant_class(
+        model_class, _LazyModel, {'_eager_class': model_class})
+
+
+def _weak_class(model_class):
+    """
+    Returns the variant of a model class whose instances support weak
+    references. Only identity mapped instances pay for the extra slot.
+
+    :param model_class: The model class.
+    :type model_class: commissaire.models.ModelType
+    :returns: The model class supporting weak references.
+    :rtype: commissaire.models.ModelType
+    """
+    if hasattr(model_class, '__weakref__'):
+        return model_class
+    return _variant_class(
+        model_class, _WeakModel, {'__slots__': ('__weakref__',)})
+
+
+def _rebuild(model_class, state):
+    """
+    Rebuilds an instance. Used when copying or unpickling.
+
+    :param model_class: The model class.
+    :type model_class: commissaire.models.ModelType
+    :param state: Mapping of attribute name to value.
+    :type state: dict
+    :returns: The instance.
+    :rtype: commissaire.models.Model
+    """
+    instance = model_class.__new__(model_class)
+    for attr, value in state.items():
+        setattr(instance, attr, value)
+    return instance
+
+
+def _refreeze(model_class, state):
+    """
+    Rebuilds a frozen instance. Used when copying or unpickling.
+
+    :param model_class: The unfrozen model class.
+    :type model_class: commissaire.models.ModelType
+    :param state: Mapping of attribute name to value.
+    :type state: dict
+    :returns: The frozen instance.
+    :rtype: commissaire.models.Model
+    """
+    return _rebuild(model_class, state).freeze()
+
+
 class SecretModel(Model):
     """
     Parent class for all models which must be stored in the secrets store.
@@ -305,18 +1511,107 @@ class ListModel(Model):
             self.__class__.__name__,
             self.to_json_safe())
 
-    def _struct_for_json(self, secure=False):
+    def _struct_for_json(self, secure=False, fields=None):
         """
         Returns the proper structure for a model to be used in JSON.
 
         :param secure: If the structure needs to respect _hidden_attributes.
         :type secure: bool
+        :param fields: Item attribute names to limit the result to, or None.
+        :type fields: list or None
+        :returns: A dict or list depending
+        :rtype: dict or list
+        """
+        if len(self._attribute_map.keys()) == 1:
+            data = getattr(self, list(self._attribute_map.keys())[0])
+        return [x._struct_for_json(secure, fields) for x in data]
+
+    def _struct_for_dict(self, secure=False, fields=None):
+        """
+        Returns the proper structure for a model to be used as a native
+        dict or list.
+
+        :param secure: If the structure needs to respect _hidden_attributes.
+        :type secure: bool
+        :param fields: Item attribute names to limit the result to, or None.
+        :type fields: list or None
         :returns: A dict or list depending
         :rtype: dict or list
         """
         if len(self._attribute_map.keys()) == 1:
             data = getattr(self, list(self._attribute_map.keys())[0])
-        return [x._struct_for_json(secure) for x in data]
+        return [x._struct_for_dict(secure, fields) for x in data]
+
+    def iter_json(self, secure=True, chunk_size=100, fields=None):
+        """
+        Yields the JSON representation of this list in chunks, encoding
+        chunk_size items at a time, so large lists can be streamed with
+        bounded memory. Joining the chunks gives the same string as
+        to_json() (or to_json_safe() when secure is False).
+
+        :param secure: If hidden attributes should be included.
+        :type secure: bool
+        :param chunk_size: How many items to encode per chunk.
+        :type chunk_size: int
+        :param fields: Item attribute names to limit the result to, or None.
+        :type fields: list or None
+        :returns: A generator of JSON string chunks.
+        :rtype: generator
+        """
+        encode = json.JSONEncoder().encode
+        items = getattr(self, self._list_attr)
+        prefix = '['
+        for start in range(0, len(items), chunk_size):
+            yield prefix + ', '.join(
+                encode(x._struct_for_json(secure, fields))
+                for x in items[start:start + chunk_size])
+            prefix = ', '
+        yield ']' if prefix == ', ' else '[]'
+
+    def to_columns(self):
+        """
+        Returns a columnar view of the items in this list.
+
+        :returns: The columnar representation.
+        :rtype: commissaire.models.columnar.ColumnarList
+        """
+        from commissaire.models.columnar import ColumnarList
+        return ColumnarList.from_list_model(self)
+
+    def _validate_items(self, fail_fast=False):
+        """
+        Validates every item in the list in a single pass. Items whose
+        class does not extend _validate are checked directly against the
+        compiled validators without raising and catching per item.
+
+        :param fail_fast: Stop at the first invalid item.
+        :type fail_fast: bool
+        :raises: ValidationError
+        """
+        errors = []
+        plain_types = {}
+        for item in getattr(self, self._list_attr):
+            item_type = type(item)
+            plain = plain_types.get(item_type)
+            if plain is None:
+                plain = item_type._validate is Model._validate
+                plain_types[item_type] = plain
+            if plain:
+                item_errors = item._attribute_errors()
+            else:
+                try:
+                    item._validate()
+                    continue
+                except ValidationError as error:
+                    item_errors = error.args[1]
+            if item_errors:
+                errors.extend(item_errors)
+                if fail_fast:
+                    break
+        if errors:
+            raise ValidationError(
+                '{} instance is invalid due to {} errors.'.format(
+                    self.__class__.__name__, len(errors)), errors)
 
 
 class Network(Model):
@@ -367,7 +1662,7 @@ class Cluster(Model):
         'name': {'type': str},
         'status': {'type': str},
         'network': {'type': str},
-        'hostset': {'type': list},
+        'hostset': {'type': HostSet},
         'container_manager': {'type': str},
     }
     _hidden_attributes = ('hostset',)
@@ -378,6 +1673,7 @@ class Cluster(Model):
         'container_manager': '',
     }
     _primary_key = 'name'
+    _extra_attributes = ('hosts',)
 
     def __init__(self, **kwargs):
         """
@@ -389,10 +1685,30 @@ class Cluster(Model):
         :rtype: commissaire.model.Cluster
         """
         Model.__init__(self, **kwargs)
-        # Hosts is always calculated, not stored in etcd.
+        # Hosts is kept up to date by the storage service as host statuses
+        # change and is stored with the cluster, so it is restored from
+        # stored data when present.
         self.hosts = {'total': 0,
                       'available': 0,
                       'unavailable': 0}
+        hosts = kwargs.get('hosts')
+        if isinstance(hosts, dict):
+            for key in self.hosts:
+                if type(hosts.get(key)) is int:
+                    self.hosts[key] = hosts[key]
+
+
+class HostCluster(Model):
+    """
+    Representation of the cluster a host belongs to. These records are a
+    reverse index of Cluster.hostset kept by the storage service.
+    """
+    _attribute_map = {
+        'address': {'type': str},
+        'cluster': {'type': str},
+    }
+    _attribute_defaults = {'cluster': ''}
+    _primary_key = 'address'
 
 
 class ClusterDeploy(Model):
@@ -504,13 +1820,14 @@ class Host(Model):
         'cpus': {'type': int},
         'memory': {'type': int},
         'space': {'type': int},
-        'last_check': {'type': str},
+        'last_check': {'type': datetime},
         'source': {'type': str},
     }
     _attribute_defaults = {
         'status': '', 'os': '', 'cpus': 0,
         'memory': 0, 'space': 0, 'last_check': '', 'source': ''}
     _primary_key = 'address'
+    _categorical_attributes = ('status', 'os')
 
 
 class HostCreds(SecretModel):
@@ -538,7 +1855,7 @@ class HostStatus(Model):
     _attribute_map = {
         'type': {'type': str},
         'host': {'type': dict},
-        'container_manager': {'type: dict'},
+        'container_manager': {'type': dict},
     }
     _attribute_defaults = {
         'type': '',
@@ -565,11 +1882,11 @@ class WatcherRecord(Model):
     """
     _attribute_map = {
         'address': {'type': str},
-        'last_check': {'type': str},
+        'last_check': {'type': datetime},
     }
     _attribute_defaults = {
         'address': '',
-        'last_check': datetime.max.isoformat(),
+        'last_check': datetime.max,
     }
 
     def _validate(self):
@@ -577,9 +1894,7 @@ class WatcherRecord(Model):
         Extra validation for WatcherRecord.
         """
         errors = []
-        try:
-            datetime.strptime(self.last_check, C.DATE_FORMAT)
-        except ValueError:
+        if not isinstance(self.last_check, datetime):
             errors.append(
                 'last_check must be in isoformat: "{}"'.format(C.DATE_FORMAT))
         super()._validate(errors)
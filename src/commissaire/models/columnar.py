@@ -0,0 +1,402 @@
+# Copyright (C) 2017  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Columnar views of list models.
+"""
+
+import collections
+import itertools
+import operator
+
+from array import array
+
+from commissaire.models import ModelError
+
+#: array typecodes for numeric attribute types
+_NUMERIC_TYPECODES = {
+    int: 'q',
+    float: 'd',
+}
+
+
+class ColumnarList(object):
+    """
+    Column oriented storage for the items of a ListModel.
+
+    Numeric attributes are stored in array buffers, attributes listed in
+    the item class's _categorical_attributes are dictionary encoded into
+    an array of codes, and everything else is kept in a plain list.
+    """
+
+    def __init__(self, model_class, items=()):
+        """
+        Creates a new ColumnarList.
+
+        :param model_class: The class of the items.
+        :type model_class: commissaire.models.Model
+        :param items: Initial items to append.
+        :type items: iterable
+        """
+        self.model_class = model_class
+        self._length = 0
+        self._columns = collections.OrderedDict()
+        self._categories = {}
+        self._category_codes = {}
+        self._masks = {}
+        for attr, spec in model_class._attribute_map.items():
+            typecode = _NUMERIC_TYPECODES.get(spec['type'])
+            if attr in model_class._categorical_attributes:
+                self._columns[attr] = array('I')
+                self._categories[attr] = []
+                self._category_codes[attr] = {}
+            elif typecode is not None:
+                self._columns[attr] = array(typecode)
+            else:
+                self._columns[attr] = []
+        # Columns which are not dictionary encoded, as (attribute, column)
+        self._plain_columns = tuple(
+            (attr, column) for attr, column in self._columns.items()
+            if attr not in self._categories)
+        for item in items:
+            self.append(item)
+
+    @classmethod
+    def from_list_model(cls, list_model):
+        """
+        Creates a ColumnarList holding the items of a ListModel.
+
+        :param list_model: The list model to convert.
+        :type list_model: commissaire.models.ListModel
+        :returns: The columnar representation.
+        :rtype: commissaire.models.columnar.ColumnarList
+        """
+        return cls(
+            list_model._list_class,
+            getattr(list_model, list_model._list_attr))
+
+    def __len__(self):
+        """
+        Returns the number of rows.
+
+        :returns: The number of rows.
+        :rtype: int
+        """
+        return self._length
+
+    def __getitem__(self, index):
+        """
+        Returns a view of a single row.
+
+        :param index: The row index.
+        :type index: int
+        :returns: A view of the row.
+        :rtype: commissaire.models.columnar.RowView
+        :raises: IndexError
+        """
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('Row index out of range')
+        return RowView(self, index)
+
+    def __iter__(self):
+        """
+        Iterates over views of all rows.
+        """
+        for index in range(self._length):
+            yield RowView(self, index)
+
+    def append(self, item):
+        """
+        Appends a model instance as a new row. Nothing is changed if any
+        value of the row can not be stored.
+
+        :param item: The model instance to append.
+        :type item: commissaire.models.Model
+        :raises: commissaire.models.ModelError
+        """
+        if not isinstance(item, self.model_class):
+            raise ModelError('Expected {} instance. Got {}'.format(
+                self.model_class.__name__, type(item)))
+        categorical = [
+            (attr, getattr(item, attr)) for attr in self._category_codes]
+        appended = 0
+        try:
+            # Unhashable categorical values fail here, before any column
+            # has grown.
+            for attr, value in categorical:
+                hash(value)
+            for attr, column in self._plain_columns:
+                column.append(getattr(item, attr))
+                appended += 1
+        except (TypeError, OverflowError) as error:
+            for _, column in self._plain_columns[:appended]:
+                column.pop()
+            raise ModelError('Can not store {}.{} value {!r}: {}'.format(
+                self.model_class.__name__, attr, getattr(item, attr), error))
+        for attr, value in categorical:
+            self._columns[attr].append(self._encode(attr, value))
+        self._length += 1
+        self._masks.clear()
+
+    def _encode(self, attr, value):
+        """
+        Returns the code for a categorical value, adding it if needed.
+
+        :param attr: The categorical attribute name.
+        :type attr: str
+        :param value: The value to encode.
+        :type value: str
+        :returns: The code for the value.
+        :rtype: int
+        """
+        codes = self._category_codes[attr]
+        code = codes.get(value)
+        if code is None:
+            code = len(self._categories[attr])
+            codes[value] = code
+            self._categories[attr].append(value)
+        return code
+
+    def _value(self, attr, index):
+        """
+        Returns the decoded value of a single cell.
+
+        :param attr: The attribute name.
+        :type attr: str
+        :param index: The row index.
+        :type index: int
+        :returns: The value.
+        :rtype: mixed
+        """
+        value = self._columns[attr][index]
+        if attr in self._categories:
+            return self._categories[attr][value]
+        return value
+
+    def column(self, attr):
+        """
+        Returns the underlying storage for an attribute. Numeric columns
+        are returned as their array buffers and categorical columns as
+        their array of codes. See categories().
+
+        :param attr: The attribute name.
+        :type attr: str
+        :returns: The column storage.
+        :rtype: array.array or list
+        """
+        return self._columns[attr]
+
+    def categories(self, attr):
+        """
+        Returns the distinct values of a categorical attribute, indexed
+        by code.
+
+        :param attr: The categorical attribute name.
+        :type attr: str
+        :returns: The list of values.
+        :rtype: list
+        """
+        return list(self._categories[attr])
+
+    def _numeric_column(self, attr):
+        """
+        Returns a numeric column or raises ModelError.
+
+        :param attr: The attribute name.
+        :type attr: str
+        :returns: The column storage.
+        :rtype: array.array
+        :raises: commissaire.models.ModelError
+        """
+        column = self._columns[attr]
+        if not isinstance(column, array) or attr in self._categories:
+            raise ModelError('{}.{} is not a numeric attribute'.format(
+                self.model_class.__name__, attr))
+        return column
+
+    def _category_mask(self, attr, code):
+        """
+        Returns a cached byte mask selecting the rows of a category.
+
+        :param attr: The categorical attribute name.
+        :type attr: str
+        :param code: The category code.
+        :type code: int
+        :returns: One byte per row, 1 where the row is in the category.
+        :rtype: bytes
+        """
+        mask = self._masks.get((attr, code))
+        if mask is None:
+            mask = bytes(map(code.__eq__, self._columns[attr]))
+            self._masks[(attr, code)] = mask
+        return mask
+
+    def _selector(self, attr, value):
+        """
+        Returns an iterable of booleans selecting rows where attr == value.
+
+        :param attr: The attribute name.
+        :type attr: str
+        :param value: The value to match.
+        :type value: mixed
+        :returns: An iterable of booleans, one per row.
+        :rtype: iterable
+        """
+        if attr in self._categories:
+            code = self._category_codes[attr].get(value)
+            if code is None:
+                return itertools.repeat(False, self._length)
+            return self._category_mask(attr, code)
+        return map(lambda x: x == value, self._columns[attr])
+
+    def where(self, **conditions):
+        """
+        Returns the indexes of rows matching all of the given
+        attribute=value conditions.
+
+        :param conditions: Attribute values to match.
+        :type conditions: dict
+        :returns: Matching row indexes.
+        :rtype: list
+        """
+        mask = itertools.repeat(True, self._length)
+        for attr, value in conditions.items():
+            mask = map(operator.and_, mask, self._selector(attr, value))
+        return list(itertools.compress(range(self._length), mask))
+
+    def sum(self, attr, **conditions):
+        """
+        Returns the sum of a numeric attribute over all rows, or only
+        over rows matching the given attribute=value conditions.
+
+        :param attr: The numeric attribute name.
+        :type attr: str
+        :param conditions: Attribute values to match.
+        :type conditions: dict
+        :returns: The sum.
+        :rtype: int or float
+        :raises: commissaire.models.ModelError
+        """
+        column = self._numeric_column(attr)
+        if not conditions:
+            return sum(column)
+        return sum(column[i] for i in self.where(**conditions))
+
+    def count_by(self, attr):
+        """
+        Returns the number of rows for each value of an attribute.
+
+        :param attr: The attribute name.
+        :type attr: str
+        :returns: Mapping of value to row count.
+        :rtype: dict
+        """
+        counts = collections.Counter(self._columns[attr])
+        if attr in self._categories:
+            categories = self._categories[attr]
+            return {categories[code]: n for code, n in counts.items()}
+        return dict(counts)
+
+    def sum_by(self, attr, group_attr):
+        """
+        Returns the sum of a numeric attribute for each value of a
+        categorical attribute. For example, total memory per status.
+
+        :param attr: The numeric attribute name.
+        :type attr: str
+        :param group_attr: The categorical attribute to group on.
+        :type group_attr: str
+        :returns: Mapping of group value to sum.
+        :rtype: dict
+        :raises: commissaire.models.ModelError
+        """
+        column = self._numeric_column(attr)
+        if group_attr not in self._categories:
+            raise ModelError('{}.{} is not a categorical attribute'.format(
+                self.model_class.__name__, group_attr))
+        totals = {}
+        for code, value in enumerate(self._categories[group_attr]):
+            totals[value] = sum(itertools.compress(
+                column, self._category_mask(group_attr, code)))
+        return totals
+
+    def to_list_model(self, list_class):
+        """
+        Materializes all rows into a new ListModel instance.
+
+        :param list_class: The ListModel class to create.
+        :type list_class: commissaire.models.ListModel
+        :returns: A new list model instance.
+        :rtype: commissaire.models.ListModel
+        """
+        instance = list_class.new()
+        setattr(instance, list_class._list_attr,
+                [row.to_model() for row in self])
+        return instance
+
+
+class RowView(object):
+    """
+    Read only view of a single row of a ColumnarList. Attributes are read
+    from the columns on access; no model instance is created.
+    """
+
+    __slots__ = ('_columnar', '_index')
+
+    def __init__(self, columnar, index):
+        """
+        Creates a new RowView.
+
+        :param columnar: The ColumnarList the row belongs to.
+        :type columnar: commissaire.models.columnar.ColumnarList
+        :param index: The row index.
+        :type index: int
+        """
+        self._columnar = columnar
+        self._index = index
+
+    def __getattr__(self, name):
+        """
+        Returns the value of an attribute for this row.
+
+        :param name: The attribute name.
+        :type name: str
+        :returns: The value.
+        :rtype: mixed
+        :raises: AttributeError
+        """
+        if name not in self._columnar._columns:
+            raise AttributeError(name)
+        return self._columnar._value(name, self._index)
+
+    def to_dict(self):
+        """
+        Returns the row as a dict.
+
+        :returns: The row data.
+        :rtype: dict
+        """
+        return {attr: self._columnar._value(attr, self._index)
+                for attr in self._columnar._columns}
+
+    def to_model(self):
+        """
+        Materializes the row as a model instance.
+
+        :returns: A new model instance.
+        :rtype: commissaire.models.Model
+        """
+        return self._columnar.model_class.new(**self.to_dict())
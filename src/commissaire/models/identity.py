@@ -0,0 +1,194 @@
+# Copyright (C) 2017  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Identity map for model instances.
+"""
+
+import sys
+import threading
+import weakref
+
+from commissaire.models import _rebuild, _weak_class
+
+
+class IdentityMap(object):
+    """
+    Maps (model class, primary key) to a single shared model instance.
+
+    Loading data for a record which already has an instance updates that
+    instance in place and returns it, so every holder sees the latest
+    data and two lookups of the same record give the same object.
+    Instances are held weakly and are dropped once nothing else uses
+    them, so shared instances are instances of a variant of the model
+    class which supports weak references. Values of
+    _categorical_attributes are interned.
+    """
+
+    def __init__(self):
+        """
+        Creates a new IdentityMap.
+        """
+        self._instances = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """
+        Returns the number of live instances.
+
+        :returns: The number of live instances.
+        :rtype: int
+        """
+        return len(self._instances)
+
+    @staticmethod
+    def _key(model_class, primary_key):
+        """
+        Returns the key for a record.
+
+        :param model_class: The model class.
+        :type model_class: commissaire.models.ModelType
+        :param primary_key: The primary key value.
+        :type primary_key: mixed
+        :returns: The key.
+        :rtype: tuple
+        """
+        return (model_class._thawed_class, primary_key)
+
+    @staticmethod
+    def _intern(instance):
+        """
+        Interns the categorical string values of an instance.
+
+        :param instance: The model instance.
+        :type instance: commissaire.models.Model
+        """
+        if instance.frozen:
+            return
+        for attr in instance._categorical_attributes:
+            value = getattr(instance, attr)
+            if type(value) is str:
+                setattr(instance, attr, sys.intern(value))
+
+    def get(self, model_class, primary_key):
+        """
+        Returns the shared instance of a record, if there is one.
+
+        :param model_class: The model class.
+        :type model_class: commissaire.models.ModelType
+        :param primary_key: The primary key value.
+        :type primary_key: mixed
+        :returns: The shared instance or None.
+        :rtype: commissaire.models.Model or None
+        """
+        return self._instances.get(self._key(model_class, primary_key))
+
+    def load(self, model_class, data):
+        """
+        Returns the shared instance for a record updated from data, or a
+        new shared instance created from data. Only the attributes in data,
+        including _extra_attributes such as Cluster.hosts, are updated, so
+        partial data such as a fields projection does not reset the others.
+        Models without a primary key and frozen shared instances are not
+        updated; a new instance is returned instead.
+
+        :param model_class: The model class.
+        :type model_class: commissaire.models.ModelType
+        :param data: Attribute data as returned by the storage service.
+        :type data: dict
+        :returns: The shared instance.
+        :rtype: commissaire.models.Model
+        """
+        primary_key = model_class._primary_key
+        if primary_key is None or primary_key not in data:
+            return model_class.new(**data)
+        key = self._key(model_class, data[primary_key])
+        with self._lock:
+            instance = self._instances.get(key)
+            if instance is None or instance.frozen:
+                instance = _weak_class(model_class._thawed_class).new(**data)
+                self._intern(instance)
+                self._instances[key] = instance
+            else:
+                instance.apply_patch({
+                    k: v for k, v in data.items()
+                    if k in instance._attribute_map})
+                self._load_extra_attributes(instance, data)
+                self._intern(instance)
+        return instance
+
+    def _load_extra_attributes(self, instance, data):
+        """
+        Updates the _extra_attributes of an instance which are in data,
+        such as Cluster.hosts. They are restored by the model __init__ so
+        a new instance is created from data to restore them the same way.
+
+        :param instance: The shared instance.
+        :type instance: commissaire.models.Model
+        :param data: Attribute data as returned by the storage service.
+        :type data: dict
+        """
+        extra = [attr for attr in instance._extra_attributes if attr in data]
+        if extra:
+            loaded = type(instance).new(**data)
+            for attr in extra:
+                setattr(instance, attr, getattr(loaded, attr))
+
+    def add(self, instance):
+        """
+        Makes an instance the shared instance for its record, replacing
+        any previous one. Instances which do not support weak references
+        are copied and the copy is shared instead.
+
+        :param instance: The model instance.
+        :type instance: commissaire.models.Model
+        :returns: The shared instance.
+        :rtype: commissaire.models.Model
+        """
+        if instance._primary_key is not None:
+            if not hasattr(type(instance), '__weakref__'):
+                weak_class = _weak_class(instance._thawed_class)
+                shared = _rebuild(weak_class, instance._attribute_state())
+                if instance.frozen:
+                    shared.freeze()
+                instance = shared
+            self._intern(instance)
+            with self._lock:
+                self._instances[self._key(
+                    type(instance), instance.primary_key)] = instance
+        return instance
+
+    def discard(self, model_class, primary_key):
+        """
+        Forgets the shared instance of a record, such as after it was
+        deleted. Existing holders keep their instance.
+
+        :param model_class: The model class.
+        :type model_class: commissaire.models.ModelType
+        :param primary_key: The primary key value.
+        :type primary_key: mixed
+        """
+        with self._lock:
+            self._instances.pop(self._key(model_class, primary_key), None)
+
+    def clear(self):
+        """
+        Forgets all shared instances.
+        """
+        with self._lock:
+            self._instances.clear()
+
+
+#: Identity map shared by everything in the process which opts in
+PROCESS_IDENTITY_MAP = IdentityMap()
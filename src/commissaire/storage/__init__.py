@@ -19,9 +19,12 @@ Storage related module for Commissaire.
 import logging
 
 from commissaire.errors import CommissaireError
-from commissaire.models import Model
+from commissaire.models import ListModel, Model
 from commissaire.storage.notify import StorageNotify
 
+#: Response member holding the schema fingerprint of the returned records
+SCHEMA_FINGERPRINT_KEY = 'schema_fingerprint'
+
 
 class ConfigurationError(CommissaireError):
     """
@@ -105,6 +108,48 @@ class StoreHandlerBase(object):  # pragma: no cover
         """
         raise NotImplementedError('_list must be overriden.')
 
+    def _patch(self, model_instance, patch):
+        """
+        Updates only the given attributes of stored data and returns back
+        the saved model.
+
+        :param model_instance: Model instance identifying the stored data.
+        :type model_instance: commissaire.model.Model
+        :param patch: Mapping of attribute name to new value.
+        :type patch: dict
+        :returns: The saved model instance.
+        :rtype: commissaire.model.Model
+        :raises StorageLookupError: if data lookup fails
+        """
+        raise NotImplementedError('_patch must be overriden.')
+
+
+def stamp_schema_fingerprint(response, model_class):
+    """
+    Adds the schema fingerprint of model_class to a response, marking the
+    records in its result as validated by the storage service against
+    that schema. For list models the fingerprint of the item class is
+    used. Clients which trust the storage service can then skip
+    validating the records again. See StorageClient.
+
+    Storage services call this on their get and list responses, after
+    validating the records. Models with a hand written _validate have no
+    fingerprint and the response is returned unchanged, so clients always
+    validate those records.
+
+    :param response: The JSON-RPC response to stamp.
+    :type response: dict
+    :param model_class: The model class of the returned records.
+    :type model_class: commissaire.models.ModelType
+    :returns: The response.
+    :rtype: dict
+    """
+    if issubclass(model_class, ListModel):
+        model_class = model_class._list_class
+    if model_class._schema_fingerprint:
+        response[SCHEMA_FINGERPRINT_KEY] = model_class._schema_fingerprint
+    return response
+
 
 def get_uniform_model_type(list_of_model_instances):
     """
@@ -116,7 +161,10 @@ def get_uniform_model_type(list_of_model_instances):
     :rtype: commissaire.models.Model
     :raises: TypeError
     """
-    set_of_types = set([type(x) for x in list_of_model_instances])
+    # Frozen and unfrozen instances of a model share a type here.
+    set_of_types = set([
+        getattr(type(x), '_thawed_class', type(x))
+        for x in list_of_model_instances])
     if len(set_of_types) > 1:
         raise TypeError('Model instances must be of identical type')
     first_type = set_of_types.pop()
@@ -13,13 +13,16 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import copy
 import kombu
 import logging
 
 import commissaire.models as models
 
-from commissaire.bus import RemoteProcedureCallError
-from commissaire.storage import get_uniform_model_type
+from commissaire.bus import RemoteProcedureCallError, StorageLookupError
+from commissaire.util.cache import LRUCache, SingleFlight
+from commissaire.storage import (
+    SCHEMA_FINGERPRINT_KEY, get_uniform_model_type)
 
 
 NOTIFY_EVENT_CREATED = 'created'
@@ -43,6 +46,11 @@ def NotifyCallback(func):
     and a warning message if the notification body fails to meet the above
     criteria (the callback is not invoked in that case).
 
+    If the instance has an identity_map attribute which is not None, models
+    for 'created' and 'updated' events are loaded through it so the shared
+    instance is updated in place, and records of 'deleted' events are
+    removed from it.
+
     :param func: Notification callback function
     :type func: callable
     """
@@ -70,8 +78,15 @@ def NotifyCallback(func):
                 'Invalid class "%s" in notification', class_name)
             return
 
+        identity_map = getattr(self, 'identity_map', None)
         try:
-            model_instance = model_type.new(**model_data)
+            if identity_map is None:
+                model_instance = model_type.new(**model_data)
+            elif event_name == NOTIFY_EVENT_DELETED:
+                model_instance = model_type.new(**model_data)
+                identity_map.discard(model_type, model_instance.primary_key)
+            else:
+                model_instance = identity_map.load(model_type, model_data)
         except TypeError as error:
             logger.warn(
                 'Invalid "%s" model in notification: %s',
@@ -83,20 +98,267 @@ def NotifyCallback(func):
     return inner
 
 
+def _add_fields(params, model_class, fields):
+    """
+    Adds a fields projection to request parameters. The storage service
+    uses it to trim each record before serializing the response.
+
+    :param params: The request parameters to update.
+    :type params: dict
+    :param model_class: The class of the requested records.
+    :type model_class: commissaire.models.ModelType
+    :param fields: Attribute names to fetch, or None for all.
+    :type fields: list or None
+    :raises: commissaire.models.ModelError
+    """
+    if fields is not None:
+        # Compiles (and caches) the projection, rejecting unknown names
+        # before anything is sent.
+        model_class._projection(fields)
+        params['fields'] = list(fields)
+
+
+def _primary_key(model_instance):
+    """
+    Returns the primary key value of a model instance, or None if its
+    model has no primary key, such as WatcherRecord.
+
+    :param model_instance: The model instance.
+    :type model_instance: commissaire.models.Model
+    :returns: The primary key value or None.
+    :rtype: mixed
+    """
+    if model_instance._primary_key is None:
+        return None
+    return model_instance.primary_key
+
+
 class StorageClient:
     """
     Convenience API for talking to the storage service.
     """
 
-    def __init__(self, bus_mixin):
+    def __init__(self, bus_mixin, serializer=None, identity_map=None,
+                 trust_fingerprints=False, cache_policies=None,
+                 coalesce_reads=False):
         """
         Creates a new StorageClient.
 
+        If an identity map is given, such as
+        commissaire.models.identity.PROCESS_IDENTITY_MAP, model instances
+        returned for the same record are shared and updated in place.
+
+        If trust_fingerprints is True, records returned with the schema
+        fingerprint of their model class are not validated again. Only
+        enable this when the storage service is trusted to validate
+        records. See commissaire.storage.stamp_schema_fingerprint().
+
+        serializer opts in to encoding requests with another kombu
+        serializer, such as commissaire.bus.binary.SERIALIZER, once the
+        storage service has shown it accepts it. Messages get smaller but
+        cost more CPU time to encode and decode than JSON does.
+
+        If cache_policies is given, get() and list() results for the
+        model classes in it are kept in a commissaire.util.cache.LRUCache
+        with the given keyword arguments, such as:
+
+            {models.Network: {'max_size': 64, 'ttl': 300},
+             models.Networks: {'max_size': 1, 'ttl': 300}}
+
+        Cached entries are dropped when this client changes the record
+        and when a storage notification for it arrives, so the consumers
+        from get_consumers() must be running. Each hit returns a new model
+        instance. Requests with fields are not cached.
+
+        If coalesce_reads is True, get() and list() calls made while an
+        identical request is in flight from another thread wait for its
+        response instead of sending their own. Writes through this client
+        detach the requests in flight, so reads after a write never share
+        a response requested before it. Records without a primary key are
+        neither cached nor coalesced. See
+        commissaire.util.cache.SingleFlight.
+
         :param bus_mixin: An object that includes the BusMixin API
         :type bus_mixin: commissaire.bus.BusMixin
+        :param serializer: Serializer for requests. See BusMixin.request().
+        :type serializer: str or None
+        :param identity_map: Identity map for returned instances, or None.
+        :type identity_map: commissaire.models.identity.IdentityMap or None
+        :param trust_fingerprints: Skip validating fingerprinted records.
+        :type trust_fingerprints: bool
+        :param cache_policies: Model class to LRUCache arguments, or None.
+        :type cache_policies: dict or None
+        :param coalesce_reads: Share responses of identical reads.
+        :type coalesce_reads: bool
         """
         self.bus_mixin = bus_mixin
+        self.serializer = serializer
+        self.identity_map = identity_map
+        self.trust_fingerprints = trust_fingerprints
         self.notify_callbacks = {}
+        self.caches = {}
+        self.flights = SingleFlight() if coalesce_reads else None
+        for model_class, policy in (cache_policies or {}).items():
+            self.caches[model_class] = LRUCache(**policy)
+        watched = set()
+        for model_class in self.caches:
+            if issubclass(model_class, models.ListModel):
+                model_class = model_class._list_class
+            if model_class not in watched:
+                watched.add(model_class)
+                self.register_callback(self._invalidate_notified, model_class)
+
+    def _load(self, model_class, data):
+        """
+        Returns a model instance for response data, going through the
+        identity map if there is one.
+
+        :param model_class: The model class.
+        :type model_class: commissaire.models.ModelType
+        :param data: Attribute data from the response.
+        :type data: dict
+        :returns: The model instance.
+        :rtype: commissaire.models.Model
+        """
+        if self.identity_map is None:
+            return model_class.new(**data)
+        return self.identity_map.load(model_class, data)
+
+    def _is_trusted(self, response, model_class):
+        """
+        Returns True if the records in a response do not need validation.
+
+        :param response: The JSON-RPC response.
+        :type response: dict
+        :param model_class: The model class of the records.
+        :type model_class: commissaire.models.ModelType
+        :returns: True if the records were validated by a trusted source.
+        :rtype: bool
+        """
+        expected = model_class._schema_fingerprint
+        if not (self.trust_fingerprints and expected):
+            return False
+        return response.get(SCHEMA_FINGERPRINT_KEY) == expected
+
+    def _cache_for(self, model_class, fields=None):
+        """
+        Returns the cache for a model class, or None if the class or the
+        fields projection is not cached.
+
+        :param model_class: The model class.
+        :type model_class: commissaire.models.ModelType
+        :param fields: Attribute names to fetch, or None for all.
+        :type fields: list or None
+        :returns: The cache or None.
+        :rtype: commissaire.util.cache.LRUCache or None
+        """
+        if fields is not None:
+            return None
+        return self.caches.get(model_class)
+
+    def _invalidate(self, model_class, primary_key):
+        """
+        Drops the cached entries holding a record: the record itself and
+        every cached list of its model class. Reads in flight are detached
+        so later reads see the change.
+
+        :param model_class: The model class of the record.
+        :type model_class: commissaire.models.ModelType
+        :param primary_key: The primary key of the record, or None to drop
+                            every record of the class.
+        :type primary_key: mixed
+        """
+        if self.flights is not None:
+            self.flights.clear()
+        for cached_class, cache in self.caches.items():
+            if cached_class is model_class:
+                if primary_key is None:
+                    cache.clear()
+                else:
+                    cache.discard(primary_key)
+            elif getattr(cached_class, '_list_class', None) is model_class:
+                cache.clear()
+
+    def _invalidate_notified(self, body, message):
+        """
+        Notification callback dropping cached entries for the record of
+        any storage notification.
+
+        :param body: The decoded message body.
+        :type body: dict
+        :param message: The message.
+        :type message: kombu.message.Message
+        """
+        model_class = getattr(models, body.get('class', ''), None)
+        if isinstance(model_class, models.ModelType):
+            model_data = body.get('model') or {}
+            self._invalidate(
+                model_class, model_data.get(model_class._primary_key))
+
+    def cache_stats(self):
+        """
+        Returns the counters of each cache.
+
+        :returns: Model class name mapped to commissaire.util.cache stats.
+        :rtype: dict
+        """
+        return {model_class.__name__: cache.stats()
+                for model_class, cache in self.caches.items()}
+
+    def _forget(self, model_instance):
+        """
+        Removes a deleted record from the identity map if there is one,
+        and from the caches.
+
+        :param model_instance: Model instance with identifying data
+        :type model_instance: commissaire.models.Model
+        """
+        primary_key = _primary_key(model_instance)
+        self._invalidate(type(model_instance), primary_key)
+        if self.identity_map is not None and primary_key is not None:
+            self.identity_map.discard(type(model_instance), primary_key)
+
+    def _request(self, routing_key, params):
+        """
+        Sends a request to the storage service with the configured
+        serializer.
+
+        :param routing_key: The routing key to publish on.
+        :type routing_key: str
+        :param params: Keyword parameters to pass to the remote method.
+        :type params: dict
+        :returns: Result
+        :rtype: dict
+        :raises: commissaire.bus.RemoteProcedureCallError
+        """
+        if self.serializer is None:
+            return self.bus_mixin.request(routing_key, params=params)
+        return self.bus_mixin.request(
+            routing_key, params=params, serializer=self.serializer)
+
+    def _read(self, routing_key, params, primary_key=None, coalesce=True):
+        """
+        Sends a read request to the storage service, sharing the response
+        of an identical request in flight if reads are coalesced.
+
+        :param routing_key: The routing key to publish on.
+        :type routing_key: str
+        :param params: Keyword parameters to pass to the remote method.
+        :type params: dict
+        :param primary_key: The primary key of the record, or None.
+        :type primary_key: mixed
+        :param coalesce: False to always send the request.
+        :type coalesce: bool
+        :returns: Result
+        :rtype: dict
+        :raises: commissaire.bus.RemoteProcedureCallError
+        """
+        if self.flights is None or not coalesce:
+            return self._request(routing_key, params)
+        fields = params.get('fields')
+        key = (routing_key, params['model_type_name'], primary_key,
+               None if fields is None else tuple(fields))
+        return self.flights.do(key, self._request, routing_key, params)
 
     def register_callback(self, callback,
                           model_type=None,
@@ -149,35 +411,60 @@ class StorageClient:
                 'Listening for "%s" notifications', routing_key)
         return consumer_list
 
-    def get(self, model_instance):
+    def get(self, model_instance, fields=None):
         """
         Issues a "storage.get" request over the bus using identifying
         data from the model instance and returns a new model instance
         from the response data.
 
+        If fields is given only those attributes are requested from the
+        storage service; the others are left at their defaults.
+
         :param model_instance: Model instance with identifying data
         :type model_instance: commissaire.models.Model
+        :param fields: Attribute names to fetch, or None for all.
+        :type fields: list or None
         :returns: A new model instance with stored data
         :rtype: commissaire.models.Model
-        :raises: commissaire.bus.RemoteProcedureCallError
+        :raises: commissaire.bus.RemoteProcedureCallError,
+                 commissaire.models.ModelError
         """
+        model_class = model_instance.__class__
+        primary_key = _primary_key(model_instance)
+        # Without a primary key there is nothing to key the cache or the
+        # request in flight by.
+        cache = None
+        if primary_key is not None:
+            cache = self._cache_for(model_class, fields)
+        if cache is not None:
+            cached = cache.get(primary_key)
+            if cached is not None:
+                return self._load(model_class, copy.deepcopy(cached))
+            generation = cache.generation
         try:
             params = {
-                'model_type_name': model_instance.__class__.__name__,
+                'model_type_name': model_class.__name__,
                 'model_json_data': model_instance.to_dict()
             }
-            response = self.bus_mixin.request('storage.get', params=params)
-            return model_instance.__class__.new(**response['result'])
-        except RemoteProcedureCallError as error:
+            _add_fields(params, model_class, fields)
+            response = self._read(
+                'storage.get', params, primary_key,
+                coalesce=primary_key is not None)
+            if cache is not None:
+                cache.set(
+                    primary_key, copy.deepcopy(response['result']),
+                    generation)
+            return self._load(model_class, response['result'])
+        except (RemoteProcedureCallError, models.ModelError) as error:
             self.bus_mixin.logger.error(
                 '%s: Unable to get %s "%s": %s',
                 self.bus_mixin.__class__.__name__,
                 model_instance.__class__.__name__,
-                model_instance.primary_key,
+                primary_key,
                 error)
             raise error
 
-    def get_many(self, list_of_model_instances):
+    def get_many(self, list_of_model_instances, fields=None):
         """
         Similar to StorageClient.get(), but takes a list of model instances and
         returns a list of model instances.  The models must be of the same type
@@ -186,9 +473,12 @@ class StorageClient:
         :param list_of_model_instances: List of model instances with
                                         identifying data
         :type list_of_model_instances: [commissaire.models.Model, ...]
+        :param fields: Attribute names to fetch, or None for all.
+        :type fields: list or None
         :returns: List of new model instances with stored data
         :rtype: [commissaire.models.Model, ...]
-        :raises: TypeError, commissaire.bus.RemoteProcedureCallError
+        :raises: TypeError, commissaire.bus.RemoteProcedureCallError,
+                 commissaire.models.ModelError
         """
         # Handle the trivial case immediately
         if len(list_of_model_instances) == 0:
@@ -202,9 +492,10 @@ class StorageClient:
                 'model_type_name': model_class.__name__,
                 'model_json_data': model_json_data
             }
-            response = self.bus_mixin.request('storage.get', params=params)
-            return [model_class.new(**x) for x in response['result']]
-        except RemoteProcedureCallError as error:
+            _add_fields(params, model_class, fields)
+            response = self._request('storage.get', params=params)
+            return [self._load(model_class, x) for x in response['result']]
+        except (RemoteProcedureCallError, models.ModelError) as error:
             self.bus_mixin.logger.error(
                 '%s: Unable to get multiple %s records: %s',
                 self.bus_mixin.__class__.__name__,
@@ -232,13 +523,57 @@ class StorageClient:
                 'model_type_name': model_instance.__class__.__name__,
                 'model_json_data': model_instance.to_dict()
             }
-            response = self.bus_mixin.request('storage.save', params=params)
-            return model_instance.__class__.new(**response['result'])
+            response = self._request('storage.save', params=params)
+            self._invalidate(
+                model_instance.__class__, _primary_key(model_instance))
+            return self._load(model_instance.__class__, response['result'])
         except (RemoteProcedureCallError, models.ValidationError) as error:
             self.bus_mixin.logger.error(
                 '%s: Unable to save %s "%s": %s',
                 self.bus_mixin.__class__.__name__,
                 model_instance.__class__.__name__,
+                _primary_key(model_instance),
+                error)
+            raise error
+
+    def patch(self, model_instance, patch):
+        """
+        Issues a "storage.patch" request over the bus which updates only
+        the attributes in the patch, and returns a new model instance from
+        the response data.  Only the primary key of the model instance is
+        sent to identify the record.  The patched model is validated prior
+        to the remote procedure call.
+
+        Use Model.diff() to build a patch from two instances.
+
+        :param model_instance: Model instance with identifying data
+        :type model_instance: commissaire.models.Model
+        :param patch: Mapping of attribute name to new value
+        :type patch: dict
+        :returns: A new model instance with all saved fields
+        :rtype: commissaire.models.Model
+        :raises: commissaire.bus.RemoteProcedureCallError,
+                 commissaire.models.ModelError
+        """
+        model_class = model_instance.__class__
+        try:
+            patched = model_class.new(**model_instance.to_dict())
+            patched.apply_patch(patch)
+            patched._validate()
+            params = {
+                'model_type_name': model_class.__name__,
+                'model_json_data': {
+                    model_class._primary_key: model_instance.primary_key},
+                'patch': patch,
+            }
+            response = self._request('storage.patch', params=params)
+            self._invalidate(model_class, model_instance.primary_key)
+            return self._load(model_class, response['result'])
+        except (RemoteProcedureCallError, models.ModelError) as error:
+            self.bus_mixin.logger.error(
+                '%s: Unable to patch %s "%s": %s',
+                self.bus_mixin.__class__.__name__,
+                model_class.__name__,
                 model_instance.primary_key,
                 error)
             raise error
@@ -271,8 +606,10 @@ class StorageClient:
                 'model_type_name': model_class.__name__,
                 'model_json_data': model_json_data
             }
-            response = self.bus_mixin.request('storage.save', params=params)
-            return [model_class.new(**x) for x in response['result']]
+            response = self._request('storage.save', params=params)
+            for model_instance in list_of_model_instances:
+                self._invalidate(model_class, _primary_key(model_instance))
+            return [self._load(model_class, x) for x in response['result']]
         except (RemoteProcedureCallError, models.ValidationError) as error:
             self.bus_mixin.logger.error(
                 '%s: Unable to save multiple %s records: %s',
@@ -295,13 +632,14 @@ class StorageClient:
                 'model_type_name': model_instance.__class__.__name__,
                 'model_json_data': model_instance.to_dict()
             }
-            self.bus_mixin.request('storage.delete', params=params)
+            self._request('storage.delete', params=params)
+            self._forget(model_instance)
         except RemoteProcedureCallError as error:
             self.bus_mixin.logger.error(
                 '%s: Unable to delete %s "%s": %s',
                 self.bus_mixin.__class__.__name__,
                 model_instance.__class__.__name__,
-                model_instance.primary_key,
+                _primary_key(model_instance),
                 error)
             raise error
 
@@ -328,7 +666,9 @@ class StorageClient:
                 'model_type_name': model_class.__name__,
                 'model_json_data': model_json_data
             }
-            self.bus_mixin.request('storage.delete', params=params)
+            self._request('storage.delete', params=params)
+            for model_instance in list_of_model_instances:
+                self._forget(model_instance)
         except RemoteProcedureCallError as error:
             self.bus_mixin.logger.error(
                 '%s: Unable to delete multiple %s records: %s',
@@ -337,34 +677,71 @@ class StorageClient:
                 error)
             raise error
 
-    def list(self, model_class):
+    def list(self, model_class, lazy=False, fields=None):
         """
         Issues a "storage.list" request over the bus for the given model
         class, and returns a new model instance from the response data.
 
+        If lazy is True the list items are created with Model.new_lazy()
+        and are only initialized when their attributes are first read.
+        The response is already decoded by then, so this only saves the
+        __init__ and validation of items which are never read. Lazy items
+        are validated when they are hydrated, raising ValidationError on
+        first access, instead of here. Items from a trusted response (see
+        __init__) or from the cache are not validated.
+
+        If fields is given only those item attributes are requested from
+        the storage service; the others are left at their defaults.
+
         :param model_class: A concrete list model class
         :type model_class: commissaire.models.ListModel
+        :param lazy: If the list items should be hydrated on first use.
+        :type lazy: bool
+        :param fields: Item attribute names to fetch, or None for all.
+        :type fields: list or None
         :returns: A new model instance
         :rtype: model_class
         :raises: commissaire.bus.RemoteProcedureCallError,
-                 commissaire.models.ValidationError
+                 commissaire.models.ModelError
         """
+        cache = self._cache_for(model_class, fields)
+        result = None
+        if cache is not None:
+            result = cache.get(None)
+            if result is not None:
+                result = copy.deepcopy(result)
+            generation = cache.generation
         try:
             assert issubclass(model_class, models.ListModel)
-            params = {
-                'model_type_name': model_class.__name__
-            }
-            response = self.bus_mixin.request('storage.list', params=params)
-            model_list = []
             child_class = model_class._list_class
-            for child_dict in response['result']:
-                child_instance = child_class.new(**child_dict)
-                child_instance._validate()
-                model_list.append(child_instance)
+            from_cache = trusted = result is not None
+            if result is None:
+                params = {
+                    'model_type_name': model_class.__name__
+                }
+                _add_fields(params, child_class, fields)
+                response = self._read('storage.list', params)
+                result = response['result']
+                trusted = self._is_trusted(response, child_class)
+            if lazy:
+                model_list = [child_class.new_lazy(x) for x in result]
+            elif trusted:
+                model_list = [self._load(child_class, x) for x in result]
+            else:
+                model_list = [child_class.new(**x) for x in result]
             model_instance = model_class.new()
             setattr(model_instance, model_class._list_attr, model_list)
+            if not (lazy or trusted):
+                model_instance._validate_items(fail_fast=True)
+                # Shared instances are only updated once the data is valid.
+                if self.identity_map is not None:
+                    setattr(model_instance, model_class._list_attr, [
+                        self.identity_map.load(child_class, x)
+                        for x in result])
+            if cache is not None and not from_cache:
+                cache.set(None, copy.deepcopy(result), generation)
             return model_instance
-        except (RemoteProcedureCallError, models.ValidationError) as error:
+        except (RemoteProcedureCallError, models.ModelError) as error:
             self.bus_mixin.logger.error(
                 '%s: Unable to list %ss: %s',
                 self.bus_mixin.__class__.__name__,
@@ -402,6 +779,58 @@ class StorageClient:
         """
         return self.get(models.Host.new(address=address))
 
+    def get_cluster_name_for_host(self, address):
+        """
+        Issues a "storage.get" request for the host to cluster index
+        entry of a host and returns the name of the cluster the host
+        belongs to, without scanning every cluster.
+
+        Clusters stored before the index existed have no entries, so if
+        the host has none the clusters are scanned after all and the
+        entry of the cluster holding the host is saved for next time.
+
+        :param address: Host address
+        :type address: str
+        :returns: The cluster name, or None if the host is in no cluster
+        :rtype: str or None
+        :raises: commissaire.bus.RemoteProcedureCallError
+        """
+        params = {
+            'model_type_name': models.HostCluster.__name__,
+            'model_json_data': {'address': address},
+        }
+        try:
+            response = self._read('storage.get', params, address)
+            name = response['result'].get('cluster')
+            if name:
+                return name
+        except StorageLookupError:
+            pass
+        clusters = self.list(models.Clusters, fields=['name', 'hostset'])
+        for cluster in clusters.clusters:
+            if address in cluster.hostset:
+                self._index_host(address, cluster.name)
+                return cluster.name
+        return None
+
+    def _index_host(self, address, name):
+        """
+        Saves the host to cluster index entry of a host found by scanning
+        the clusters. Failures are logged since the entry is only needed
+        to find the cluster faster next time.
+
+        :param address: Host address
+        :type address: str
+        :param name: The name of the cluster holding the host
+        :type name: str
+        """
+        try:
+            self.save(models.HostCluster.new(address=address, cluster=name))
+        except (RemoteProcedureCallError, models.ModelError) as error:
+            self.bus_mixin.logger.warn(
+                'Unable to index host "%s" of cluster "%s": %s',
+                address, name, error)
+
     def get_network(self, name):
         """
         Issues a "storage.get" request for a network record over the bus
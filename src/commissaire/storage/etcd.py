@@ -24,7 +24,8 @@ from urllib.parse import urlparse
 
 import commissaire.models as models
 
-from commissaire.bus import StorageLookupError
+from commissaire import constants as C
+from commissaire.bus import RemoteProcedureCallError, StorageLookupError
 from commissaire.util.config import etcd_client_args
 from commissaire.storage import StoreHandlerBase, ConfigurationError
 
@@ -38,6 +39,7 @@ _etcd_mapper = {
     'ContainerManagerConfig': '/container_managers/{}',
     'ContainerManagerConfigs': '/container_managers/',
     'Host': '/hosts/{}',
+    'HostCluster': '/host_clusters/{}',
     'HostCreds': '/hosts/{}',  # XXX Temporary hack
     'Hosts': '/hosts',
     'Network': '/networks/{}',
@@ -46,12 +48,44 @@ _etcd_mapper = {
 }
 
 
+def _status_counters(status, sign=1):
+    """
+    Returns the changes to Cluster.hosts counters for a host with the
+    given status joining (sign 1) or leaving (sign -1) a cluster.
+
+    :param status: The host status
+    :type status: str
+    :param sign: 1 for a joining host, -1 for a leaving host
+    :type sign: int
+    :returns: Mapping of counter name to change
+    :rtype: dict
+    """
+    if status == C.HOST_STATUS_ACTIVE:
+        return {'total': sign, 'available': sign, 'unavailable': 0}
+    return {'total': sign, 'available': 0, 'unavailable': sign}
+
+
+def _add_counters(counters, changes):
+    """
+    Adds counter changes to counters in place.
+
+    :param counters: Mapping of counter name to value
+    :type counters: dict
+    :param changes: Mapping of counter name to change
+    :type changes: dict
+    """
+    for key, change in changes.items():
+        counters[key] = counters.get(key, 0) + change
+
+
 class EtcdStoreHandler(StoreHandlerBase):
     """
     Handler for data storage on etcd.
     """
 
     DEFAULT_SERVER_URL = 'http://127.0.0.1:2379'
+    #: How many times _patch retries when the key changes under it
+    PATCH_ATTEMPTS = 5
 
     @classmethod
     def check_config(cls, config):
@@ -124,40 +158,238 @@ class EtcdStoreHandler(StoreHandlerBase):
                 getattr(model_instance, model_instance._primary_key))
         return self._etcd_namespace + subkey
 
+    def _stored_dict(self, key):
+        """
+        Returns the stored value of a key, or an empty dict if the key
+        is not stored.
+
+        :param key: The etcd key
+        :type key: str
+        :returns: The stored value
+        :rtype: dict
+        """
+        try:
+            return json.loads(self._store.get(key).value)
+        except etcd.EtcdKeyNotFound:
+            return {}
+
+    def _host_status(self, address):
+        """
+        Returns the stored status of a host, or None if the host is not
+        stored.
+
+        :param address: The host address
+        :type address: str
+        :returns: The host status
+        :rtype: str or None
+        """
+        key = self._format_key(models.Host.new(address=address))
+        return self._stored_dict(key).get('status')
+
+    def _count_hosts(self, counters, old_hostset, new_hostset):
+        """
+        Returns the Cluster.hosts counters for a change of a cluster's
+        hostset. Only the hosts which were added or removed are read.
+        Clusters stored without counters are counted from scratch.
+        Addresses without a stored host are not counted.
+
+        :param counters: The stored counters, or None
+        :type counters: dict or None
+        :param old_hostset: Host addresses before the change
+        :type old_hostset: iterable
+        :param new_hostset: Host addresses after the change
+        :type new_hostset: iterable
+        :returns: The updated counters
+        :rtype: dict
+        """
+        if isinstance(counters, dict):
+            counters = dict(counters)
+        else:
+            counters = {'total': 0, 'available': 0, 'unavailable': 0}
+            old_hostset = ()
+        old_hostset = set(old_hostset)
+        new_hostset = set(new_hostset)
+        for sign, addresses in ((1, new_hostset - old_hostset),
+                                (-1, old_hostset - new_hostset)):
+            for address in addresses:
+                status = self._host_status(address)
+                if status is not None:
+                    _add_counters(counters, _status_counters(status, sign))
+        return counters
+
+    def _update_cluster_counters(self, address, old_status, new_status):
+        """
+        Updates the Cluster.hosts counters of the cluster a host belongs
+        to for a change of the host's status. The cluster is found through
+        the host to cluster index and written with compare-and-swap, the
+        same as _patch.
+
+        :param address: The host address
+        :type address: str
+        :param old_status: The status before the change, or None if the
+                           host was not stored
+        :type old_status: str or None
+        :param new_status: The status after the change, or None if the
+                           host was deleted
+        :type new_status: str or None
+        """
+        changes = {}
+        if old_status is not None:
+            _add_counters(changes, _status_counters(old_status, -1))
+        if new_status is not None:
+            _add_counters(changes, _status_counters(new_status, 1))
+        if not any(changes.values()):
+            return
+        index_key = self._format_key(models.HostCluster.new(address=address))
+        name = self._stored_dict(index_key).get('cluster')
+        if not name:
+            return
+        key = self._format_key(models.Cluster.new(name=name))
+        for attempt in range(self.PATCH_ATTEMPTS):
+            try:
+                etcd_resp = self._store.get(key)
+            except etcd.EtcdKeyNotFound:
+                return
+            stored_dict = json.loads(etcd_resp.value)
+            if address not in stored_dict.get('hostset', ()):
+                return
+            # Clusters without counters are counted on their next save.
+            if not isinstance(stored_dict.get('hosts'), dict):
+                return
+            _add_counters(stored_dict['hosts'], changes)
+            try:
+                self._store.write(
+                    key, json.dumps(stored_dict),
+                    prevIndex=etcd_resp.modifiedIndex)
+            except etcd.EtcdCompareFailed:
+                continue
+            self.notify.updated(models.Cluster.new(**stored_dict))
+            return
+        self.logger.warn(
+            'Unable to update host counters of "%s" due to concurrent '
+            'updates', key)
+
+    def _index_hostset(self, name, old_hostset, new_hostset):
+        """
+        Updates the host to cluster index for a change of a cluster's
+        hostset. Only the addresses which were added or removed are
+        written. Entries are removed only while they still name the
+        cluster, so a host which moved to another cluster keeps its
+        entry.
+
+        :param name: The cluster name
+        :type name: str
+        :param old_hostset: Host addresses before the change
+        :type old_hostset: iterable
+        :param new_hostset: Host addresses after the change
+        :type new_hostset: iterable
+        """
+        old_hostset = set(old_hostset)
+        new_hostset = set(new_hostset)
+        for address in new_hostset - old_hostset:
+            entry = models.HostCluster.new(address=address, cluster=name)
+            self._store.write(self._format_key(entry), entry.to_json())
+        for address in old_hostset - new_hostset:
+            entry = models.HostCluster.new(address=address, cluster=name)
+            try:
+                self._store.delete(
+                    self._format_key(entry), prevValue=entry.to_json())
+            except (etcd.EtcdKeyNotFound, etcd.EtcdCompareFailed):
+                pass
+
+    def _write_cluster(self, key, model_dict):
+        """
+        Writes a cluster with the host counters of the stored cluster
+        updated for its new hostset. The write uses compare-and-swap
+        against the value the counters were read from, the same as
+        _patch, so counter updates by _update_cluster_counters in the
+        meantime are not lost.
+
+        :param key: The etcd key
+        :type key: str
+        :param model_dict: The cluster data, updated with the counters
+        :type model_dict: dict
+        :returns: The etcd response and the stored hostset
+        :rtype: tuple
+        :raises RemoteProcedureCallError: if every write attempt conflicts
+        """
+        for attempt in range(self.PATCH_ATTEMPTS):
+            try:
+                etcd_resp = self._store.get(key)
+                stored_dict = json.loads(etcd_resp.value)
+                condition = {'prevIndex': etcd_resp.modifiedIndex}
+            except etcd.EtcdKeyNotFound:
+                stored_dict = {}
+                condition = {'prevExist': False}
+            old_hostset = stored_dict.get('hostset', [])
+            model_dict['hosts'] = self._count_hosts(
+                stored_dict.get('hosts'), old_hostset,
+                model_dict.get('hostset', []))
+            try:
+                etcd_resp = self._store.write(
+                    key, json.dumps(model_dict), **condition)
+            except (etcd.EtcdCompareFailed, etcd.EtcdAlreadyExist):
+                self.logger.debug(
+                    'Key "%s" changed while saving (attempt %s)',
+                    key, attempt + 1)
+                continue
+            return etcd_resp, old_hostset
+
+        raise RemoteProcedureCallError(
+            'Unable to save "{}" due to concurrent updates'.format(key),
+            C.JSONRPC_ERRORS['CONFLICT'])
+
     def _save(self, model_instance):
         """
         Saves data to etcd and returns back a saved model.
 
+        .. note::
+
+           The stored data of a Host wins over the saved data, since Host
+           and HostCreds records share a key. Saving an existing Host
+           therefore does not change its status, and the host counters
+           of its cluster only change when a Host is created. Use _patch
+           to change the status of a stored Host.
+
         :param model_instance: Model instance to save
         :type model_instance: commissaire.model.Model
         :returns: The saved model instance
         :rtype: commissaire.model.Model
         """
         key = self._format_key(model_instance)
-        json_string = model_instance.to_json()
-        # XXX Temporary hack to merge Host and HostCreds models
-        #     to the same etcd key.
-        if (isinstance(model_instance, models.HostCreds) or
-                isinstance(model_instance, models.Host)):
-            try:
-                merge_dict = json.loads(self._store.get(key).value)
-                final_dict = json.loads(json_string)
-                final_dict.update(merge_dict)
-                json_string = json.dumps(final_dict)
-            except etcd.EtcdKeyNotFound:
-                pass
-        etcd_resp = self._store.write(key, json_string)
+        # Encoded exactly once below; the dict also builds the returned
+        # model instead of decoding the written value again. It is copied
+        # since it is updated below.
+        model_dict = dict(model_instance.to_dict())
+        old_status = None
+        if isinstance(model_instance, models.Cluster):
+            etcd_resp, old_hostset = self._write_cluster(key, model_dict)
+            self._index_hostset(
+                model_instance.name, old_hostset, model_instance.hostset)
+        else:
+            # XXX Temporary hack to merge Host and HostCreds models
+            #     to the same etcd key.
+            if (isinstance(model_instance, models.HostCreds) or
+                    isinstance(model_instance, models.Host)):
+                try:
+                    merge_dict = json.loads(self._store.get(key).value)
+                    old_status = merge_dict.get('status')
+                    model_dict.update(merge_dict)
+                except etcd.EtcdKeyNotFound:
+                    pass
+            etcd_resp = self._store.write(key, json.dumps(model_dict))
 
         # XXX For HostCreds just return what was passed in, with no
         #     notifications.
         if not isinstance(model_instance, models.HostCreds):
-            model_type = type(model_instance)
-            model_dict = json.loads(etcd_resp.value)
-            model_instance = model_type.new(**model_dict)
+            model_instance = type(model_instance).new(**model_dict)
             if etcd_resp.newKey:
                 self.notify.created(model_instance)
             else:
                 self.notify.updated(model_instance)
+            if isinstance(model_instance, models.Host):
+                self._update_cluster_counters(
+                    model_instance.address, old_status, model_instance.status)
 
         return model_instance
 
@@ -203,7 +435,13 @@ class EtcdStoreHandler(StoreHandlerBase):
             model_type = type(model_instance)
             model_dict = json.loads(etcd_resp._prev_node.value)
             model_instance = model_type.new(**model_dict)
+            if isinstance(model_instance, models.Cluster):
+                self._index_hostset(
+                    model_instance.name, model_instance.hostset, ())
             self.notify.deleted(model_instance)
+            if isinstance(model_instance, models.Host):
+                self._update_cluster_counters(
+                    model_instance.address, model_instance.status, None)
         except etcd.EtcdKeyNotFound as error:
             raise StorageLookupError(str(error), model_instance)
 
@@ -236,5 +474,66 @@ class EtcdStoreHandler(StoreHandlerBase):
 
         return model_instance
 
+    def _patch(self, model_instance, patch):
+        """
+        Updates only the given attributes of data in etcd and returns back
+        the saved model. The write uses compare-and-swap against the index
+        of the value it patched, retrying if another writer got there
+        first.
+
+        :param model_instance: Model instance identifying the stored data
+        :type model_instance: commissaire.model.Model
+        :param patch: Mapping of attribute name to new value
+        :type patch: dict
+        :returns: The saved model instance
+        :rtype: commissaire.model.Model
+        :raises StorageLookupError: if data lookup fails
+        :raises RemoteProcedureCallError: if every write attempt conflicts
+        """
+        key = self._format_key(model_instance)
+        model_type = type(model_instance)
+        for attempt in range(self.PATCH_ATTEMPTS):
+            try:
+                etcd_resp = self._store.get(key)
+            except etcd.EtcdKeyNotFound as error:
+                raise StorageLookupError(str(error), model_instance)
+            # The stored value may hold more than the model (see the
+            # Host and HostCreds hack in _save), so patch it as a dict.
+            stored_dict = json.loads(etcd_resp.value)
+            saved_instance = model_type.new(**stored_dict)
+            old_hostset = list(stored_dict.get('hostset', []))
+            old_status = stored_dict.get('status')
+            saved_instance.apply_patch(patch)
+            expose = []
+            if isinstance(saved_instance, models.Cluster):
+                saved_instance.hosts = self._count_hosts(
+                    stored_dict.get('hosts'), old_hostset,
+                    saved_instance.hostset)
+                expose = ['hosts']
+            stored_dict.update(saved_instance.to_dict(expose=expose))
+            try:
+                self._store.write(
+                    key, json.dumps(stored_dict),
+                    prevIndex=etcd_resp.modifiedIndex)
+            except etcd.EtcdCompareFailed:
+                self.logger.debug(
+                    'Key "%s" changed while patching (attempt %s)',
+                    key, attempt + 1)
+                continue
+
+            if isinstance(saved_instance, models.Cluster):
+                self._index_hostset(
+                    saved_instance.name, old_hostset, saved_instance.hostset)
+            if not isinstance(saved_instance, models.HostCreds):
+                self.notify.updated(saved_instance)
+            if isinstance(saved_instance, models.Host):
+                self._update_cluster_counters(
+                    saved_instance.address, old_status, saved_instance.status)
+            return saved_instance
+
+        raise RemoteProcedureCallError(
+            'Unable to patch "{}" due to concurrent updates'.format(key),
+            C.JSONRPC_ERRORS['CONFLICT'])
+
 
 PluginClass = EtcdStoreHandler
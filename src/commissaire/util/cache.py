@@ -0,0 +1,277 @@
+# Copyright (C) 2017  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Caching related utilities.
+"""
+
+import copy
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    Bounded mapping which evicts the least recently used entry once it is
+    full. Entries optionally expire a number of seconds after they were
+    stored. Lookups are counted as hits or misses. It is safe to use from
+    multiple threads.
+    """
+
+    def __init__(self, max_size=128, ttl=None, clock=time.monotonic):
+        """
+        Creates a new LRUCache.
+
+        :param max_size: The most entries to hold.
+        :type max_size: int
+        :param ttl: Seconds entries stay valid, or None for no expiry.
+        :type ttl: float or None
+        :param clock: Function returning the current time in seconds.
+        :type clock: callable
+        :raises: ValueError
+        """
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1')
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """
+        Returns the number of entries, including expired ones which have
+        not been looked up since.
+
+        :returns: The number of entries.
+        :rtype: int
+        """
+        return len(self._entries)
+
+    @property
+    def generation(self):
+        """
+        Counter which changes every time entries are discarded. Pass it
+        to set() to avoid storing a value fetched before an invalidation.
+
+        :returns: The current generation.
+        :rtype: int
+        """
+        return self._generation
+
+    def get(self, key, default=None):
+        """
+        Returns the value for a key and marks it as recently used.
+
+        :param key: The key to look up.
+        :type key: hashable
+        :param default: Value to return if the key is missing or expired.
+        :type default: mixed
+        :returns: The cached value or default.
+        :rtype: mixed
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, generation=None):
+        """
+        Stores the value for a key, evicting the least recently used
+        entry if the cache is full.
+
+        :param key: The key to store.
+        :type key: hashable
+        :param value: The value to store.
+        :type value: mixed
+        :param generation: If given, the value is only stored when no
+                           entries were discarded since it was read.
+        :type generation: int or None
+        :returns: True if the value was stored.
+        :rtype: bool
+        """
+        expires = None
+        if self.ttl is not None:
+            expires = self.clock() + self.ttl
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return False
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def discard(self, key):
+        """
+        Removes the entry for a key if there is one.
+
+        :param key: The key to remove.
+        :type key: hashable
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generation += 1
+
+    def clear(self):
+        """
+        Removes all entries. Counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def stats(self):
+        """
+        Returns the counters and size of the cache.
+
+        :returns: Mapping with hits, misses, evictions and size.
+        :rtype: dict
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+        }
+
+
+class _Flight(object):
+    """
+    A call in progress for SingleFlight.
+    """
+
+    __slots__ = ('done', 'waiters', 'result', 'error')
+
+    def __init__(self):
+        """
+        Creates a new _Flight.
+        """
+        self.done = threading.Event()
+        self.waiters = 0
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Runs a function once for concurrent calls with the same key. Callers
+    arriving while a call for their key is running wait for it and share
+    its result or exception instead of starting their own. Results are
+    not kept once the call finishes; see LRUCache for that.
+    """
+
+    def __init__(self):
+        """
+        Creates a new SingleFlight.
+        """
+        self.calls = 0
+        self.shared = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """
+        Returns the number of calls in progress.
+
+        :returns: The number of calls in progress.
+        :rtype: int
+        """
+        return len(self._flights)
+
+    def waiting(self, key):
+        """
+        Returns the number of callers waiting for the call for a key.
+
+        :param key: The key of the call.
+        :type key: hashable
+        :returns: The number of waiting callers.
+        :rtype: int
+        """
+        flight = self._flights.get(key)
+        return 0 if flight is None else flight.waiters
+
+    def clear(self):
+        """
+        Detaches the calls in progress, so callers arriving later start
+        new calls instead of waiting for them, such as after a write which
+        the calls in progress may not see. Callers already waiting still
+        share the result of the call they wait for.
+        """
+        with self._lock:
+            self._flights = {}
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Returns func(*args, **kwargs), or the result of the call for the
+        same key already in progress. When a result is shared every caller
+        gets its own deep copy, so it can be changed freely.
+
+        :param key: The key identifying equivalent calls.
+        :type key: hashable
+        :param func: The function to call.
+        :type func: callable
+        :param args: Positional arguments for func.
+        :type args: tuple
+        :param kwargs: Keyword arguments for func.
+        :type kwargs: dict
+        :returns: The result of func.
+        :rtype: mixed
+        :raises: Whatever func raises.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.calls += 1
+            else:
+                flight.waiters += 1
+                self.shared += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+
+        try:
+            result = func(*args, **kwargs)
+        except Exception as error:
+            flight.error = error
+            raise
+        else:
+            flight.result = result
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+        # No caller can join once the flight is removed
+        if flight.waiters:
+            result = copy.deepcopy(result)
+        return result
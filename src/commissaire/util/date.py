@@ -17,9 +17,15 @@ Date/Time related utilities.
 """
 
 import datetime
+import re
 
 from commissaire import constants as C
 
+#: Strings in exactly the C.DATE_FORMAT layout, split into their fields
+_DATE_PATTERN = re.compile(
+    r'([0-9]{4})-([0-9]{2})-([0-9]{2})T([0-9]{2}):([0-9]{2}):([0-9]{2})'
+    r'\.([0-9]{6})\Z')
+
 
 def now():
     """
@@ -43,3 +49,38 @@ def formatted_dt(dt=None):
     if dt is None:
         dt = now()
     return datetime.datetime.strftime(dt, C.DATE_FORMAT)
+
+
+def format_dt(dt):
+    """
+    Returns a datetime in the format expected by all components. This is
+    equivalent to formatted_dt(dt) but does not go through strftime.
+
+    :param dt: The datetime to format.
+    :type dt: datetime.datetime
+    :returns: The date and time in the expected format.
+    :rtype: str
+    """
+    return '%04d-%02d-%02dT%02d:%02d:%02d.%06d' % (
+        dt.year, dt.month, dt.day,
+        dt.hour, dt.minute, dt.second, dt.microsecond)
+
+
+def parse_dt(value):
+    """
+    Returns the datetime for a string in the format expected by all
+    components. Strings in exactly that format are parsed by a regular
+    expression. Anything else falls back to strptime, so the accepted
+    strings are the same as with
+    datetime.datetime.strptime(value, C.DATE_FORMAT).
+
+    :param value: The string to parse.
+    :type value: str
+    :returns: The parsed date and time.
+    :rtype: datetime.datetime
+    :raises: ValueError
+    """
+    match = _DATE_PATTERN.match(value)
+    if match is not None:
+        return datetime.datetime(*map(int, match.groups()))
+    return datetime.datetime.strptime(value, C.DATE_FORMAT)
@@ -17,13 +17,20 @@ Tests for the commissaire.bus module.
 """
 
 import json
+import socket
 import uuid
 
+from concurrent.futures import Future, TimeoutError
+from queue import Empty
+
 from unittest import mock
 
+from kombu.exceptions import EncodeError
+
 from . import TestCase
 
 from commissaire import bus
+from commissaire.bus import binary
 
 
 ID = str(uuid.uuid4())
@@ -80,17 +87,123 @@ class TestCommissaireBusMixin(TestCase):
                 'id': mock.ANY,
                 'method': method,
                 'params': params,
+                'deadline': mock.ANY,
             },
             routing_key,
             declare=[instance._exchange],
-            reply_to=mock.ANY)
+            reply_to=mock.ANY,
+            correlation_id=mock.ANY)
         # The simple queue should be used to get a response
         instance.connection.SimpleQueue.__call__(
             ).get.assert_called_once_with(block=True, timeout=mock.ANY)
+        # The queue is kept for later requests
+        instance.connection.SimpleQueue.__call__().close.assert_not_called()
+        reply_queue = instance._reply_queue
+        instance.request(routing_key, params=params)
+        self.assertIs(reply_queue, instance._reply_queue)
         # And finally the queue should be closed
+        instance.close_reply_queue()
         instance.connection.SimpleQueue.__call__(
             ).close.assert_called_once_with()
 
+    def test_request_with_queue_kwargs(self):
+        """
+        Verify BusMixin.request uses its own queue given SimpleQueue kwargs.
+        """
+        instance = bus.BusMixin()
+        instance.logger = mock.MagicMock()
+        instance.connection = mock.MagicMock()
+        instance.producer = mock.MagicMock()
+        instance.connection.SimpleQueue().get.return_value = mock.MagicMock(
+           payload={'jsonrpc': '2.0', 'result': []})
+        instance.connection.SimpleQueue.call_count = 0
+        instance._exchange = 'exchange'
+
+        instance.request('routing_key.ping', queue_opts={'durable': True})
+        instance.connection.SimpleQueue.assert_called_once_with(
+            mock.ANY, queue_opts={'durable': True, 'auto_delete': True})
+        instance.connection.SimpleQueue.__call__(
+            ).close.assert_called_once_with()
+
+    def test_request_with_serializer(self):
+        """
+        Verify BusMixin.request uses another serializer once accepted.
+        """
+        instance = bus.BusMixin()
+        instance.logger = mock.MagicMock()
+        instance.connection = mock.MagicMock()
+        instance.producer = mock.MagicMock()
+        instance.connection.SimpleQueue().get.return_value = mock.MagicMock(
+           payload={'jsonrpc': '2.0', 'result': []},
+           content_type='application/json')
+        instance._exchange = 'exchange'
+
+        # Sent as json, advertising the serializer
+        instance.request('routing_key.ping', serializer=binary.SERIALIZER)
+        instance.producer.publish.assert_called_once_with(
+            mock.ANY, 'routing_key.ping',
+            headers={'accept': [binary.CONTENT_TYPE, 'application/json']},
+            declare=[instance._exchange],
+            reply_to=mock.ANY,
+            correlation_id=mock.ANY)
+
+        # Still json since the service answered with json so far
+        instance.producer.publish.reset_mock()
+        instance.connection.SimpleQueue().get.return_value = mock.MagicMock(
+           payload={'jsonrpc': '2.0', 'result': []},
+           content_type=binary.CONTENT_TYPE)
+        instance.request('routing_key.ping', serializer=binary.SERIALIZER)
+        self.assertNotIn(
+            'serializer', instance.producer.publish.call_args[1])
+
+        # Sent with the serializer once the service answered with it
+        instance.producer.publish.reset_mock()
+        instance.request('routing_key.pong', serializer=binary.SERIALIZER)
+        instance.producer.publish.assert_called_once_with(
+            mock.ANY, 'routing_key.pong',
+            serializer=binary.SERIALIZER,
+            headers={'accept': [binary.CONTENT_TYPE, 'application/json']},
+            declare=[instance._exchange],
+            reply_to=mock.ANY,
+            correlation_id=mock.ANY)
+
+        # Other services are not affected
+        instance.producer.publish.reset_mock()
+        instance.request('other.ping', serializer=binary.SERIALIZER)
+        self.assertNotIn(
+            'serializer', instance.producer.publish.call_args[1])
+
+    def test_request_with_serializer_fallback(self):
+        """
+        Verify BusMixin.request falls back to json.
+        """
+        instance = bus.BusMixin()
+        instance.logger = mock.MagicMock()
+        instance.connection = mock.MagicMock()
+        instance.producer = mock.MagicMock()
+        instance.connection.SimpleQueue().get.return_value = mock.MagicMock(
+           payload={'jsonrpc': '2.0', 'result': []},
+           content_type='application/json')
+        instance._exchange = 'exchange'
+
+        # Unknown serializer
+        instance.request('routing_key.ping', serializer='bogus')
+        instance.producer.publish.assert_called_once_with(
+            mock.ANY, 'routing_key.ping',
+            declare=[instance._exchange],
+            reply_to=mock.ANY,
+            correlation_id=mock.ANY)
+
+        # Serializer which can not encode the message
+        instance._note_reply_content_type(
+            'routing_key.ping', binary.CONTENT_TYPE)
+        instance.producer.publish.reset_mock()
+        instance.producer.publish.side_effect = [EncodeError('test'), None]
+        instance.request('routing_key.ping', serializer=binary.SERIALIZER)
+        self.assertEquals(2, instance.producer.publish.call_count)
+        self.assertNotIn(
+            'serializer', instance.producer.publish.call_args[1])
+
     def test_failed_request(self):
         """
         Verify BusMixin.request raises an exception for failed method calls.
@@ -155,3 +268,531 @@ class TestCommissaireBusMixin(TestCase):
             },
             routing_key,
             declare=[instance._exchange])
+
+
+class TestReplyQueue(TestCase):
+    """
+    Tests for the persistent reply queue.
+    """
+
+    def setUp(self):
+        """
+        Set up a reply queue on a mock connection.
+        """
+        self.connection = mock.MagicMock()
+        self.reply_queue = bus._ReplyQueue(self.connection, mock.MagicMock())
+        self.queue = self.connection.SimpleQueue()
+
+    def reply(self, id):
+        """
+        Returns a response message for a request id.
+        """
+        return mock.MagicMock(
+            payload={'jsonrpc': '2.0', 'id': id, 'result': id})
+
+    def test_out_of_order_responses(self):
+        """
+        Verify responses are matched to requests by id.
+        """
+        self.reply_queue.expect('a')
+        self.reply_queue.expect('b')
+        self.queue.get.side_effect = [self.reply('b'), self.reply('a')]
+        self.assertEquals('a', self.reply_queue.wait('a', 1)['result'])
+        self.assertEquals('b', self.reply_queue.wait('b', 1)['result'])
+        self.assertEquals(2, self.queue.get.call_count)
+
+    def test_unknown_responses_dropped(self):
+        """
+        Verify responses nobody waits for are dropped.
+        """
+        self.reply_queue.expect('a')
+        self.queue.get.side_effect = [self.reply('late'), self.reply('a')]
+        self.assertEquals('a', self.reply_queue.wait('a', 1)['result'])
+        self.assertEquals({}, self.reply_queue._pending)
+
+    def test_decode_payload(self):
+        """
+        Verify payloads kombu decoded are not decoded again, and text
+        left by kombu is.
+        """
+        response = {'jsonrpc': '2.0', 'id': 'a', 'result': 1}
+        self.assertIs(
+            response, bus._decode_payload(response, 'application/json'))
+        self.assertEquals(response, bus._decode_payload(
+            json.dumps(response), 'text/plain'))
+        # Responses encoded by the service before kombu encoded them
+        logger = mock.MagicMock()
+        self.assertEquals(response, bus._decode_payload(
+            json.dumps(response), 'application/json', logger))
+        self.assertEquals(1, logger.debug.call_count)
+        for payload in ('not json', 1):
+            payload = bus._decode_payload(payload, 'application/json')
+            self.assertEquals(
+                bus.C.JSONRPC_ERRORS['INVALID_JSON'],
+                payload['error']['code'])
+
+    def test_timeout(self):
+        """
+        Verify waiting raises queue.Empty and keeps the request.
+        """
+        self.reply_queue.expect('a')
+        self.queue.get.side_effect = Empty()
+        self.assertRaises(Empty, self.reply_queue.wait, 'a', 1)
+        self.assertEquals({'a'}, self.reply_queue._waiting)
+        self.assertFalse(self.reply_queue._reading)
+        self.reply_queue.forget('a')
+        self.assertEquals(set(), self.reply_queue._waiting)
+
+
+class TestRequestAsync(TestCase):
+    """
+    Tests for BusMixin.request_async and gather.
+    """
+
+    def setUp(self):
+        """
+        Set up a BusMixin on a mock connection.
+        """
+        self.instance = bus.BusMixin()
+        self.instance.logger = mock.MagicMock()
+        self.instance.connection = mock.MagicMock()
+        self.instance.producer = mock.MagicMock()
+        self.instance._exchange = 'exchange'
+        self.queue = self.instance.connection.SimpleQueue()
+
+    def sent_ids(self):
+        """
+        Returns the ids of the published requests.
+        """
+        return [c[0][0]['id']
+                for c in self.instance.producer.publish.call_args_list]
+
+    def respond(self, *payloads):
+        """
+        Makes the reply queue return the given payloads in order.
+        """
+        self.queue.get.side_effect = [
+            mock.MagicMock(payload=payload) for payload in payloads]
+
+    def test_request_async(self):
+        """
+        Verify many requests share the reply queue and resolve by id.
+        """
+        futures = [
+            self.instance.request_async('storage.get', params={'n': n})
+            for n in range(3)]
+        self.queue.get.assert_not_called()
+        ids = self.sent_ids()
+        self.respond(*[{'jsonrpc': '2.0', 'id': id, 'result': id}
+                       for id in reversed(ids)])
+        self.assertFalse(futures[0].done())
+        self.assertEquals(ids, [f.result()['result'] for f in futures])
+        self.assertEquals(3, self.queue.get.call_count)
+        self.assertTrue(all(f.done() for f in futures))
+
+    def test_request_async_error(self):
+        """
+        Verify error responses become exceptions of the future.
+        """
+        future = self.instance.request_async('storage.get')
+        self.respond({
+            'jsonrpc': '2.0', 'id': future.id,
+            'error': {'code': -20000, 'message': 'missing'}})
+        self.assertIsInstance(future.exception(), bus.StorageLookupError)
+        self.assertRaises(bus.StorageLookupError, future.result)
+
+    def test_gather(self):
+        """
+        Verify gather returns results in order and raises errors.
+        """
+        futures = [self.instance.request_async('storage.get')
+                   for _ in range(2)]
+        first, second = self.sent_ids()
+        self.respond(
+            {'jsonrpc': '2.0', 'id': second, 'error': {'message': 'bad'}},
+            {'jsonrpc': '2.0', 'id': first, 'result': 1})
+        results = bus.gather(futures, return_exceptions=True)
+        self.assertEquals(1, results[0]['result'])
+        self.assertIsInstance(results[1], bus.RemoteProcedureCallError)
+        self.assertRaises(bus.RemoteProcedureCallError, bus.gather, futures)
+
+    def test_gather_deadline(self):
+        """
+        Verify gather cancels futures still pending at the deadline.
+        """
+        done = Future()
+        done.set_result('done')
+        pending = self.instance.request_async('storage.get')
+        self.queue.get.side_effect = Empty()
+        results = bus.gather([done, pending], 0, return_exceptions=True)
+        self.assertEquals('done', results[0])
+        self.assertIsInstance(results[1], TimeoutError)
+        self.assertTrue(pending.cancelled())
+        self.assertEquals(set(), self.instance._reply_queue._waiting)
+        self.assertRaises(TimeoutError, bus.gather, [
+            self.instance.request_async('storage.get')], 0)
+
+
+class TestRequestBatch(TestCase):
+    """
+    Tests for BusMixin.request_batch.
+    """
+
+    def setUp(self):
+        """
+        Set up a BusMixin on a mock connection.
+        """
+        self.instance = bus.BusMixin()
+        self.instance.logger = mock.MagicMock()
+        self.instance.connection = mock.MagicMock()
+        self.instance.producer = mock.MagicMock()
+        self.instance._exchange = 'exchange'
+        self.instance.batch_prefixes = frozenset(['storage'])
+        self.queue = self.instance.connection.SimpleQueue()
+        self.calls = [
+            ('storage.get', {'model_type_name': 'Host'}),
+            ('storage.list', {'model_type_name': 'Clusters'}),
+        ]
+
+    def test_request_batch(self):
+        """
+        Verify calls are sent in one message and responses demultiplexed.
+        """
+        def respond(block, timeout):
+            batch = self.instance.producer.publish.call_args[0][0]
+            return mock.MagicMock(payload=[
+                {'jsonrpc': '2.0', 'id': batch[1]['id'], 'result': []},
+                {'jsonrpc': '2.0', 'id': batch[0]['id'],
+                 'error': {'code': -20000, 'message': 'missing'}},
+            ])
+        self.queue.get.side_effect = respond
+
+        results = self.instance.request_batch(
+            self.calls, return_exceptions=True)
+        self.instance.producer.publish.assert_called_once_with(
+            [{'jsonrpc': '2.0', 'id': mock.ANY, 'method': 'get',
+              'params': self.calls[0][1], 'deadline': mock.ANY},
+             {'jsonrpc': '2.0', 'id': mock.ANY, 'method': 'list',
+              'params': self.calls[1][1], 'deadline': mock.ANY}],
+            'storage.batch',
+            declare=[self.instance._exchange],
+            reply_to=mock.ANY,
+            correlation_id=mock.ANY)
+        self.assertIsInstance(results[0], bus.StorageLookupError)
+        self.assertEquals([], results[1]['result'])
+
+        self.assertRaises(
+            bus.StorageLookupError, self.instance.request_batch, self.calls)
+
+    def test_request_batch_unsupported(self):
+        """
+        Verify calls are sent one by one if batches are not supported.
+        """
+        messages = []
+
+        def publish(message, *args, **kwargs):
+            messages.append(message)
+        self.instance.producer.publish.side_effect = publish
+
+        def get(block, timeout):
+            message = messages.pop(0)
+            if isinstance(message, list):
+                return mock.MagicMock(payload={
+                    'jsonrpc': '2.0', 'id': None, 'error': {
+                        'code': -32601, 'message': 'Method not found'}})
+            return mock.MagicMock(payload={
+                'jsonrpc': '2.0', 'id': message['id'],
+                'result': message['method']})
+        self.queue.get.side_effect = get
+
+        results = self.instance.request_batch(self.calls)
+        self.assertEquals(
+            ['get', 'list'], [result['result'] for result in results])
+        self.assertEquals(3, self.instance.producer.publish.call_count)
+
+    def test_request_batch_timeout(self):
+        """
+        Verify calls are not sent again if a batch is not answered.
+        """
+        self.queue.get.side_effect = Empty()
+
+        self.assertRaises(
+            Empty, self.instance.request_batch, self.calls, timeout=0.1)
+        self.assertEquals(1, self.instance.producer.publish.call_count)
+        self.assertEquals(set(), self.instance._reply_queue._waiting)
+
+        # The next batch is tried again
+        self.assertRaises(
+            Empty, self.instance.request_batch, self.calls, timeout=0.1)
+        self.assertEquals(
+            ['storage.batch', 'storage.batch'],
+            [call[0][1]
+             for call in self.instance.producer.publish.call_args_list])
+
+    def test_request_batch_not_enabled(self):
+        """
+        Verify calls are sent one by one to services not in
+        batch_prefixes.
+        """
+        self.instance.batch_prefixes = frozenset()
+        messages = []
+
+        def publish(message, *args, **kwargs):
+            messages.append(message)
+        self.instance.producer.publish.side_effect = publish
+
+        def get(block, timeout):
+            message = messages.pop(0)
+            return mock.MagicMock(payload={
+                'jsonrpc': '2.0', 'id': message['id'],
+                'result': message['method']})
+        self.queue.get.side_effect = get
+
+        results = self.instance.request_batch(self.calls)
+        self.assertEquals(
+            ['get', 'list'], [result['result'] for result in results])
+        self.assertEquals(
+            ['storage.get', 'storage.list'],
+            [call[0][1]
+             for call in self.instance.producer.publish.call_args_list])
+
+    def test_request_batch_prefix(self):
+        """
+        Verify batched calls must go to one service.
+        """
+        self.assertRaises(
+            ValueError, self.instance.request_batch,
+            [('storage.get', {}), ('containermgr.get', {})])
+        self.assertEquals([], self.instance.request_batch([]))
+
+
+class TestDeadlines(TestCase):
+    """
+    Tests for request timeouts, deadlines and retries.
+    """
+
+    def setUp(self):
+        """
+        Set up a BusMixin on a mock connection.
+        """
+        self.instance = bus.BusMixin()
+        self.instance.logger = mock.MagicMock()
+        self.instance.connection = mock.MagicMock()
+        self.instance.producer = mock.MagicMock()
+        self.instance._exchange = 'exchange'
+        self.queue = self.instance.connection.SimpleQueue()
+
+    def sent(self):
+        """
+        Returns the last published request.
+        """
+        return self.instance.producer.publish.call_args[0][0]
+
+    def test_deadline_expired(self):
+        """
+        Verify deadline_expired compares the deadline member to now.
+        """
+        self.assertFalse(bus.deadline_expired({'id': ID}))
+        self.assertFalse(bus.deadline_expired({'deadline': 'soon'}))
+        self.assertFalse(bus.deadline_expired({'deadline': 10}, now=5))
+        self.assertTrue(bus.deadline_expired({'deadline': 10}, now=15))
+
+    @mock.patch('time.time', return_value=100)
+    def test_timeouts(self, _time):
+        """
+        Verify timeouts come from the call, the method or the default.
+        """
+        with self.assertRaises(TypeError):
+            bus.BusMixin.request_timeouts['storage.list'] = 30
+        self.instance.request_timeouts = {'storage.list': 30}
+        self.assertEquals({}, dict(bus.BusMixin().request_timeouts))
+        future = self.instance.request_async('storage.get')
+        self.assertEquals(bus.REQUEST_TIMEOUT, future.timeout)
+        self.assertAlmostEqual(
+            100 + bus.REQUEST_TIMEOUT, self.sent()['deadline'], places=2)
+        future = self.instance.request_async('storage.list')
+        self.assertEquals(30, future.timeout)
+        self.assertAlmostEqual(130, self.sent()['deadline'], places=2)
+        future = self.instance.request_async('storage.list', timeout=2)
+        self.assertEquals(2, future.timeout)
+        self.assertAlmostEqual(102, self.sent()['deadline'], places=2)
+
+        self.queue.get.side_effect = lambda block, timeout: (
+            mock.MagicMock(payload={
+                'jsonrpc': '2.0', 'id': self.sent()['id'], 'result': []}))
+        self.instance.request('storage.get', timeout=3)
+        waited = self.queue.get.call_args[1]['timeout']
+        self.assertTrue(2 < waited <= 3)
+
+    @mock.patch('time.sleep')
+    def test_retries(self, _sleep):
+        """
+        Verify idempotent methods are retried with a growing backoff.
+        """
+        self.instance.retry_backoff = 1
+        self.instance.retry_backoff_max = 10
+        self.queue.get.side_effect = Empty()
+        with mock.patch('random.uniform', side_effect=lambda a, b: b):
+            self.assertRaises(
+                Empty, self.instance.request, 'storage.get', timeout=10)
+        self.assertEquals(3, self.instance.producer.publish.call_count)
+        self.assertEquals(
+            [mock.call(1), mock.call(2)], _sleep.call_args_list)
+        ids = [c[0][0]['id']
+               for c in self.instance.producer.publish.call_args_list]
+        self.assertEquals(3, len(set(ids)))
+
+        def respond(block, timeout):
+            if self.instance.producer.publish.call_count < 2:
+                raise Empty()
+            return mock.MagicMock(payload={
+                'jsonrpc': '2.0', 'id': self.sent()['id'], 'result': 'ok'})
+        self.instance.producer.publish.reset_mock()
+        self.queue.get.side_effect = respond
+        self.assertEquals(
+            'ok', self.instance.request('storage.list')['result'])
+        self.assertEquals(2, self.instance.producer.publish.call_count)
+
+    @mock.patch('time.sleep')
+    def test_deadline_uses_monotonic_clock(self, _sleep):
+        """
+        Verify deadlines do not move with the system clock.
+        """
+        with mock.patch('time.monotonic', return_value=50), \
+                mock.patch('time.time', return_value=1000):
+            message = self.instance._jsonrpc_message('storage.get', {}, 60)
+        self.assertEquals(1010, message['deadline'])
+
+    @mock.patch('time.sleep')
+    def test_retries_share_deadline(self, _sleep):
+        """
+        Verify retries only wait for the time left until the deadline.
+        """
+        self.instance.retry_backoff = 1
+        self.instance.retry_backoff_max = 10
+        self.queue.get.side_effect = Empty()
+        with mock.patch('time.time', return_value=100), \
+                mock.patch('random.uniform', side_effect=lambda a, b: b):
+            self.assertRaises(
+                Empty, self.instance.request, 'storage.get', timeout=1.5)
+        # The second backoff would pass the deadline
+        self.assertEquals(2, self.instance.producer.publish.call_count)
+        self.assertEquals([mock.call(1)], _sleep.call_args_list)
+        self.assertTrue(0 < self.queue.get.call_args[1]['timeout'] <= 0.5)
+        self.assertTrue(100 < self.sent()['deadline'] <= 100.5)
+
+    @mock.patch('time.sleep')
+    def test_no_retries(self, _sleep):
+        """
+        Verify other methods and errors from services are not retried.
+        """
+        self.queue.get.side_effect = Empty()
+        self.assertRaises(
+            Empty, self.instance.request, 'storage.save', timeout=0)
+        self.assertEquals(1, self.instance.producer.publish.call_count)
+        self.queue.get.side_effect = lambda block, timeout: (
+            mock.MagicMock(payload={
+                'jsonrpc': '2.0', 'id': self.sent()['id'],
+                'error': {'code': -20000, 'message': 'missing'}}))
+        self.assertRaises(
+            bus.StorageLookupError, self.instance.request, 'storage.get')
+        self.assertEquals(2, self.instance.producer.publish.call_count)
+        _sleep.assert_not_called()
+
+
+class TestReplyModes(TestCase):
+    """
+    Tests for the reply modes of BusMixin.
+    """
+
+    def setUp(self):
+        """
+        Set up a BusMixin on a mock AMQP connection.
+        """
+        self.instance = bus.BusMixin()
+        self.instance.logger = mock.MagicMock()
+        self.instance.connection = mock.MagicMock()
+        self.instance.connection.transport.driver_type = 'amqp'
+        self.instance.producer = mock.MagicMock()
+        self.instance._exchange = 'exchange'
+
+    def test_parse_reply_mode(self):
+        """
+        Verify parse_reply_mode splits the reply mode off bus URIs.
+        """
+        self.assertEquals(
+            ('amqp://127.0.0.1:5672/?heartbeat=10', bus.REPLY_MODE_DIRECT),
+            bus.parse_reply_mode(
+                'amqp://127.0.0.1:5672/?reply_mode=direct&heartbeat=10'))
+        self.assertEquals(
+            ('redis://127.0.0.1:6379/', bus.REPLY_MODE_QUEUE),
+            bus.parse_reply_mode('redis://127.0.0.1:6379/'))
+        self.assertRaises(
+            ValueError, bus.parse_reply_mode, 'amqp://host/?reply_mode=x')
+
+    @mock.patch('commissaire.bus.Producer')
+    @mock.patch('commissaire.bus.Consumer')
+    def test_direct_reply_to(self, _consumer, _producer):
+        """
+        Verify AMQP transports use direct reply-to when enabled.
+        """
+        self.assertIs(
+            bus._ReplyQueue, type(self.instance._create_reply_queue()))
+        _consumer.assert_not_called()
+        self.instance.connection.SimpleQueue.reset_mock()
+
+        self.instance.reply_mode = bus.REPLY_MODE_AUTO
+        reply_queue = self.instance._get_reply_queue()
+        self.assertIsInstance(reply_queue, bus._DirectReplyQueue)
+        _consumer.return_value.consume.assert_called_once_with()
+        self.instance.connection.SimpleQueue.assert_not_called()
+
+        def drain_events(timeout):
+            message = _producer().publish.call_args[0][0]
+            reply_queue._on_message(
+                {'jsonrpc': '2.0', 'id': message['id'], 'result': 1},
+                mock.MagicMock())
+        self.instance.connection.drain_events.side_effect = drain_events
+
+        result = self.instance.request('storage.get')
+        self.assertEquals(1, result['result'])
+        _producer().publish.assert_called_once_with(
+            mock.ANY, 'storage.get',
+            declare=[self.instance._exchange],
+            reply_to=bus.DIRECT_REPLY_TO,
+            correlation_id=mock.ANY)
+        self.instance.producer.publish.assert_not_called()
+
+        self.instance.close_reply_queue()
+        _consumer().cancel.assert_called_once_with()
+        reply_queue.channel.close.assert_called_once_with()
+
+    @mock.patch('commissaire.bus.Producer')
+    @mock.patch('commissaire.bus.Consumer')
+    def test_direct_reply_to_timeout(self, _consumer, _producer):
+        """
+        Verify direct reply-to timeouts raise queue.Empty.
+        """
+        self.instance.reply_mode = bus.REPLY_MODE_DIRECT
+        self.instance.connection.drain_events.side_effect = socket.timeout()
+        self.assertRaises(Empty, self.instance.request, 'storage.get')
+
+    @mock.patch('commissaire.bus.Consumer')
+    def test_fallback(self, _consumer):
+        """
+        Verify the reply queue is used where direct reply-to is not.
+        """
+        self.instance.reply_mode = bus.REPLY_MODE_QUEUE
+        self.assertIs(
+            bus._ReplyQueue, type(self.instance._create_reply_queue()))
+
+        self.instance.reply_mode = bus.REPLY_MODE_DIRECT
+        _consumer.side_effect = Exception('NOT_FOUND - no queue')
+        self.assertIs(
+            bus._ReplyQueue, type(self.instance._create_reply_queue()))
+        self.assertEquals(1, self.instance.logger.warn.call_count)
+
+        self.instance.connection.transport.driver_type = 'redis'
+        self.instance.reply_mode = bus.REPLY_MODE_AUTO
+        self.assertIs(
+            bus._ReplyQueue, type(self.instance._create_reply_queue()))
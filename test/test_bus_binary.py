@@ -0,0 +1,109 @@
+# Copyright (C) 2017  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Tests for the commissaire.bus.binary module.
+"""
+
+import json
+
+from kombu import serialization
+
+from . import TestCase
+
+from commissaire import models
+from commissaire.bus import binary
+
+
+class TestBinary(TestCase):
+    """
+    Tests for the binary encoding.
+    """
+
+    def test_round_trip(self):
+        """
+        Verify all JSON compatible values survive a round trip.
+        """
+        value = {
+            'none': None, 'true': True, 'false': False,
+            'ints': [0, 1, 127, 128, 300, -1, -300, 2 ** 70, -2 ** 70],
+            'float': 1.5, 'str': 'héllo', 'empty': '',
+            'list': [[], {}, ['a', 'a']],
+            'nested': {'a': {'b': {'c': 'd'}}},
+        }
+        self.assertEquals(value, binary.loads(binary.dumps(value)))
+
+    def test_matches_json(self):
+        """
+        Verify values decode the same as a JSON round trip.
+        """
+        value = {1: (1, 2), True: None, 'floats': [1.0]}
+        self.assertEquals(
+            json.loads(json.dumps(value)),
+            binary.loads(binary.dumps(value)))
+
+    def test_models(self):
+        """
+        Verify serialized models round trip and are smaller than JSON.
+        """
+        hosts = models.Hosts.new(hosts=[
+            models.Host.new(address='10.0.0.{}'.format(x), status='active')
+            for x in range(50)])
+        data = hosts.to_dict()
+        encoded = binary.dumps(data)
+        self.assertEquals(data, binary.loads(encoded))
+        self.assertLess(len(encoded) * 3, len(json.dumps(data)))
+
+    def test_shapes_and_strings_are_interned(self):
+        """
+        Verify repeated dict shapes and strings are only written once.
+        """
+        one = len(binary.dumps([{'status': 'active'}]))
+        two = len(binary.dumps([{'status': 'active'}] * 2))
+        # A shape reference plus a string reference.
+        self.assertEquals(4, two - one)
+
+    def test_bytes(self):
+        """
+        Verify bytes are kept as bytes.
+        """
+        self.assertEquals(b'\x00\xff', binary.loads(binary.dumps(b'\x00\xff')))
+
+    def test_unsupported(self):
+        """
+        Verify unsupported values raise TypeError.
+        """
+        self.assertRaises(TypeError, binary.dumps, object())
+        self.assertRaises(TypeError, binary.dumps, {(1, 2): 'tuple key'})
+
+    def test_invalid(self):
+        """
+        Verify invalid messages raise ValueError.
+        """
+        encoded = binary.dumps({'a': 'b'})
+        for data in (b'', b'{}', encoded[:-1], encoded + b'\x00',
+                     binary.MAGIC + b'\x7f'):
+            self.assertRaises(ValueError, binary.loads, data)
+
+    def test_kombu_serializer(self):
+        """
+        Verify the encoding is registered with kombu.
+        """
+        content_type, encoding, data = serialization.dumps(
+            {'a': [1, 2]}, serializer=binary.SERIALIZER)
+        self.assertEquals(binary.CONTENT_TYPE, content_type)
+        self.assertEquals(binary.CONTENT_ENCODING, encoding)
+        self.assertEquals(
+            {'a': [1, 2]},
+            serialization.loads(data, content_type, encoding))
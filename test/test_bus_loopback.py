@@ -0,0 +1,194 @@
+# Copyright (C) 2017  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Tests for the commissaire.bus.loopback module.
+"""
+
+from unittest import mock
+
+from . import TestCase
+
+from commissaire import bus
+from commissaire.bus import loopback
+from commissaire.models import Host
+from commissaire.storage.client import StorageClient
+
+
+class FakeStorage(object):
+    """
+    Storage service handlers backed by a dict.
+    """
+
+    def __init__(self):
+        self.records = {}
+
+    def on_get(self, message, model_type_name, model_json_data):
+        key = (model_type_name, model_json_data['address'])
+        if key not in self.records:
+            raise bus.StorageLookupError('No such record')
+        return self.records[key]
+
+    def on_save(self, message, model_type_name, model_json_data):
+        key = (model_type_name, model_json_data['address'])
+        self.records[key] = model_json_data
+        return model_json_data
+
+    def on_fail(self, message):
+        raise KeyError('broken')
+
+
+class TestTopicMatches(TestCase):
+    """
+    Tests for the topic_matches function.
+    """
+
+    def test_topic_matches(self):
+        """
+        Verify AMQP topic wildcards.
+        """
+        for pattern, routing_key, expected in (
+                ('notify.storage.Host.created',
+                 'notify.storage.Host.created', True),
+                ('notify.storage.*.created',
+                 'notify.storage.Host.created', True),
+                ('notify.storage.*', 'notify.storage.Host.created', False),
+                ('notify.#', 'notify.storage.Host.created', True),
+                ('notify.#.created', 'notify.created', True),
+                ('#', 'anything.at.all', True),
+                ('notify.storage.Host.*', 'notify.storage.Host', False)):
+            self.assertEquals(
+                expected, loopback.topic_matches(pattern, routing_key),
+                (pattern, routing_key))
+
+
+class TestLoopbackBusMixin(TestCase):
+    """
+    Tests for the LoopbackBusMixin class.
+    """
+
+    def setUp(self):
+        """
+        Set up a LoopbackBusMixin on its own router.
+        """
+        self.storage = FakeStorage()
+        self.instance = loopback.LoopbackBusMixin()
+        self.instance.logger = mock.MagicMock()
+        self.instance.router = loopback.LoopbackRouter()
+        self.instance.router.register_service('storage', self.storage)
+
+    def test_request(self):
+        """
+        Verify requests call the handler and copy its result.
+        """
+        record = {'address': '10.0.0.1', 'roles': ['node']}
+        response = self.instance.request('storage.save', params={
+            'model_type_name': 'Host', 'model_json_data': record})
+        self.assertEquals('2.0', response['jsonrpc'])
+        self.assertIs(record, self.storage.records[('Host', '10.0.0.1')])
+        self.assertEquals(record, response['result'])
+        self.assertIsNot(record, response['result'])
+        response['result']['roles'].append('master')
+        self.assertEquals(['node'], record['roles'])
+
+    def test_request_message(self):
+        """
+        Verify handlers get the request message with its deadline.
+        """
+        handler = mock.MagicMock(return_value='pong')
+        self.storage.on_ping = handler
+        response = self.instance.request('storage.ping', timeout=5)
+        message = handler.call_args[0][0]
+        self.assertEquals(response['id'], message.payload['id'])
+        self.assertEquals(
+            response['id'], message.properties['correlation_id'])
+        self.assertFalse(bus.deadline_expired(message.payload))
+        self.assertEquals('pong', response['result'])
+
+    def test_request_errors(self):
+        """
+        Verify errors map to the same exceptions as over the bus.
+        """
+        params = {'model_type_name': 'Host',
+                  'model_json_data': {'address': 'nowhere'}}
+        self.assertRaises(
+            bus.StorageLookupError, self.instance.request, 'storage.get',
+            params=params)
+        self.instance.logger.warn.assert_called_once_with(
+            'Message "%s" contains error: %s', mock.ANY, mock.ANY)
+        self.instance.logger.error.assert_not_called()
+        with self.assertRaises(bus.RemoteProcedureCallError) as context:
+            self.instance.request('storage.fail')
+        self.assertEquals(
+            bus.C.JSONRPC_ERRORS['INTERNAL_ERROR'], context.exception.code)
+        self.assertIn('KeyError', context.exception.data['exception'])
+        for routing_key in ('storage.missing', 'nothing.get'):
+            with self.assertRaises(bus.RemoteProcedureCallError) as context:
+                self.instance.request(routing_key)
+            self.assertEquals(
+                bus.C.JSONRPC_ERRORS['METHOD_NOT_FOUND'],
+                context.exception.code)
+
+    def test_request_async_and_batch(self):
+        """
+        Verify futures and batches resolve immediately.
+        """
+        self.storage.on_ping = lambda message: 'pong'
+        future = self.instance.request_async('storage.ping')
+        self.assertTrue(future.done())
+        self.assertEquals('pong', future.result()['result'])
+        self.assertIsInstance(
+            self.instance.request_async('storage.fail').exception(),
+            bus.RemoteProcedureCallError)
+
+        results = self.instance.request_batch(
+            [('storage.ping', {}), ('storage.fail', {})],
+            return_exceptions=True)
+        self.assertEquals('pong', results[0]['result'])
+        self.assertIsInstance(results[1], bus.RemoteProcedureCallError)
+        self.assertRaises(
+            ValueError, self.instance.request_batch,
+            [('storage.ping', {}), ('other.ping', {})])
+
+    def test_notify(self):
+        """
+        Verify notifications reach matching subscribers.
+        """
+        matching = mock.MagicMock()
+        other = mock.MagicMock()
+        self.instance.router.subscribe('notify.storage.#', matching)
+        self.instance.router.subscribe('notify.other.*', other)
+        self.instance.notify('notify.storage.Host.created', {'a': 1})
+        body, message = matching.call_args[0]
+        self.assertEquals(
+            {'jsonrpc': '2.0', 'method': 'created', 'params': {'a': 1}},
+            body)
+        self.assertEquals(
+            'notify.storage.Host.created',
+            message.delivery_info['routing_key'])
+        other.assert_not_called()
+        self.instance.router.unsubscribe('notify.storage.#', matching)
+        self.instance.notify('notify.storage.Host.created')
+        self.assertEquals(1, matching.call_count)
+
+    def test_storage_client(self):
+        """
+        Verify StorageClient works over the loopback transport.
+        """
+        client = StorageClient(self.instance)
+        client.save(Host.new(address='10.0.0.1', status='active'))
+        host = client.get_host('10.0.0.1')
+        self.assertEquals('active', host.status)
+        self.assertRaises(
+            bus.StorageLookupError, client.get_host, '10.0.0.2')
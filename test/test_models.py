@@ -16,14 +16,17 @@
 Tests for the commissaire.models module.
 """
 
+import copy
 import json
 
+from datetime import datetime
 from unittest import mock
 
 from . import TestCase
 
 from commissaire import constants as C
 from commissaire import models
+from commissaire.util.date import formatted_dt
 
 
 class TestModel(TestCase):
@@ -78,6 +81,40 @@ class TestModel(TestCase):
         for key, value in models.Cluster._attribute_defaults.items():
             self.assertEquals(value, getattr(instance, key))
 
+    def test_new_does_not_share_mutable_defaults(self):
+        """
+        Verify new builds fresh mutable defaults for each instance.
+        """
+        first = models.Cluster.new(name='first')
+        second = models.Cluster.new(name='second')
+        first.hostset.append('127.0.0.1')
+        self.assertEquals([], second.hostset)
+        self.assertEquals([], models.Cluster._attribute_defaults['hostset'])
+        self.assertEquals([], models.Cluster.new(name='third').hostset)
+
+    def test_new_copies_nested_defaults(self):
+        """
+        Verify new deep copies non-empty mutable defaults.
+        """
+        instance = models.Network.new(name='test', options={'a': [1]})
+        self.assertEquals({'a': [1]}, instance.options)
+
+        class NestedModel(models.Model):
+            _attribute_map = {'data': {'type': dict}}
+            _attribute_defaults = {'data': {'nested': []}}
+
+        first = NestedModel.new()
+        first.data['nested'].append(1)
+        self.assertEquals({'nested': []}, NestedModel.new().data)
+
+    def test_new_explicit_arguments_win(self):
+        """
+        Verify explicit arguments to new override defaults.
+        """
+        options = {'key': 'value'}
+        instance = models.Network.new(name='test', options=options)
+        self.assertIs(options, instance.options)
+
     def test__must_be_in_good(self):
         """
         Verify _must_be_in doesn't appends to errors if attribute is present.
@@ -175,6 +212,367 @@ class TestModel(TestCase):
             'hosts',
             instance.to_dict_safe(expose=['hosts']))
 
+    def test_to_dict_does_not_share_state(self):
+        """
+        Verify to_dict copies mutable attribute values.
+        """
+        instance = models.Cluster.new(name='test', hostset=['127.0.0.1'])
+        data = instance.to_dict()
+        data['hostset'].append('127.0.0.2')
+        self.assertEquals(['127.0.0.1'], instance.hostset)
+
+    def test_to_dict_safe_respects_hidden_attributes(self):
+        """
+        Verify to_dict_safe omits hidden attributes.
+        """
+        instance = models.Cluster.new(name='test')
+        self.assertIn('hostset', instance.to_dict())
+        self.assertNotIn('hostset', instance.to_dict_safe())
+
+    def test_fields(self):
+        """
+        Verify fields limits serialized output to the given attributes.
+        """
+        instance = models.Cluster.new(
+            name='test', status='ok', hostset=['127.0.0.1'])
+        expected = {'name': 'test', 'status': 'ok'}
+        fields = ['status', 'name']
+        self.assertEquals(expected, instance.to_dict(fields=fields))
+        self.assertEquals(expected, json.loads(instance.to_json(fields=fields)))
+        self.assertEquals(
+            {'name': 'test'},
+            instance.to_dict_safe(fields=['name', 'hostset']))
+        self.assertEquals(
+            {'hostset': ['127.0.0.1']},
+            instance.to_dict(fields=['hostset']))
+        self.assertEquals({}, instance.to_dict(fields=[]))
+
+    def test_fields_are_cached(self):
+        """
+        Verify projected serializers are compiled once per field list.
+        """
+        models.Host._projections.clear()
+        instance = models.Host.new(address='127.0.0.1')
+        instance.to_json(fields=['address'])
+        instance.to_json(fields=('address', ))
+        self.assertEquals(1, len(models.Host._projections))
+        self.assertIsNot(models.Host._projections, models.Cluster._projections)
+
+    def test_fields_copies_mutable_values(self):
+        """
+        Verify to_dict with fields copies mutable attribute values.
+        """
+        instance = models.Cluster.new(name='test', hostset=['127.0.0.1'])
+        data = instance.to_dict(fields=['hostset'])
+        data['hostset'].append('127.0.0.2')
+        self.assertEquals(['127.0.0.1'], instance.hostset)
+
+    def test_fields_unknown_attribute(self):
+        """
+        Verify fields raises ModelError for unknown attributes.
+        """
+        instance = models.Host.new(address='127.0.0.1')
+        self.assertRaises(
+            models.ModelError, instance.to_dict, fields=['nope'])
+
+    def test_to_dict_matches_to_json(self):
+        """
+        Verify to_dict returns the same data as decoding to_json.
+        """
+        instance = models.Hosts.new(hosts=[
+            models.Host.new(address='127.0.0.1'),
+            models.Host.new(address='127.0.0.2', cpus=2)])
+        self.assertEquals(
+            json.loads(instance.to_json()), instance.to_dict())
+        self.assertEquals(
+            json.loads(instance.to_json_safe()), instance.to_dict_safe())
+
+    def test_slots(self):
+        """
+        Verify model instances store attributes in generated slots.
+        """
+        instance = models.Host.new(address='127.0.0.1')
+        self.assertFalse(hasattr(instance, '__dict__'))
+        self.assertEquals(
+            set(models.Host._attribute_map.keys()),
+            set(models.Host.__slots__))
+        self.assertRaises(AttributeError, setattr, instance, 'bogus', 1)
+
+    def test_extra_attributes(self):
+        """
+        Verify _extra_attributes are available on slotted instances.
+        """
+        instance = models.Cluster.new(name='test')
+        self.assertEquals(0, instance.hosts['total'])
+        instance.hosts = {'total': 1, 'available': 1, 'unavailable': 0}
+        self.assertEquals(1, instance.to_dict(expose=['hosts'])['hosts']['total'])
+
+    def test_cluster_stored_hosts(self):
+        """
+        Verify Cluster restores stored host counters.
+        """
+        hosts = {'total': 2, 'available': 1, 'unavailable': 1}
+        instance = models.Cluster.new(name='test', hosts=hosts)
+        self.assertEquals(hosts, instance.hosts)
+        self.assertIsNot(hosts, instance.hosts)
+        instance = models.Cluster.new(name='test', hosts={'total': 'bad'})
+        self.assertEquals(0, instance.hosts['total'])
+
+    def test_init_missing_arguments(self):
+        """
+        Verify __init__ raises TypeError when attributes are missing.
+        """
+        for model_type in (models.Host, models.Cluster):
+            with self.assertRaises(TypeError) as cm:
+                model_type(address='127.0.0.1', name='test')
+            self.assertIn(model_type.__name__, cm.exception.args[0])
+            for key in model_type._attribute_map.keys():
+                self.assertIn(key, cm.exception.args[0])
+
+    def test_init_ignores_unknown_arguments(self):
+        """
+        Verify __init__ ignores keyword arguments outside _attribute_map.
+        """
+        instance = models.Host.new(address='127.0.0.1', ssh_priv_key='x')
+        self.assertNotIn('ssh_priv_key', instance.to_dict())
+
+    def test_subclass_init(self):
+        """
+        Verify model subclasses receive their own generated __init__.
+        """
+        class SubHost(models.Host):
+            _attribute_map = dict(models.Host._attribute_map)
+            _attribute_map['extra'] = {'type': str}
+            _attribute_defaults = dict(models.Host._attribute_defaults)
+            _attribute_defaults['extra'] = ''
+
+        instance = SubHost.new(address='127.0.0.1', extra='yes')
+        self.assertEquals('yes', instance.extra)
+        self.assertEquals(('extra',), SubHost.__slots__)
+        self.assertRaises(TypeError, SubHost, address='127.0.0.1')
+
+    def test_new_lazy(self):
+        """
+        Verify new_lazy hydrates from JSON on first attribute access.
+        """
+        raw = json.dumps({'address': '127.0.0.1', 'status': 'active'})
+        instance = models.Host.new_lazy(raw)
+        self.assertIsInstance(instance, models.Host)
+        self.assertEquals(raw, instance._raw)
+        self.assertEquals('active', instance.status)
+        self.assertIsNone(instance._raw)
+        self.assertEquals(
+            models.Host.new(address='127.0.0.1', status='active').to_dict(),
+            instance.to_dict())
+
+    def test_new_lazy_with_dict_and_bytes(self):
+        """
+        Verify new_lazy accepts decoded dicts and bytes.
+        """
+        instance = models.Cluster.new_lazy({'name': 'test'})
+        self.assertEquals([], instance.hostset)
+        self.assertEquals(0, instance.hosts['total'])
+        instance = models.Host.new_lazy(b'{"address": "127.0.0.1"}')
+        self.assertEquals('127.0.0.1', instance.address)
+
+    def test_new_lazy_keeps_assigned_attributes(self):
+        """
+        Verify attributes assigned before hydration are not overwritten.
+        """
+        instance = models.Host.new_lazy({'address': '127.0.0.1', 'os': 'a'})
+        instance.os = 'b'
+        self.assertEquals('127.0.0.1', instance.address)
+        self.assertEquals('b', instance.os)
+
+    def test_new_lazy_invalid_data(self):
+        """
+        Verify errors in lazy data are raised on first access.
+        """
+        instance = models.Host.new_lazy({})
+        self.assertRaises(TypeError, getattr, instance, 'address')
+        self.assertRaises(TypeError, getattr, instance, 'status')
+        self.assertEquals({}, instance._raw)
+
+    def test_new_lazy_validates(self):
+        """
+        Verify lazy instances are validated on hydration and stay lazy
+        when validation fails.
+        """
+        raw = {'address': '127.0.0.1', 'cpus': 'many'}
+        instance = models.Host.new_lazy(raw)
+        instance.os = 'fedora'
+        self.assertRaises(models.ValidationError, getattr, instance, 'cpus')
+        self.assertIs(raw, instance._raw)
+        self.assertRaises(
+            models.ValidationError, getattr, instance, 'address')
+        self.assertEquals('fedora', instance.os)
+        instance.cpus = 2
+        self.assertEquals('127.0.0.1', instance.address)
+        self.assertEquals(2, instance.cpus)
+        self.assertIsNone(instance._raw)
+
+    def test_missing_attribute(self):
+        """
+        Verify reading unknown attributes still raises AttributeError.
+        """
+        instance = models.Host.new(address='127.0.0.1')
+        self.assertRaises(AttributeError, getattr, instance, 'bogus')
+        self.assertFalse(hasattr(instance, 'bogus'))
+
+    def test_diff(self):
+        """
+        Verify diff returns only the changed attributes.
+        """
+        old = models.Host.new(address='127.0.0.1', status='investigating')
+        new = models.Host.new(
+            address='127.0.0.1', status='active',
+            last_check='2017-01-01T00:00:00.000000')
+        self.assertEquals(
+            {'status': 'active', 'last_check': '2017-01-01T00:00:00.000000'},
+            old.diff(new))
+        self.assertEquals({}, old.diff(old))
+        self.assertRaises(
+            models.ModelError, old.diff, models.Cluster.new(name='test'))
+
+    def test_apply_patch(self):
+        """
+        Verify apply_patch updates attributes in place.
+        """
+        old = models.Cluster.new(name='test')
+        new = models.Cluster.new(name='test', hostset=['127.0.0.1'])
+        patch = old.diff(new)
+        self.assertIs(old, old.apply_patch(patch))
+        self.assertEquals(new.to_dict(), old.to_dict())
+        # The patch must not share state with the instance.
+        patch['hostset'].append('127.0.0.2')
+        self.assertEquals(['127.0.0.1'], old.hostset)
+
+    def test_apply_patch_decodes_values(self):
+        """
+        Verify apply_patch converts values of non-JSON attribute types.
+        """
+        instance = models.Host.new(address='127.0.0.1')
+        instance.apply_patch({'last_check': '2017-01-01T00:00:00.000000'})
+        self.assertEquals(datetime(2017, 1, 1), instance.last_check)
+
+    def test_apply_patch_unknown_attribute(self):
+        """
+        Verify apply_patch rejects attributes outside _attribute_map.
+        """
+        instance = models.Host.new(address='127.0.0.1')
+        self.assertRaises(
+            models.ModelError, instance.apply_patch, {'bogus': 1})
+        self.assertEquals('', instance.status)
+
+    def test_freeze(self):
+        """
+        Verify frozen instances refuse changes and keep their type.
+        """
+        instance = models.Host.new(address='127.0.0.1')
+        self.assertFalse(instance.frozen)
+        self.assertIs(instance, instance.freeze())
+        self.assertTrue(instance.frozen)
+        self.assertIsInstance(instance, models.Host)
+        self.assertEquals('Host', instance.__class__.__name__)
+        self.assertRaises(
+            models.ModelError, setattr, instance, 'status', 'active')
+        self.assertRaises(
+            models.ModelError, instance.apply_patch, {'status': 'active'})
+        self.assertEquals('', instance.status)
+
+    def test_freeze_memoizes_serialization(self):
+        """
+        Verify frozen instances memoize JSON and hand out fresh dicts.
+        """
+        instance = models.Cluster.new(name='test').freeze()
+        for method in ('to_json', 'to_json_safe'):
+            result = getattr(instance, method)()
+            self.assertIs(result, getattr(instance, method)())
+            self.assertIsNot(result, getattr(instance, method)(['hosts']))
+        self.assertEquals(
+            models.Cluster.new(name='test').to_dict(expose=['hosts']),
+            instance.to_dict(expose=['hosts']))
+        self.assertEquals({'name': 'test'}, instance.to_dict(fields=['name']))
+        for method in ('to_dict', 'to_dict_safe'):
+            result = getattr(instance, method)()
+            self.assertIsNot(result, getattr(instance, method)())
+            # Changing a result does not change the instance
+            result['status'] = 'changed'
+            self.assertEquals('', getattr(instance, method)()['status'])
+        instance.to_dict()['hostset'].append('127.0.0.1')
+        self.assertEquals([], instance.to_dict()['hostset'])
+        self.assertEquals('', json.loads(instance.to_json())['status'])
+
+    def test_freeze_new_and_copy(self):
+        """
+        Verify frozen instances survive new(), copying and pickling.
+        """
+        import copy
+        import pickle
+        instance = models.Host.new(address='127.0.0.1').freeze()
+        self.assertTrue(type(instance).new(address='127.0.0.2').frozen)
+        for clone in (copy.copy(instance), copy.deepcopy(instance),
+                      pickle.loads(pickle.dumps(instance))):
+            self.assertTrue(clone.frozen)
+            self.assertEquals(instance.to_dict(), clone.to_dict())
+        self.assertFalse(models.Host.new(address='127.0.0.1').frozen)
+
+    def test_thaw(self):
+        """
+        Verify thaw returns a modifiable deep copy.
+        """
+        instance = models.Cluster.new(
+            name='test', hostset=['127.0.0.1']).freeze()
+        thawed = instance.thaw()
+        self.assertFalse(thawed.frozen)
+        thawed.hostset.append('127.0.0.2')
+        thawed.status = 'ok'
+        self.assertEquals(['127.0.0.1'], instance.hostset)
+        self.assertEquals(0, thawed.hosts['total'])
+        self.assertEquals({}, instance.diff(instance.thaw()))
+
+    def test_freeze_lazy(self):
+        """
+        Verify freezing a lazy instance hydrates it.
+        """
+        instance = models.Host.new_lazy({'address': '127.0.0.1'}).freeze()
+        self.assertIsNone(instance._raw)
+        self.assertEquals('127.0.0.1', instance.address)
+
+    def test_instance_state_not_in_slots(self):
+        """
+        Verify plain instances have no slots for lazy, frozen or weak
+        reference state and that the state is released with them.
+        """
+        import weakref
+        self.assertEquals((), models.Model.__slots__)
+        instance = models.Host.new(address='127.0.0.1')
+        self.assertRaises(TypeError, weakref.ref, instance)
+        instance = models.Host.new_lazy({'address': '127.0.0.1'})
+        key = id(instance)
+        del instance
+        self.assertNotIn(key, models._lazy_data)
+        instance = models.Host.new(address='127.0.0.1').freeze()
+        instance.to_json()
+        key = id(instance)
+        self.assertIn(key, models._frozen_memos)
+        del instance
+        self.assertNotIn(key, models._frozen_memos)
+
+    def test_new_lazy_copy(self):
+        """
+        Verify copying a lazy instance hydrates it.
+        """
+        import pickle
+        instance = models.Host.new_lazy({'address': '127.0.0.1'})
+        clone = copy.copy(instance)
+        self.assertIs(models.Host, type(instance))
+        self.assertIs(models.Host, type(clone))
+        self.assertEquals('127.0.0.1', clone.address)
+        instance = models.Host.new_lazy({'address': '127.0.0.1'})
+        self.assertEquals(
+            '127.0.0.1', pickle.loads(pickle.dumps(instance)).address)
+
     def test__coerce(self):
         """
         Verify _coerce casts fields when the data is castable.
@@ -195,6 +593,358 @@ class TestModel(TestCase):
             instance._coerce)
 
 
+class TestHostSet(TestCase):
+    """
+    Tests for the HostSet class.
+    """
+
+    def test_set_semantics(self):
+        """
+        Verify HostSet keeps order and ignores duplicates.
+        """
+        hostset = models.HostSet(['10.0.0.1', '10.0.0.2', '10.0.0.1'])
+        self.assertEquals(['10.0.0.1', '10.0.0.2'], hostset)
+        hostset.append('10.0.0.2')
+        hostset.add('10.0.0.3')
+        hostset += ['10.0.0.3', '10.0.0.4']
+        self.assertEquals(
+            ['10.0.0.1', '10.0.0.2', '10.0.0.3', '10.0.0.4'], hostset)
+        self.assertIn('10.0.0.4', hostset)
+
+    def test_removal(self):
+        """
+        Verify removing addresses keeps the index in step.
+        """
+        hostset = models.HostSet(['10.0.0.1', '10.0.0.2', '10.0.0.3'])
+        hostset.discard('10.0.0.1')
+        hostset.discard('10.0.0.9')
+        self.assertRaises(ValueError, hostset.remove, '10.0.0.9')
+        self.assertEquals('10.0.0.3', hostset.pop())
+        del hostset[0]
+        self.assertEquals([], hostset)
+        self.assertNotIn('10.0.0.2', hostset)
+        hostset.append('10.0.0.2')
+        hostset[0] = '10.0.0.5'
+        self.assertNotIn('10.0.0.2', hostset)
+        self.assertIn('10.0.0.5', hostset)
+
+    def test_copy(self):
+        """
+        Verify copies of a HostSet keep the index.
+        """
+        hostset = models.HostSet(['10.0.0.1'])
+        copied = copy.deepcopy(hostset)
+        copied.append('10.0.0.1')
+        self.assertEquals(['10.0.0.1'], copied)
+        self.assertIn('10.0.0.1', copied)
+
+    def test_cluster_hostset(self):
+        """
+        Verify Cluster.hostset is a HostSet which serializes as a list.
+        """
+        instance = models.Cluster.new(
+            name='test', hostset=['10.0.0.1', '10.0.0.1'])
+        self.assertIsInstance(instance.hostset, models.HostSet)
+        self.assertEquals(['10.0.0.1'], instance.hostset)
+        self.assertIs(list, type(instance.to_dict()['hostset']))
+        self.assertEquals(
+            ['10.0.0.1'], json.loads(instance.to_json())['hostset'])
+        instance._validate()
+        instance.thaw().hostset.append('10.0.0.1')
+        self.assertIsInstance(instance.thaw().hostset, models.HostSet)
+        instance.hostset = ['10.0.0.2']
+        instance._validate()
+
+
+class TestDatetimeAttributes(TestCase):
+    """
+    Tests for datetime typed model attributes.
+    """
+
+    def test_decode_and_encode(self):
+        """
+        Verify datetime attributes are stored natively and serialized
+        as strings.
+        """
+        instance = models.Host.new(
+            address='127.0.0.1', last_check='2015-12-17T15:48:18.710454')
+        self.assertEquals(
+            datetime(2015, 12, 17, 15, 48, 18, 710454), instance.last_check)
+        self.assertEquals(
+            '2015-12-17T15:48:18.710454', instance.to_dict()['last_check'])
+        self.assertEquals(
+            '2015-12-17T15:48:18.710454',
+            json.loads(instance.to_json())['last_check'])
+        self.assertEquals(
+            {'last_check': '2015-12-17T15:48:18.710454'},
+            instance.to_dict(fields=['last_check']))
+        self.assertIsNone(instance._validate())
+
+    def test_datetime_values(self):
+        """
+        Verify datetime values are accepted as is.
+        """
+        now = datetime.utcnow()
+        instance = models.Host.new(address='127.0.0.1', last_check=now)
+        self.assertIs(now, instance.last_check)
+
+    def test_empty(self):
+        """
+        Verify empty strings are stored as None.
+        """
+        instance = models.Host.new(address='127.0.0.1')
+        self.assertIsNone(instance.last_check)
+        self.assertEquals('', instance.to_dict()['last_check'])
+        self.assertIsNone(instance._validate())
+
+    def test_invalid(self):
+        """
+        Verify unparsable strings, such as ones stored by older versions,
+        are kept as is.
+        """
+        instance = models.Host.new(
+            address='127.0.0.1', last_check='2015-12-17 15:48:18')
+        self.assertEquals('2015-12-17 15:48:18', instance.last_check)
+        self.assertEquals(
+            '2015-12-17 15:48:18', instance.to_dict()['last_check'])
+        self.assertIsNone(instance._validate())
+
+    def test_decoded_on_read(self):
+        """
+        Verify strings are only parsed when the attribute is read.
+        """
+        value = '2015-12-17T15:48:18.710454'
+        with mock.patch('commissaire.models.parse_dt') as _parse_dt:
+            instance = models.Host.new(address='127.0.0.1', last_check=value)
+            instance._validate()
+            self.assertEquals(value, instance.to_dict()['last_check'])
+            self.assertEquals(
+                value, json.loads(instance.to_json())['last_check'])
+            self.assertEquals(0, _parse_dt.call_count)
+            _parse_dt.return_value = datetime(2015, 12, 17)
+            self.assertEquals(datetime(2015, 12, 17), instance.last_check)
+            self.assertEquals(datetime(2015, 12, 17), instance.last_check)
+            _parse_dt.assert_called_once_with(value)
+
+    def test_assignment(self):
+        """
+        Verify strings assigned to datetime attributes are parsed.
+        """
+        instance = models.Host.new(address='127.0.0.1')
+        instance.last_check = formatted_dt(datetime(2015, 12, 17))
+        self.assertEquals(datetime(2015, 12, 17), instance.last_check)
+        self.assertIsNone(instance._validate())
+        instance.last_check = ''
+        self.assertIsNone(instance.last_check)
+        record = models.WatcherRecord.new(address='127.0.0.1')
+        record.last_check = formatted_dt(datetime(2015, 12, 17))
+        self.assertIsNone(record._validate())
+        record.last_check = '2015-12-17T15:48:18'
+        self.assertEquals('2015-12-17T15:48:18', record.last_check)
+        self.assertRaises(models.ValidationError, record._validate)
+
+    def test__coerce(self):
+        """
+        Verify _coerce keeps datetimes and strings and fails on other
+        types.
+        """
+        instance = models.Host.new(
+            address='127.0.0.1', last_check='2015-12-17T15:48:18.710454')
+        instance._coerce()
+        self.assertEquals(
+            datetime(2015, 12, 17, 15, 48, 18, 710454), instance.last_check)
+        instance.last_check = 'now'
+        instance._coerce()
+        self.assertEquals('now', instance.last_check)
+        instance.last_check = []
+        self.assertRaises(models.CoercionError, instance._coerce)
+
+    def test_watcher_record(self):
+        """
+        Verify WatcherRecord requires a last_check datetime.
+        """
+        instance = models.WatcherRecord.new(address='127.0.0.1')
+        self.assertEquals(datetime.max, instance.last_check)
+        self.assertIsNone(instance._validate())
+        instance.last_check = None
+        self.assertRaises(models.ValidationError, instance._validate)
+        instance = models.WatcherRecord.new(
+            address='127.0.0.1', last_check='2015-12-17')
+        self.assertRaises(models.ValidationError, instance._validate)
+
+
+class TestSchemaFingerprint(TestCase):
+    """
+    Tests for model schema fingerprints.
+    """
+
+    def test_fingerprint(self):
+        """
+        Verify fingerprints depend on the schema only.
+        """
+        fingerprint = models.Host._schema_fingerprint
+        self.assertEquals(16, len(fingerprint))
+        self.assertNotEquals(fingerprint, models.Cluster._schema_fingerprint)
+        self.assertEquals(
+            fingerprint,
+            models.Host.new(address='').freeze()._schema_fingerprint)
+        reordered = type(models.Host)('Reordered', (models.Model, ), {
+            '_attribute_map': dict(
+                reversed(list(models.Host._attribute_map.items())))})
+        self.assertEquals(fingerprint, reordered._schema_fingerprint)
+
+    def test_fingerprint_changes_with_schema(self):
+        """
+        Verify fingerprints change with attribute types and regexes.
+        """
+        def fingerprint(spec):
+            return type(models.Model)('Schema', (models.Model, ), {
+                '_attribute_map': {'name': spec}})._schema_fingerprint
+
+        self.assertEquals(
+            fingerprint({'type': str}), fingerprint({'type': str}))
+        self.assertNotEquals(
+            fingerprint({'type': str}), fingerprint({'type': int}))
+        self.assertNotEquals(
+            fingerprint({'type': str}),
+            fingerprint({'type': str, 'regex': '^a'}))
+
+    def test_fingerprint_with_custom_validate(self):
+        """
+        Verify models with a hand written _validate have no fingerprint.
+        """
+        self.assertIsNone(models.Network._schema_fingerprint)
+        self.assertIsNone(models.ClusterDeploy._schema_fingerprint)
+        self.assertIsNone(
+            models.Network.new(name='').freeze()._schema_fingerprint)
+
+
+class RegexModel(models.Model):
+    """
+    Model with a regular expression validated attribute.
+    """
+    _attribute_map = {
+        'name': {'type': str, 'regex': '^[a-z]+$'},
+    }
+    _attribute_defaults = {'name': ''}
+
+
+class TestModelValidation(TestCase):
+    """
+    Tests for compiled validators and ListModel batch validation.
+    """
+
+    def test_validators_are_compiled(self):
+        """
+        Verify regular expressions are compiled once per class.
+        """
+        attr, attr_type, regex, pattern = RegexModel._validators[0]
+        self.assertEquals(('name', str, '^[a-z]+$'), (attr, attr_type, pattern))
+        self.assertEquals('^[a-z]+$', regex.pattern)
+
+    def test__validate_regex(self):
+        """
+        Verify _validate applies the compiled regular expression.
+        """
+        self.assertIsNone(RegexModel.new(name='valid')._validate())
+        self.assertRaises(
+            models.ValidationError, RegexModel.new(name='Invalid!')._validate)
+
+    def test__validate_regex_wrong_type(self):
+        """
+        Verify _validate reports both type and regex errors.
+        """
+        with self.assertRaises(models.ValidationError) as cm:
+            RegexModel.new(name=1)._validate()
+        self.assertEquals(2, len(cm.exception.args[1]))
+
+    def test__validate_items(self):
+        """
+        Verify _validate_items collects errors from all items.
+        """
+        hosts = models.Hosts.new(hosts=[
+            models.Host.new(address='127.0.0.1'),
+            models.Host.new(address=None),
+            models.Host.new(address=None, cpus='many')])
+        with self.assertRaises(models.ValidationError) as cm:
+            hosts._validate_items()
+        self.assertEquals(3, len(cm.exception.args[1]))
+
+    def test__validate_items_fail_fast(self):
+        """
+        Verify _validate_items stops at the first invalid item if asked.
+        """
+        hosts = models.Hosts.new(hosts=[
+            models.Host.new(address=None),
+            models.Host.new(address=None, cpus='many')])
+        with self.assertRaises(models.ValidationError) as cm:
+            hosts._validate_items(fail_fast=True)
+        self.assertEquals(1, len(cm.exception.args[1]))
+
+    def test__validate_items_with_extra_validation(self):
+        """
+        Verify _validate_items honors _validate overrides in item classes.
+        """
+        networks = models.Networks.new(networks=[
+            models.Network.new(name='good'),
+            models.Network.new(name='bad', type='idonotexist')])
+        with self.assertRaises(models.ValidationError) as cm:
+            networks._validate_items()
+        self.assertEquals(1, len(cm.exception.args[1]))
+
+    def test__validate_items_valid(self):
+        """
+        Verify _validate_items passes when all items are valid.
+        """
+        hosts = models.Hosts.new(hosts=[
+            models.Host.new(address='127.0.0.1'),
+            models.Host.new(address='127.0.0.2')])
+        self.assertIsNone(hosts._validate_items())
+
+
+class TestListModel(TestCase):
+    """
+    Tests for the commissaire.models.ListModel class.
+    """
+
+    def test_iter_json(self):
+        """
+        Verify iter_json yields chunks which join to to_json's output.
+        """
+        instance = models.Clusters.new(clusters=[
+            models.Cluster.new(name=str(x)) for x in range(5)])
+        chunks = list(instance.iter_json(chunk_size=2))
+        self.assertEquals(4, len(chunks))
+        self.assertEquals(instance.to_json(), ''.join(chunks))
+        self.assertEquals(
+            instance.to_json_safe(),
+            ''.join(instance.iter_json(secure=False)))
+
+    def test_fields(self):
+        """
+        Verify fields applies to each item of the list.
+        """
+        instance = models.Hosts.new(hosts=[
+            models.Host.new(address='127.0.0.1'),
+            models.Host.new(address='127.0.0.2', cpus=2)])
+        expected = [
+            {'address': '127.0.0.1', 'cpus': 0},
+            {'address': '127.0.0.2', 'cpus': 2}]
+        fields = ['address', 'cpus']
+        self.assertEquals(expected, instance.to_dict(fields=fields))
+        self.assertEquals(expected, json.loads(instance.to_json(fields=fields)))
+        self.assertEquals(
+            instance.to_json(fields=fields),
+            ''.join(instance.iter_json(fields=fields)))
+
+    def test_iter_json_empty(self):
+        """
+        Verify iter_json handles empty lists.
+        """
+        instance = models.Hosts.new()
+        self.assertEquals(instance.to_json(), ''.join(instance.iter_json()))
+
+
 class _TypeValidationTest(TestCase):
     """
     Mixin to test models that need to do type testing.
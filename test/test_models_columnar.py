@@ -0,0 +1,146 @@
+# Copyright (C) 2017  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Tests for the commissaire.models.columnar module.
+"""
+
+from array import array
+
+from . import TestCase
+
+from commissaire import models
+from commissaire.models.columnar import ColumnarList, RowView
+
+
+class TestColumnarList(TestCase):
+    """
+    Tests for the ColumnarList class.
+    """
+
+    def setUp(self):
+        """
+        Set up a small Hosts list and its columnar view.
+        """
+        self.hosts = models.Hosts.new(hosts=[
+            models.Host.new(address='10.0.0.1', status='active',
+                            os='fedora', memory=1024, cpus=2),
+            models.Host.new(address='10.0.0.2', status='failed',
+                            os='rhel', memory=2048, cpus=4),
+            models.Host.new(address='10.0.0.3', status='active',
+                            os='rhel', memory=4096, cpus=8),
+        ])
+        self.columns = self.hosts.to_columns()
+
+    def test_storage(self):
+        """
+        Verify numeric and categorical attributes use array storage.
+        """
+        self.assertIsInstance(self.columns, ColumnarList)
+        self.assertEquals(3, len(self.columns))
+        self.assertEquals(array('q', [1024, 2048, 4096]),
+                          self.columns.column('memory'))
+        self.assertEquals(array('I', [0, 1, 0]),
+                          self.columns.column('status'))
+        self.assertEquals(['active', 'failed'],
+                          self.columns.categories('status'))
+        self.assertEquals(['10.0.0.1', '10.0.0.2', '10.0.0.3'],
+                          self.columns.column('address'))
+
+    def test_sum(self):
+        """
+        Verify sum totals numeric columns with optional conditions.
+        """
+        self.assertEquals(7168, self.columns.sum('memory'))
+        self.assertEquals(5120, self.columns.sum('memory', status='active'))
+        self.assertEquals(
+            4096, self.columns.sum('memory', status='active', os='rhel'))
+        self.assertEquals(0, self.columns.sum('memory', status='bogus'))
+        self.assertRaises(models.ModelError, self.columns.sum, 'status')
+
+    def test_sum_by(self):
+        """
+        Verify sum_by groups numeric totals by a categorical attribute.
+        """
+        self.assertEquals(
+            {'active': 5120, 'failed': 2048},
+            self.columns.sum_by('memory', 'status'))
+        self.assertRaises(
+            models.ModelError, self.columns.sum_by, 'memory', 'address')
+
+    def test_count_by(self):
+        """
+        Verify count_by counts rows per value.
+        """
+        self.assertEquals({'fedora': 1, 'rhel': 2},
+                          self.columns.count_by('os'))
+        self.assertEquals({2: 1, 4: 1, 8: 1}, self.columns.count_by('cpus'))
+
+    def test_where(self):
+        """
+        Verify where returns the indexes of matching rows.
+        """
+        self.assertEquals([0, 2], self.columns.where(status='active'))
+        self.assertEquals([2], self.columns.where(status='active', os='rhel'))
+        self.assertEquals([1], self.columns.where(cpus=4))
+        self.assertEquals([], self.columns.where(os='bogus'))
+
+    def test_row_view(self):
+        """
+        Verify rows can be read as views and materialized as models.
+        """
+        row = self.columns[1]
+        self.assertIsInstance(row, RowView)
+        self.assertEquals('10.0.0.2', row.address)
+        self.assertEquals('failed', row.status)
+        self.assertEquals(2048, row.memory)
+        self.assertRaises(AttributeError, getattr, row, 'bogus')
+        host = row.to_model()
+        self.assertIsInstance(host, models.Host)
+        self.assertEquals(self.hosts.hosts[1].to_dict(), host.to_dict())
+        self.assertEquals('10.0.0.3', self.columns[-1].address)
+        self.assertRaises(IndexError, self.columns.__getitem__, 3)
+
+    def test_to_list_model(self):
+        """
+        Verify to_list_model round trips the data.
+        """
+        hosts = self.columns.to_list_model(models.Hosts)
+        self.assertEquals(self.hosts.to_dict(), hosts.to_dict())
+
+    def test_append_wrong_type(self):
+        """
+        Verify append rejects instances of the wrong model class.
+        """
+        self.assertRaises(
+            models.ModelError, self.columns.append,
+            models.Cluster.new(name='test'))
+
+    def test_append_invalid_value(self):
+        """
+        Verify append changes nothing if a value can not be stored.
+        """
+        host = models.Host.new(address='10.0.0.9', memory=1024)
+        host.space = 'lots'
+        self.assertRaises(models.ModelError, self.columns.append, host)
+        self.assertEquals(3, len(self.columns))
+        for attr in models.Host._attribute_map:
+            self.assertEquals(3, len(self.columns.column(attr)))
+        self.assertNotIn('10.0.0.9', list(self.columns.column('address')))
+        host.space = 0
+        host.status = ['unhashable']
+        self.assertRaises(models.ModelError, self.columns.append, host)
+        self.assertEquals(3, len(self.columns.column('address')))
+        self.columns.append(models.Host.new(address='10.0.0.9'))
+        self.assertEquals('10.0.0.9', self.columns[3].address)
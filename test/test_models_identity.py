@@ -0,0 +1,164 @@
+# Copyright (C) 2017  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Tests for the commissaire.models.identity module.
+"""
+
+import gc
+
+from . import TestCase
+
+from commissaire import models
+from commissaire.models.identity import IdentityMap
+
+
+class TestIdentityMap(TestCase):
+    """
+    Tests for the IdentityMap class.
+    """
+
+    def setUp(self):
+        """
+        Creates a new IdentityMap for each test.
+        """
+        self.identity_map = IdentityMap()
+
+    def test_load(self):
+        """
+        Verify load returns a shared instance updated in place.
+        """
+        host = self.identity_map.load(
+            models.Host, {'address': '127.0.0.1', 'status': 'active'})
+        self.assertIsInstance(host, models.Host)
+        same = self.identity_map.load(
+            models.Host, {'address': '127.0.0.1', 'status': 'failed'})
+        self.assertIs(host, same)
+        self.assertEquals('failed', host.status)
+        self.assertIs(host, self.identity_map.get(models.Host, '127.0.0.1'))
+        other = self.identity_map.load(models.Host, {'address': '127.0.0.2'})
+        self.assertIsNot(host, other)
+        self.assertEquals(2, len(self.identity_map))
+
+    def test_load_partial(self):
+        """
+        Verify load only updates the attributes present in the data.
+        """
+        host = self.identity_map.load(
+            models.Host, {'address': '127.0.0.1', 'os': 'fedora', 'cpus': 2})
+        self.identity_map.load(
+            models.Host, {'address': '127.0.0.1', 'status': 'active'})
+        self.assertEquals('fedora', host.os)
+        self.assertEquals(2, host.cpus)
+
+    def test_load_changed_cluster(self):
+        """
+        Verify load updates extra attributes such as Cluster.hosts.
+        """
+        hosts = {'total': 1, 'available': 1, 'unavailable': 0}
+        cluster = self.identity_map.load(
+            models.Cluster, {'name': 'test', 'hostset': ['127.0.0.1'],
+                             'hosts': hosts})
+        self.assertEquals(hosts, cluster.hosts)
+        hosts = {'total': 2, 'available': 1, 'unavailable': 1}
+        same = self.identity_map.load(
+            models.Cluster, {'name': 'test',
+                             'hostset': ['127.0.0.1', '127.0.0.2'],
+                             'hosts': hosts})
+        self.assertIs(cluster, same)
+        self.assertEquals(hosts, cluster.hosts)
+        self.assertEquals(2, len(cluster.hostset))
+        # Data without hosts keeps the counts
+        self.identity_map.load(
+            models.Cluster, {'name': 'test', 'status': 'ok'})
+        self.assertEquals(hosts, cluster.hosts)
+
+    def test_load_interns_categorical_attributes(self):
+        """
+        Verify categorical string values are interned.
+        """
+        one = self.identity_map.load(
+            models.Host, {'address': '127.0.0.1', 'status': ''.join('ok')})
+        two = self.identity_map.load(
+            models.Host, {'address': '127.0.0.2', 'status': ''.join('ok')})
+        self.assertIs(one.status, two.status)
+
+    def test_load_without_primary_key(self):
+        """
+        Verify models without a primary key are not shared.
+        """
+        one = self.identity_map.load(models.WatcherRecord, {'address': 'a'})
+        two = self.identity_map.load(models.WatcherRecord, {'address': 'a'})
+        self.assertIsNot(one, two)
+        self.assertEquals(0, len(self.identity_map))
+
+    def test_load_frozen(self):
+        """
+        Verify frozen shared instances are replaced instead of updated.
+        """
+        host = self.identity_map.add(
+            models.Host.new(address='127.0.0.1').freeze())
+        new = self.identity_map.load(
+            models.Host, {'address': '127.0.0.1', 'status': 'active'})
+        self.assertIsNot(host, new)
+        self.assertEquals('', host.status)
+        self.assertIs(new, self.identity_map.get(models.Host, '127.0.0.1'))
+
+    def test_add_copies_plain_instances(self):
+        """
+        Verify add shares a copy of instances without weak references.
+        """
+        host = models.Host.new(address='127.0.0.1', status='active')
+        shared = self.identity_map.add(host)
+        self.assertIsNot(host, shared)
+        self.assertIsInstance(shared, models.Host)
+        self.assertEquals(host.to_dict(), shared.to_dict())
+        self.assertIs(shared, self.identity_map.get(models.Host, '127.0.0.1'))
+        self.assertIs(shared, self.identity_map.add(shared))
+
+    def test_shared_instances_pickle(self):
+        """
+        Verify shared instances can be pickled and copied.
+        """
+        import copy
+        import pickle
+        host = self.identity_map.load(
+            models.Host, {'address': '127.0.0.1', 'status': 'active'})
+        for clone in (copy.copy(host), copy.deepcopy(host),
+                      pickle.loads(pickle.dumps(host))):
+            self.assertEquals(host.to_dict(), clone.to_dict())
+        self.assertEquals(
+            host.to_dict(), pickle.loads(pickle.dumps(host.freeze())).to_dict())
+
+    def test_instances_are_weak(self):
+        """
+        Verify instances are dropped once nothing else uses them.
+        """
+        self.identity_map.load(models.Host, {'address': '127.0.0.1'})
+        gc.collect()
+        self.assertEquals(0, len(self.identity_map))
+        self.assertIsNone(self.identity_map.get(models.Host, '127.0.0.1'))
+
+    def test_discard_and_clear(self):
+        """
+        Verify discard and clear forget shared instances.
+        """
+        host = self.identity_map.load(models.Host, {'address': '127.0.0.1'})
+        cluster = self.identity_map.load(models.Cluster, {'name': 'test'})
+        self.identity_map.discard(models.Host, '127.0.0.1')
+        self.assertIsNot(host, self.identity_map.load(
+            models.Host, {'address': '127.0.0.1'}))
+        self.identity_map.clear()
+        self.assertIsNone(self.identity_map.get(models.Cluster, 'test'))
+        self.assertEquals('test', cluster.name)
@@ -24,7 +24,7 @@ from unittest import mock
 from . import TestCase
 
 from commissaire import storage
-from commissaire.models import Host, Cluster
+from commissaire.models import Host, Hosts, Cluster, Networks
 
 
 class TestCommissaireStorage_get_uniform_model_type(TestCase):
@@ -42,6 +42,16 @@ class TestCommissaireStorage_get_uniform_model_type(TestCase):
                 Host.new(address='127.0.0.1'),
                 Host.new(address='127.0.0.2')]))
 
+    def test_get_uniform_model_type_with_frozen_types(self):
+        """
+        Verify get_uniform_model_type treats frozen instances as their type.
+        """
+        self.assertEquals(
+            Host,
+            storage.get_uniform_model_type([
+                Host.new(address='127.0.0.1').freeze(),
+                Host.new(address='127.0.0.2')]))
+
     def test_get_uniform_model_type_with_multiple_types(self):
         """
         Verify get_uniform_model_type raises when types are not the same.
@@ -60,3 +70,36 @@ class TestCommissaireStorage_get_uniform_model_type(TestCase):
             TypeError,
             storage.get_uniform_model_type,
             [object()])
+
+
+class TestCommissaireStorage_stamp_schema_fingerprint(TestCase):
+    """
+    Tests for the stamp_schema_fingerprint function.
+    """
+
+    def test_stamp_schema_fingerprint(self):
+        """
+        Verify stamp_schema_fingerprint adds the fingerprint of the records.
+        """
+        response = {'jsonrpc': '2.0', 'result': {}}
+        self.assertIs(
+            response, storage.stamp_schema_fingerprint(response, Host))
+        self.assertEquals(
+            Host._schema_fingerprint,
+            response[storage.SCHEMA_FINGERPRINT_KEY])
+
+    def test_stamp_schema_fingerprint_with_list_model(self):
+        """
+        Verify stamp_schema_fingerprint uses the item class of list models.
+        """
+        response = storage.stamp_schema_fingerprint({}, Hosts)
+        self.assertEquals(
+            Host._schema_fingerprint,
+            response[storage.SCHEMA_FINGERPRINT_KEY])
+
+    def test_stamp_schema_fingerprint_with_custom_validate(self):
+        """
+        Verify stamp_schema_fingerprint skips models without a fingerprint.
+        """
+        self.assertEquals(
+            {}, storage.stamp_schema_fingerprint({}, Networks))
@@ -16,16 +16,28 @@
 Tests for the commissaire.storage.storage module.
 """
 
+import datetime
 import logging
 import json
+import threading
+import time
 
 from unittest import mock
 
+from kombu import serialization
+from kombu.message import Message
+
 from . import TestCase
 
-from commissaire.bus import BusMixin, RemoteProcedureCallError
-from commissaire.models import Host, Hosts, Cluster, ValidationError
-from commissaire.storage.client import StorageClient, NOTIFY_EVENT_CREATED
+from commissaire.bus import (
+    BusMixin, RemoteProcedureCallError, StorageLookupError)
+from commissaire import models
+from commissaire.models import (
+    Host, Hosts, Cluster, ModelError, ValidationError)
+from commissaire.models.identity import IdentityMap
+from commissaire.storage.client import (
+    NotifyCallback, StorageClient, NOTIFY_EVENT_CREATED)
+from commissaire.storage.etcd import EtcdStoreHandler
 
 #: Message ID
 ID = '123'
@@ -106,6 +118,250 @@ class TestCommissaireStorageClient(TestCase):
         self.assertIsInstance(model, Host)
         self.assertEqual(model.to_dict_safe(), FULL_HOST_DICT)
 
+    def test_get_fields(self):
+        """
+        Verify StorageClient.get sends the requested fields.
+        """
+        storage = StorageClient(mock.MagicMock())
+        storage.bus_mixin.logger = mock.MagicMock()
+        storage.bus_mixin.request.return_value = {
+            'jsonrpc': '2.0',
+            'id': ID,
+            'result': {'address': '127.0.0.1', 'status': 'active'}
+        }
+        model = storage.get(MINI_HOST, fields=('address', 'status'))
+        storage.bus_mixin.request.assert_called_once_with(
+            'storage.get', params={
+                'model_type_name': MINI_HOST.__class__.__name__,
+                'model_json_data': MINI_HOST.to_dict(),
+                'fields': ['address', 'status'],
+            }
+        )
+        self.assertEqual('active', model.status)
+        # Attributes which were not fetched keep their defaults.
+        self.assertEqual(0, model.cpus)
+
+    def test_get_fields_unknown_attribute(self):
+        """
+        Verify StorageClient.get rejects unknown fields without a request.
+        """
+        storage = StorageClient(mock.MagicMock())
+        storage.bus_mixin.logger = mock.MagicMock()
+        self.assertRaises(
+            ModelError, storage.get, MINI_HOST, fields=['nope'])
+        self.assertFalse(storage.bus_mixin.request.called)
+
+    def test_serializer(self):
+        """
+        Verify StorageClient passes its serializer to requests.
+        """
+        storage = StorageClient(mock.MagicMock(), serializer='binary')
+        storage.bus_mixin.logger = mock.MagicMock()
+        storage.bus_mixin.request.return_value = {
+            'jsonrpc': '2.0',
+            'id': ID,
+            'result': FULL_HOST_DICT
+        }
+        storage.get(MINI_HOST)
+        storage.bus_mixin.request.assert_called_once_with(
+            'storage.get', params=mock.ANY, serializer='binary')
+
+    def test_identity_map(self):
+        """
+        Verify StorageClient returns shared instances from its identity map.
+        """
+        storage = StorageClient(
+            mock.MagicMock(), identity_map=IdentityMap())
+        storage.bus_mixin.logger = mock.MagicMock()
+        storage.bus_mixin.request.return_value = {
+            'jsonrpc': '2.0',
+            'id': ID,
+            'result': FULL_HOST_DICT
+        }
+        model = storage.get(MINI_HOST)
+        self.assertIs(model, storage.get(MINI_HOST))
+        storage.bus_mixin.request.return_value = {
+            'jsonrpc': '2.0',
+            'id': ID,
+            'result': [dict(FULL_HOST_DICT, status='active')]
+        }
+        hosts = storage.list(Hosts)
+        self.assertIs(model, hosts.hosts[0])
+        self.assertEquals('active', model.status)
+        storage.delete(MINI_HOST)
+        self.assertIsNone(storage.identity_map.get(Host, MINI_HOST.address))
+
+    def test_identity_map_list_invalid(self):
+        """
+        Verify StorageClient.list leaves shared instances alone on errors.
+        """
+        storage = StorageClient(
+            mock.MagicMock(), identity_map=IdentityMap())
+        storage.bus_mixin.logger = mock.MagicMock()
+        storage.bus_mixin.request.return_value = {
+            'jsonrpc': '2.0',
+            'id': ID,
+            'result': FULL_HOST_DICT
+        }
+        model = storage.get(MINI_HOST)
+        storage.bus_mixin.request.return_value = {
+            'jsonrpc': '2.0',
+            'id': ID,
+            'result': [dict(FULL_HOST_DICT, status=1)]
+        }
+        self.assertRaises(ValidationError, storage.list, Hosts)
+        self.assertEquals(FULL_HOST_DICT['status'], model.status)
+
+    def test_cache(self):
+        """
+        Verify StorageClient.get serves cached records as new instances.
+        """
+        storage = StorageClient(
+            mock.MagicMock(), cache_policies={Host: {'max_size': 8}})
+        storage.bus_mixin.logger = mock.MagicMock()
+        storage.bus_mixin.request.return_value = {
+            'jsonrpc': '2.0',
+            'id': ID,
+            'result': dict(FULL_HOST_DICT)
+        }
+        first = storage.get(MINI_HOST)
+        first.status = 'changed'
+        second = storage.get(MINI_HOST)
+        self.assertEquals(1, storage.bus_mixin.request.call_count)
+        self.assertIsNot(first, second)
+        self.assertEquals(second.to_dict_safe(), FULL_HOST_DICT)
+        storage.get(MINI_HOST, fields=['address'])
+        self.assertEquals(2, storage.bus_mixin.request.call_count)
+        self.assertEquals(
+            {'Host': {'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1}},
+            storage.cache_stats())
+
+    def test_cache_invalidated(self):
+        """
+        Verify cached records are dropped on writes and notifications.
+        """
+        storage = StorageClient(
+            mock.MagicMock(),
+            cache_policies={Host: {}, Hosts: {'max_size': 1}})
+        storage.bus_mixin.logger = mock.MagicMock()
+        self.assertIn('notify.storage.Host.*', storage.notify_callbacks)
+        storage.bus_mixin.request.return_value = {
+            'jsonrpc': '2.0',
+            'id': ID,
+            'result': [FULL_HOST_DICT]
+        }
+        storage.list(Hosts)
+        storage.list(Hosts)
+        self.assertEquals(1, storage.bus_mixin.request.call_count)
+        callback = storage.notify_callbacks['notify.storage.Host.*'][0]
+        callback({
+            'event': NOTIFY_EVENT_CREATED,
+            'class': 'Host',
+            'model': {'address': '10.0.0.2'}}, mock.MagicMock())
+        storage.list(Hosts)
+        self.assertEquals(2, storage.bus_mixin.request.call_count)
+
+        storage.bus_mixin.request.return_value = {
+            'jsonrpc': '2.0',
+            'id': ID,
+            'result': FULL_HOST_DICT
+        }
+        storage.get(MINI_HOST)
+        storage.save(FULL_HOST)
+        storage.get(MINI_HOST)
+        self.assertEquals(5, storage.bus_mixin.request.call_count)
+        storage.get(MINI_HOST)
+        self.assertEquals(5, storage.bus_mixin.request.call_count)
+        storage.delete(MINI_HOST)
+        storage.get(MINI_HOST)
+        self.assertEquals(7, storage.bus_mixin.request.call_count)
+
+    def test_coalesce_reads(self):
+        """
+        Verify concurrent identical reads share one request.
+        """
+        storage = StorageClient(mock.MagicMock(), coalesce_reads=True)
+        storage.bus_mixin.logger = mock.MagicMock()
+        release = threading.Event()
+
+        def request(routing_key, params):
+            release.wait(5)
+            return {'jsonrpc': '2.0', 'id': ID,
+                    'result': dict(FULL_HOST_DICT)}
+        storage.bus_mixin.request.side_effect = request
+
+        hosts = []
+        threads = [threading.Thread(
+            target=lambda: hosts.append(storage.get(MINI_HOST)))
+            for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        key = ('storage.get', 'Host', MINI_HOST.address, None)
+        while (storage.flights.waiting(key) < 2 and
+                time.monotonic() < deadline):
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEquals(1, storage.bus_mixin.request.call_count)
+        self.assertEquals(3, len({id(host) for host in hosts}))
+        for host in hosts:
+            self.assertEquals(FULL_HOST_DICT, host.to_dict_safe())
+
+        storage = StorageClient(mock.MagicMock())
+        self.assertIsNone(storage.flights)
+        storage.bus_mixin.request.return_value = {
+            'jsonrpc': '2.0', 'id': ID, 'result': dict(FULL_HOST_DICT)}
+        storage.get(MINI_HOST)
+        storage.bus_mixin.request.assert_called_once_with(
+            'storage.get', params=mock.ANY)
+
+    def test_coalesce_reads_after_write(self):
+        """
+        Verify reads after a write do not share a request sent before it.
+        """
+        storage = StorageClient(mock.MagicMock(), coalesce_reads=True)
+        storage.bus_mixin.logger = mock.MagicMock()
+        release = threading.Event()
+
+        def request(routing_key, params):
+            if routing_key == 'storage.get':
+                release.wait(5)
+            return {'jsonrpc': '2.0', 'id': ID,
+                    'result': dict(FULL_HOST_DICT)}
+        storage.bus_mixin.request.side_effect = request
+
+        thread = threading.Thread(target=storage.get, args=(MINI_HOST,))
+        thread.start()
+        deadline = time.monotonic() + 5
+        while not len(storage.flights) and time.monotonic() < deadline:
+            time.sleep(0.001)
+        storage.save(models.Host.new(**FULL_HOST_DICT))
+        release.set()
+        storage.get(MINI_HOST)
+        thread.join(5)
+        self.assertEquals(
+            ['storage.get', 'storage.save', 'storage.get'],
+            [c[0][0] for c in storage.bus_mixin.request.call_args_list])
+
+    def test_get_without_primary_key(self):
+        """
+        Verify records without a primary key are not cached or coalesced.
+        """
+        storage = StorageClient(
+            mock.MagicMock(), coalesce_reads=True,
+            cache_policies={models.WatcherRecord: {'max_size': 4}})
+        record = models.WatcherRecord.new(
+            address='127.0.0.1', last_check=datetime.datetime.utcnow())
+        storage.bus_mixin.request.return_value = {
+            'jsonrpc': '2.0', 'id': ID, 'result': record.to_dict()}
+        self.assertEquals(record.to_dict(), storage.get(record).to_dict())
+        self.assertEquals(record.to_dict(), storage.get(record).to_dict())
+        self.assertEquals(2, storage.bus_mixin.request.call_count)
+        self.assertEquals(0, storage.flights.calls)
+        storage.save(record)
+
     def test_get_rpc_error(self):
         """
         Verify StorageClient.get re-raises RemoteProcedureCallError.
@@ -214,6 +470,43 @@ class TestCommissaireStorageClient(TestCase):
         self.assertRaises(ValidationError, storage.save, bad_host)
         storage.bus_mixin.request.assert_not_called()
 
+    def test_patch(self):
+        """
+        Verify StorageClient.patch sends only the primary key and patch.
+        """
+        storage = StorageClient(mock.MagicMock())
+        storage.bus_mixin.logger = mock.MagicMock()
+        storage.bus_mixin.request.return_value = {
+            'jsonrpc': '2.0',
+            'id': ID,
+            'result': FULL_HOST_DICT
+        }
+        patch = {'status': 'groovy', 'os': 'amiga'}
+        model = storage.patch(MINI_HOST, patch)
+        storage.bus_mixin.request.assert_called_once_with(
+            'storage.patch', params={
+                'model_type_name': MINI_HOST.__class__.__name__,
+                'model_json_data': MINI_HOST_DICT,
+                'patch': patch,
+            }
+        )
+        self.assertIsInstance(model, Host)
+        self.assertEqual(model.to_dict_safe(), FULL_HOST_DICT)
+        # The model instance itself is left untouched.
+        self.assertEqual('', MINI_HOST.status)
+
+    def test_patch_invalid(self):
+        """
+        Verify StorageClient.patch rejects invalid patches.
+        """
+        storage = StorageClient(mock.MagicMock())
+        storage.bus_mixin.logger = mock.MagicMock()
+        self.assertRaises(
+            ValidationError, storage.patch, MINI_HOST, {'cpus': 'many'})
+        self.assertRaises(
+            ModelError, storage.patch, MINI_HOST, {'bogus': 1})
+        storage.bus_mixin.request.assert_not_called()
+
     def test_save_many(self):
         """
         Verify StorageClient.save_many works as expected
@@ -359,6 +652,92 @@ class TestCommissaireStorageClient(TestCase):
         self.assertIsInstance(model.hosts[0], Host)
         self.assertEqual(model.hosts[0].to_dict_safe(), FULL_HOST_DICT)
 
+    def test_list_lazy(self):
+        """
+        Verify StorageClient.list returns lazy models when asked.
+        """
+        storage = StorageClient(mock.MagicMock())
+        storage.bus_mixin.logger = mock.MagicMock()
+        storage.bus_mixin.request.return_value = {
+            'jsonrpc': '2.0',
+            'id': ID,
+            'result': [FULL_HOST_DICT, {'address': None}]
+        }
+        model = storage.list(Hosts, lazy=True)
+        self.assertIsInstance(model, Hosts)
+        self.assertEqual(len(model.hosts), 2)
+        self.assertIsInstance(model.hosts[0], Host)
+        self.assertIsNotNone(model.hosts[0]._raw)
+        self.assertEqual(model.hosts[0].to_dict_safe(), FULL_HOST_DICT)
+        self.assertIsNotNone(model.hosts[1]._raw)
+        self.assertRaises(ValidationError, getattr, model.hosts[1], 'address')
+        self.assertRaises(ValidationError, getattr, model.hosts[1], 'address')
+        self.assertIsNotNone(model.hosts[1]._raw)
+
+    def test_list_fields(self):
+        """
+        Verify StorageClient.list sends the requested item fields.
+        """
+        storage = StorageClient(mock.MagicMock())
+        storage.bus_mixin.logger = mock.MagicMock()
+        storage.bus_mixin.request.return_value = {
+            'jsonrpc': '2.0',
+            'id': ID,
+            'result': [{'address': '127.0.0.1', 'status': 'active'}]
+        }
+        model = storage.list(Hosts, fields=['address', 'status'])
+        storage.bus_mixin.request.assert_called_once_with(
+            'storage.list', params={
+                'model_type_name': 'Hosts',
+                'fields': ['address', 'status'],
+            }
+        )
+        self.assertEqual('active', model.hosts[0].status)
+
+    def test_list_trusted(self):
+        """
+        Verify StorageClient.list skips validating trusted records.
+        """
+        invalid = {
+            'jsonrpc': '2.0',
+            'id': ID,
+            'result': [{'address': None}],
+            'schema_fingerprint': Host._schema_fingerprint,
+        }
+        storage = StorageClient(mock.MagicMock(), trust_fingerprints=True)
+        storage.bus_mixin.logger = mock.MagicMock()
+        storage.bus_mixin.request.return_value = invalid
+        model = storage.list(Hosts)
+        self.assertIsNone(model.hosts[0].address)
+
+        # Mismatched fingerprints are validated
+        invalid['schema_fingerprint'] = Cluster._schema_fingerprint
+        self.assertRaises(ValidationError, storage.list, Hosts)
+
+        # Untrusting clients always validate
+        invalid['schema_fingerprint'] = Host._schema_fingerprint
+        storage.trust_fingerprints = False
+        self.assertRaises(ValidationError, storage.list, Hosts)
+
+    def test_list_trusted_with_custom_validate(self):
+        """
+        Verify StorageClient.list validates models with a custom _validate.
+        """
+        storage = StorageClient(mock.MagicMock(), trust_fingerprints=True)
+        storage.bus_mixin.logger = mock.MagicMock()
+        storage.bus_mixin.request.return_value = {
+            'jsonrpc': '2.0',
+            'id': ID,
+            'result': [{'name': 'test', 'type': 'unknown', 'options': {}}],
+            'schema_fingerprint': models._schema_fingerprint(
+                models.Network._attribute_map),
+        }
+        self.assertRaises(ValidationError, storage.list, models.Networks)
+
+        # Nor does a missing fingerprint match
+        del storage.bus_mixin.request.return_value['schema_fingerprint']
+        self.assertRaises(ValidationError, storage.list, models.Networks)
+
     def test_list_rpc_error(self):
         """
         Verify StorageClient.list re-raises RemoteProcedureCallError.
@@ -390,3 +769,212 @@ class TestCommissaireStorageClient(TestCase):
                 'model_type_name': 'Hosts'
             }
         )
+
+    def test_get_cluster_name_for_host(self):
+        """
+        Verify get_cluster_name_for_host looks up the host index entry.
+        """
+        storage = StorageClient(mock.MagicMock())
+        storage.bus_mixin.request.return_value = {
+            'jsonrpc': '2.0',
+            'id': ID,
+            'result': {'address': '127.0.0.1', 'cluster': 'honeynut'}
+        }
+        self.assertEquals(
+            'honeynut', storage.get_cluster_name_for_host('127.0.0.1'))
+        storage.bus_mixin.request.assert_called_once_with(
+            'storage.get', params={
+                'model_type_name': 'HostCluster',
+                'model_json_data': {'address': '127.0.0.1'},
+            }
+        )
+
+    def test_get_cluster_name_for_host_without_cluster(self):
+        """
+        Verify get_cluster_name_for_host returns None for hosts in no cluster.
+        """
+        storage = StorageClient(mock.MagicMock())
+
+        def request(routing_key, params):
+            if routing_key == 'storage.get':
+                raise StorageLookupError('test')
+            return {'jsonrpc': '2.0', 'id': ID, 'result': [
+                {'name': 'honeynut', 'hostset': ['127.0.0.2']}]}
+        storage.bus_mixin.request.side_effect = request
+        self.assertIsNone(storage.get_cluster_name_for_host('127.0.0.1'))
+        self.assertEquals(
+            ['storage.get', 'storage.list'],
+            [call[0][0] for call in storage.bus_mixin.request.call_args_list])
+
+    def test_get_cluster_name_for_host_without_index(self):
+        """
+        Verify get_cluster_name_for_host scans the clusters of hosts
+        without an index entry and saves the entry.
+        """
+        storage = StorageClient(mock.MagicMock())
+
+        def request(routing_key, params):
+            if routing_key == 'storage.get':
+                raise StorageLookupError('test')
+            if routing_key == 'storage.list':
+                return {'jsonrpc': '2.0', 'id': ID, 'result': [
+                    {'name': 'other', 'hostset': []},
+                    {'name': 'honeynut', 'hostset': ['127.0.0.1']}]}
+            return {'jsonrpc': '2.0', 'id': ID,
+                    'result': params['model_json_data']}
+        storage.bus_mixin.request.side_effect = request
+        self.assertEquals(
+            'honeynut', storage.get_cluster_name_for_host('127.0.0.1'))
+        storage.bus_mixin.request.assert_called_with(
+            'storage.save', params={
+                'model_type_name': 'HostCluster',
+                'model_json_data': {
+                    'address': '127.0.0.1', 'cluster': 'honeynut'},
+            }
+        )
+
+        # Failing to save the entry does not fail the lookup
+        storage.bus_mixin.logger = mock.MagicMock()
+        storage.bus_mixin.request.reset_mock()
+        storage.bus_mixin.request.side_effect = [
+            StorageLookupError('test'),
+            {'jsonrpc': '2.0', 'id': ID, 'result': [
+                {'name': 'honeynut', 'hostset': ['127.0.0.1']}]},
+            RemoteProcedureCallError('test'),
+        ]
+        self.assertEquals(
+            'honeynut', storage.get_cluster_name_for_host('127.0.0.1'))
+        self.assertEquals(1, storage.bus_mixin.logger.warn.call_count)
+
+
+class TestJSONOperations(TestCase):
+    """
+    Counts JSON encoding and decoding on the path of a StorageClient.list
+    call: client, bus, storage service and etcd.
+    """
+
+    def setUp(self):
+        """
+        Set up a StorageClient talking to an EtcdStoreHandler through a
+        fake broker which serializes messages like kombu does.
+        """
+        self.records = [
+            mock.MagicMock(value=json.dumps(dict(
+                FULL_HOST_DICT, address='10.0.0.{}'.format(n))))
+            for n in range(5)]
+        self.handler = EtcdStoreHandler({})
+        self.handler._store = mock.MagicMock()
+        self.handler._store.read.return_value = mock.MagicMock(
+            children=self.records)
+        self.transport = {'encode': 0, 'decode': 0}
+        self.encode_response = False
+
+        bus_mixin = BusMixin()
+        bus_mixin.logger = mock.MagicMock()
+        bus_mixin.connection = mock.MagicMock()
+        bus_mixin.producer = mock.MagicMock()
+        bus_mixin.producer.publish.side_effect = self.serve
+        bus_mixin._exchange = 'exchange'
+        self.queue = bus_mixin.connection.SimpleQueue()
+        self.storage = StorageClient(bus_mixin)
+
+    def send(self, body):
+        """
+        Returns a kombu Message carrying body the way a broker would.
+        """
+        content_type, encoding, data = serialization.dumps(body, 'json')
+        self.transport['encode'] += 1
+        message = Message(
+            body=data, content_type=content_type,
+            content_encoding=encoding, channel=mock.MagicMock())
+        payload = message.payload
+        self.transport['decode'] += 1
+        return message, payload
+
+    def serve(self, request, routing_key, **kwargs):
+        """
+        Handles a published request like the storage service does.
+        """
+        _, request = self.send(request)
+        model_class = getattr(models, request['params']['model_type_name'])
+        model_instance = self.handler._list(model_class.new())
+        result = [item.to_dict() for item in getattr(
+            model_instance, model_instance._list_attr)]
+        response = {'jsonrpc': '2.0', 'id': request['id'], 'result': result}
+        if self.encode_response:
+            # Older services encoded the response themselves
+            response = json.dumps(response)
+        message, _ = self.send(response)
+        self.queue.get.return_value = message
+
+    def test_list(self):
+        """
+        Verify each hop encodes and decodes once, and stored records are
+        decoded once.
+        """
+        with mock.patch('json.dumps', side_effect=json.dumps) as dumps, \
+                mock.patch('json.loads', side_effect=json.loads) as loads:
+            hosts = self.storage.list(Hosts)
+        self.assertEquals(len(self.records), len(hosts.hosts))
+        self.assertEquals({'encode': 2, 'decode': 2}, self.transport)
+        self.assertEquals(0, dumps.call_count)
+        self.assertEquals(len(self.records), loads.call_count)
+
+    def test_list_encoded_twice(self):
+        """
+        Verify responses from services encoding them before kombu does
+        are still decoded.
+        """
+        self.encode_response = True
+        hosts = self.storage.list(Hosts)
+        self.assertEquals(len(self.records), len(hosts.hosts))
+        self.assertEquals('10.0.0.4', hosts.hosts[-1].address)
+
+
+class TestNotifyCallback(TestCase):
+    """
+    Tests for the NotifyCallback decorator.
+    """
+
+    class Service:
+        """
+        Minimal notification handler.
+        """
+        def __init__(self, identity_map=None):
+            self.logger = mock.MagicMock()
+            self.identity_map = identity_map
+            self.received = []
+
+        @NotifyCallback
+        def callback(self, event, model, message):
+            self.received.append((event, model))
+
+    def test_callback(self):
+        """
+        Verify NotifyCallback passes a model instance to the callback.
+        """
+        service = self.Service()
+        service.callback(
+            {'event': 'created', 'class': 'Host', 'model': FULL_HOST_DICT},
+            mock.MagicMock())
+        event, model = service.received[0]
+        self.assertEquals('created', event)
+        self.assertEquals(FULL_HOST_DICT, model.to_dict_safe())
+
+    def test_callback_identity_map(self):
+        """
+        Verify NotifyCallback updates shared instances in an identity map.
+        """
+        service = self.Service(IdentityMap())
+        host = service.identity_map.load(Host, FULL_HOST_DICT)
+        service.callback(
+            {'event': 'updated', 'class': 'Host',
+             'model': {'address': host.address, 'status': 'active'}},
+            mock.MagicMock())
+        self.assertIs(host, service.received[0][1])
+        self.assertEquals('active', host.status)
+        service.callback(
+            {'event': 'deleted', 'class': 'Host', 'model': FULL_HOST_DICT},
+            mock.MagicMock())
+        self.assertIsNot(host, service.received[1][1])
+        self.assertIsNone(service.identity_map.get(Host, host.address))
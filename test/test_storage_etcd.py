@@ -0,0 +1,394 @@
+# Copyright (C) 2017  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Tests for the commissaire.storage.etcd module.
+"""
+
+import json
+
+import etcd
+
+from unittest import mock
+
+from . import TestCase
+
+from commissaire import models
+from commissaire.bus import RemoteProcedureCallError, StorageLookupError
+from commissaire.storage.etcd import EtcdStoreHandler
+
+#: Stored host record, including merged HostCreds data
+STORED_HOST = {
+    'address': '127.0.0.1',
+    'status': 'investigating',
+    'os': '',
+    'cpus': 0,
+    'memory': 0,
+    'space': 0,
+    'last_check': '',
+    'source': '',
+    'ssh_priv_key': 'secret',
+    'remote_user': 'root',
+}
+
+
+class TestEtcdStoreHandler(TestCase):
+    """
+    Tests for the EtcdStoreHandler class.
+    """
+
+    def setUp(self):
+        """
+        Set up a handler with a mock etcd client.
+        """
+        self.handler = EtcdStoreHandler({})
+        self.handler._store = mock.MagicMock()
+        self.handler.notify = mock.MagicMock()
+        self.handler._store.get.return_value = mock.MagicMock(
+            value=json.dumps(STORED_HOST), modifiedIndex=7)
+
+    def test__patch(self):
+        """
+        Verify _patch writes the patched value with compare-and-swap.
+        """
+        host = models.Host.new(address='127.0.0.1')
+        result = self.handler._patch(host, {'status': 'active'})
+        self.assertEquals('active', result.status)
+        key, value = self.handler._store.write.call_args[0]
+        self.assertEquals('/commissaire/hosts/127.0.0.1', key)
+        self.assertEquals(
+            7, self.handler._store.write.call_args[1]['prevIndex'])
+        written = json.loads(value)
+        self.assertEquals('active', written['status'])
+        # Data outside the model is preserved.
+        self.assertEquals('secret', written['ssh_priv_key'])
+        self.handler.notify.updated.assert_called_once_with(result)
+
+    def test__save_frozen(self):
+        """
+        Verify _save leaves the serialization of frozen instances alone.
+        """
+        self.handler._store.write.return_value = mock.MagicMock(
+            newKey=False)
+        host = models.Host.new(address='127.0.0.1', status='active')
+        host.freeze()
+        expected = host.to_dict()
+        self.handler._save(host)
+        self.assertEquals(expected, host.to_dict())
+        self.assertNotIn('ssh_priv_key', host.to_dict())
+        self.assertEquals('active', json.loads(host.to_json())['status'])
+
+    def test__patch_retries_on_conflict(self):
+        """
+        Verify _patch retries when the key changes concurrently.
+        """
+        self.handler._store.write.side_effect = [
+            etcd.EtcdCompareFailed(), mock.MagicMock()]
+        host = models.Host.new(address='127.0.0.1')
+        self.handler._patch(host, {'status': 'active'})
+        # The status change also looks up the host's cluster.
+        self.assertEquals(
+            2, self.handler._store.get.call_args_list.count(
+                mock.call('/commissaire/hosts/127.0.0.1')))
+        self.assertEquals(2, self.handler._store.write.call_count)
+
+    def test__patch_gives_up(self):
+        """
+        Verify _patch raises after too many conflicts.
+        """
+        self.handler._store.write.side_effect = etcd.EtcdCompareFailed()
+        host = models.Host.new(address='127.0.0.1')
+        self.assertRaises(
+            RemoteProcedureCallError,
+            self.handler._patch, host, {'status': 'active'})
+        self.assertEquals(
+            EtcdStoreHandler.PATCH_ATTEMPTS,
+            self.handler._store.write.call_count)
+        self.handler.notify.updated.assert_not_called()
+
+    def test__patch_missing_key(self):
+        """
+        Verify _patch raises StorageLookupError for missing keys.
+        """
+        self.handler._store.get.side_effect = etcd.EtcdKeyNotFound()
+        host = models.Host.new(address='127.0.0.1')
+        self.assertRaises(
+            StorageLookupError,
+            self.handler._patch, host, {'status': 'active'})
+
+
+class TestEtcdStoreHandlerHostClusterIndex(TestCase):
+    """
+    Tests for the host to cluster index kept by EtcdStoreHandler.
+    """
+
+    def setUp(self):
+        """
+        Set up a handler with a mock etcd client holding a cluster.
+        """
+        self.handler = EtcdStoreHandler({})
+        self.handler._store = mock.MagicMock()
+        self.handler.notify = mock.MagicMock()
+        self.stored = models.Cluster.new(
+            name='honeynut', hostset=['10.0.0.1', '10.0.0.2'])
+        self.handler._store.get.return_value = mock.MagicMock(
+            value=self.stored.to_json(), modifiedIndex=7)
+        self.handler._store.write.side_effect = (
+            lambda key, value, **kwargs: mock.MagicMock(
+                value=value, newKey=False))
+
+    def entry(self, address):
+        """
+        Returns the index key and value for a host in the cluster.
+        """
+        entry = models.HostCluster.new(address=address, cluster='honeynut')
+        return ('/commissaire/host_clusters/' + address, entry.to_json())
+
+    def test_save_writes_changes(self):
+        """
+        Verify saving a cluster writes only the changed index entries.
+        """
+        cluster = models.Cluster.new(
+            name='honeynut', hostset=['10.0.0.2', '10.0.0.3'])
+        self.handler._save(cluster)
+        self.assertIn(
+            mock.call(*self.entry('10.0.0.3')),
+            self.handler._store.write.call_args_list)
+        self.assertEquals(2, self.handler._store.write.call_count)
+        key, value = self.entry('10.0.0.1')
+        self.handler._store.delete.assert_called_once_with(
+            key, prevValue=value)
+
+    def test_save_new_cluster(self):
+        """
+        Verify saving a new cluster indexes all of its hosts.
+        """
+        self.handler._store.get.side_effect = etcd.EtcdKeyNotFound()
+        self.handler._save(self.stored)
+        for address in self.stored.hostset:
+            self.assertIn(
+                mock.call(*self.entry(address)),
+                self.handler._store.write.call_args_list)
+        self.handler._store.delete.assert_not_called()
+
+    def test_save_keeps_moved_hosts(self):
+        """
+        Verify entries naming another cluster are not removed.
+        """
+        self.handler._store.delete.side_effect = etcd.EtcdCompareFailed()
+        self.handler._save(models.Cluster.new(name='honeynut'))
+        self.assertEquals(2, self.handler._store.delete.call_count)
+
+    def test_delete(self):
+        """
+        Verify deleting a cluster removes its index entries.
+        """
+        self.handler._store.delete.return_value = mock.MagicMock(
+            _prev_node=mock.MagicMock(value=self.stored.to_json()))
+        self.handler._delete(models.Cluster.new(name='honeynut'))
+        for address in self.stored.hostset:
+            key, value = self.entry(address)
+            self.handler._store.delete.assert_any_call(key, prevValue=value)
+
+    def test_patch(self):
+        """
+        Verify patching a hostset updates the index.
+        """
+        self.handler._patch(
+            models.Cluster.new(name='honeynut'),
+            {'hostset': ['10.0.0.1', '10.0.0.2', '10.0.0.4']})
+        self.assertIn(
+            mock.call(*self.entry('10.0.0.4')),
+            self.handler._store.write.call_args_list)
+        self.handler._store.delete.assert_not_called()
+
+
+class TestEtcdStoreHandlerHostCounters(TestCase):
+    """
+    Tests for the Cluster.hosts counters kept by EtcdStoreHandler.
+    """
+
+    def setUp(self):
+        """
+        Set up a handler with a dict backed mock etcd client.
+        """
+        self.data = {}
+        self.handler = EtcdStoreHandler({})
+        self.handler._store = mock.MagicMock()
+        self.handler._store.get.side_effect = self.get
+        self.handler._store.write.side_effect = self.write
+        self.handler._store.delete.side_effect = self.delete
+        self.handler.notify = mock.MagicMock()
+        for address, status in (('10.0.0.1', 'active'),
+                                ('10.0.0.2', 'failed')):
+            self.data['/commissaire/hosts/' + address] = json.dumps(
+                dict(STORED_HOST, address=address, status=status))
+
+    def get(self, key):
+        """
+        Returns the stored value of a key.
+        """
+        if key not in self.data:
+            raise etcd.EtcdKeyNotFound()
+        return mock.MagicMock(value=self.data[key], modifiedIndex=1)
+
+    def write(self, key, value, **kwargs):
+        """
+        Stores the value of a key.
+        """
+        new_key = key not in self.data
+        self.data[key] = value
+        return mock.MagicMock(value=value, newKey=new_key)
+
+    def delete(self, key, **kwargs):
+        """
+        Removes a key.
+        """
+        value = self.get(key).value
+        del self.data[key]
+        return mock.MagicMock(_prev_node=mock.MagicMock(value=value))
+
+    def counters(self):
+        """
+        Returns the stored counters of the cluster.
+        """
+        return json.loads(self.data['/commissaire/clusters/honeynut'])['hosts']
+
+    def save_cluster(self):
+        """
+        Saves a cluster with both stored hosts and an unknown one.
+        """
+        self.handler._save(models.Cluster.new(
+            name='honeynut', hostset=['10.0.0.1', '10.0.0.2', '10.0.0.3']))
+
+    def test_save_encodes_once(self):
+        """
+        Verify saving encodes the record once and does not decode it back.
+        """
+        host = models.Host.new(address='10.0.0.3', status='active')
+        with mock.patch('json.dumps', side_effect=json.dumps) as dumps, \
+                mock.patch('json.loads', side_effect=json.loads) as loads:
+            saved = self.handler._save(host)
+        self.assertEquals(1, dumps.call_count)
+        self.assertEquals(0, loads.call_count)
+        self.assertEquals(host.to_dict(), saved.to_dict())
+        self.assertEquals(
+            host.to_dict(),
+            json.loads(self.data['/commissaire/hosts/10.0.0.3']))
+
+    def test_save_host_keeps_counters(self):
+        """
+        Verify saving a stored host with another status changes neither
+        its stored status nor the counters, without reading the cluster.
+        """
+        self.save_cluster()
+        self.handler._store.get.reset_mock()
+        saved = self.handler._save(
+            models.Host.new(address='10.0.0.2', status='active'))
+        self.assertEquals('failed', saved.status)
+        self.assertEquals(
+            {'total': 2, 'available': 1, 'unavailable': 1}, self.counters())
+        self.assertEquals(
+            ['/commissaire/hosts/10.0.0.2'],
+            [call[0][0] for call in self.handler._store.get.call_args_list])
+
+    def test_save_cluster(self):
+        """
+        Verify saving a cluster stores counters for its stored hosts.
+        """
+        self.save_cluster()
+        self.assertEquals(
+            {'total': 2, 'available': 1, 'unavailable': 1}, self.counters())
+        cluster = self.handler._get(models.Cluster.new(name='honeynut'))
+        self.assertEquals(self.counters(), cluster.hosts)
+
+    def test_save_frozen_cluster(self):
+        """
+        Verify saving leaves the given cluster alone, even if frozen.
+        """
+        cluster = models.Cluster.new(
+            name='honeynut', hostset=['10.0.0.1']).freeze()
+        saved = self.handler._save(cluster)
+        self.assertEquals(0, cluster.hosts['total'])
+        self.assertEquals(1, saved.hosts['total'])
+        self.assertNotIn('hosts', cluster.to_dict())
+
+    def test_save_cluster_conflict(self):
+        """
+        Verify saving a cluster keeps counters written concurrently.
+        """
+        self.save_cluster()
+        write = self.write
+        key = '/commissaire/clusters/honeynut'
+
+        def concurrent_write(*args, **kwargs):
+            # A host status changes after the cluster was read
+            self.handler._store.write.side_effect = write
+            self.handler._patch(
+                models.Host.new(address='10.0.0.2'), {'status': 'active'})
+            raise etcd.EtcdCompareFailed()
+
+        self.handler._store.write.side_effect = concurrent_write
+        self.handler._save(models.Cluster.new(
+            name='honeynut', hostset=['10.0.0.1', '10.0.0.2', '10.0.0.3']))
+        self.assertEquals(
+            {'total': 2, 'available': 2, 'unavailable': 0}, self.counters())
+        self.assertEquals(1, self.handler._store.write.call_args[1].get(
+            'prevIndex'))
+        self.assertEquals(key, self.handler._store.write.call_args[0][0])
+
+    def test_save_cluster_removes_hosts(self):
+        """
+        Verify removing hosts from a cluster updates its counters.
+        """
+        self.save_cluster()
+        self.handler._patch(
+            models.Cluster.new(name='honeynut'), {'hostset': ['10.0.0.2']})
+        self.assertEquals(
+            {'total': 1, 'available': 0, 'unavailable': 1}, self.counters())
+
+    def test_host_status_change(self):
+        """
+        Verify a host status change updates the counters of its cluster.
+        """
+        self.save_cluster()
+        self.handler.notify.reset_mock()
+        self.handler._patch(
+            models.Host.new(address='10.0.0.2'), {'status': 'active'})
+        self.assertEquals(
+            {'total': 2, 'available': 2, 'unavailable': 0}, self.counters())
+        cluster = self.handler.notify.updated.call_args[0][0]
+        self.assertEquals(self.counters(), cluster.hosts)
+
+    def test_host_created_and_deleted(self):
+        """
+        Verify hosts in a cluster are counted when created and deleted.
+        """
+        self.save_cluster()
+        self.handler._save(models.Host.new(address='10.0.0.3'))
+        self.assertEquals(
+            {'total': 3, 'available': 1, 'unavailable': 2}, self.counters())
+        self.handler._delete(models.Host.new(address='10.0.0.1'))
+        self.assertEquals(
+            {'total': 2, 'available': 0, 'unavailable': 2}, self.counters())
+
+    def test_host_without_cluster(self):
+        """
+        Verify hosts in no cluster leave clusters untouched.
+        """
+        self.handler._patch(
+            models.Host.new(address='10.0.0.2'), {'status': 'active'})
+        self.assertEquals(1, self.handler.notify.updated.call_count)
+        self.assertIsInstance(
+            self.handler.notify.updated.call_args[0][0], models.Host)
@@ -0,0 +1,201 @@
+# Copyright (C) 2017  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Test cases for the commissaire.util.cache module.
+"""
+
+import threading
+import time
+
+from . import TestCase
+
+from commissaire.util.cache import LRUCache, SingleFlight
+
+
+class TestLRUCache(TestCase):
+    """
+    Tests for the LRUCache class.
+    """
+
+    def setUp(self):
+        """
+        Set up a cache with a controllable clock.
+        """
+        self.now = 0.0
+        self.cache = LRUCache(max_size=2, ttl=10, clock=lambda: self.now)
+
+    def test_get_and_set(self):
+        """
+        Verify values are returned and lookups are counted.
+        """
+        self.assertIsNone(self.cache.get('a'))
+        self.assertTrue(self.cache.set('a', 1))
+        self.assertEquals(1, self.cache.get('a'))
+        self.assertEquals('x', self.cache.get('b', 'x'))
+        self.assertEquals(
+            {'hits': 1, 'misses': 2, 'evictions': 0, 'size': 1},
+            self.cache.stats())
+
+    def test_evicts_least_recently_used(self):
+        """
+        Verify the least recently used entry is evicted when full.
+        """
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertEquals(2, len(self.cache))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEquals(1, self.cache.get('a'))
+        self.assertEquals(1, self.cache.evictions)
+
+    def test_ttl(self):
+        """
+        Verify entries expire after the ttl.
+        """
+        self.cache.set('a', 1)
+        self.now = 9.9
+        self.assertEquals(1, self.cache.get('a'))
+        self.now = 10.0
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEquals(0, len(self.cache))
+
+    def test_no_ttl(self):
+        """
+        Verify entries do not expire without a ttl.
+        """
+        cache = LRUCache(ttl=None, clock=lambda: self.now)
+        cache.set('a', 1)
+        self.now = 1e9
+        self.assertEquals(1, cache.get('a'))
+
+    def test_generation(self):
+        """
+        Verify values read before an invalidation are not stored.
+        """
+        generation = self.cache.generation
+        self.cache.discard('a')
+        self.assertFalse(self.cache.set('a', 1, generation))
+        self.assertIsNone(self.cache.get('a'))
+        self.assertTrue(self.cache.set('a', 1, self.cache.generation))
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_invalid_size(self):
+        """
+        Verify caches must hold at least one entry.
+        """
+        self.assertRaises(ValueError, LRUCache, max_size=0)
+
+
+class TestSingleFlight(TestCase):
+    """
+    Tests for the SingleFlight class.
+    """
+
+    def setUp(self):
+        """
+        Set up a SingleFlight with a call blocked until released.
+        """
+        self.flight = SingleFlight()
+        self.release = threading.Event()
+        self.results = []
+
+    def blocked(self, value):
+        """
+        Returns value once released.
+        """
+        self.release.wait(5)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def call(self, key, value):
+        """
+        Calls blocked() through the SingleFlight and records the outcome.
+        """
+        try:
+            self.results.append(self.flight.do(key, self.blocked, value))
+        except Exception as error:
+            self.results.append(error)
+
+    def run_calls(self, key, values):
+        """
+        Starts a call per value, releases them once all but the first
+        wait for it and returns the outcomes.
+        """
+        threads = [threading.Thread(target=self.call, args=(key, value))
+                   for value in values]
+        threads[0].start()
+        while not len(self.flight):
+            time.sleep(0.001)
+        for thread in threads[1:]:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while (self.flight.waiting(key) < len(values) - 1 and
+                time.monotonic() < deadline):
+            time.sleep(0.001)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return self.results
+
+    def test_do(self):
+        """
+        Verify concurrent calls share one result as separate copies.
+        """
+        results = self.run_calls('a', [{'n': 1}, {'n': 2}, {'n': 3}])
+        self.assertEquals([{'n': 1}] * 3, results)
+        self.assertEquals(3, len({id(result) for result in results}))
+        self.assertEquals(1, self.flight.calls)
+        self.assertEquals(2, self.flight.shared)
+        self.assertEquals(0, len(self.flight))
+        self.assertEquals(5, self.flight.do('a', lambda: 5))
+        self.assertEquals(2, self.flight.calls)
+
+    def test_do_error(self):
+        """
+        Verify concurrent calls share one exception.
+        """
+        error = ValueError('bad')
+        results = self.run_calls('a', [error, 1])
+        self.assertEquals([error, error], results)
+        self.assertEquals(0, len(self.flight))
+
+    def test_do_keys(self):
+        """
+        Verify calls with different keys do not wait for each other.
+        """
+        self.release.set()
+        self.assertEquals(1, self.flight.do('a', self.blocked, 1))
+        self.assertEquals(2, self.flight.do('b', self.blocked, 2))
+        self.assertEquals(0, self.flight.shared)
+
+    def test_clear(self):
+        """
+        Verify calls arriving after clear start a new call.
+        """
+        thread = threading.Thread(target=self.call, args=('a', 1))
+        thread.start()
+        while not len(self.flight):
+            time.sleep(0.001)
+        self.flight.clear()
+        self.assertEquals(0, len(self.flight))
+        self.assertEquals(2, self.flight.do('a', lambda: 2))
+        self.release.set()
+        thread.join(5)
+        self.assertEquals([1], self.results)
+        self.assertEquals(2, self.flight.calls)
+        self.assertEquals(0, self.flight.shared)
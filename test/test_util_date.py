@@ -65,3 +65,47 @@ class Test_formatted_dt(TestCase):
             _dt.utcnow.return_value = DT
             _dt.strftime.return_value = ISOFORMAT
             self.assertEquals(ISOFORMAT, date.formatted_dt(DT))
+
+
+class Test_format_dt(TestCase):
+    """
+    Tests the format_dt function.
+    """
+
+    def test_format_dt(self):
+        """
+        Test the format_dt function matches strftime.
+        """
+        for dt in (DT, DT.replace(microsecond=0), date.datetime.datetime.max):
+            self.assertEquals(
+                dt.strftime(date.C.DATE_FORMAT), date.format_dt(dt))
+
+
+class Test_parse_dt(TestCase):
+    """
+    Tests the parse_dt function.
+    """
+
+    def test_parse_dt(self):
+        """
+        Test the parse_dt function with the expected format.
+        """
+        self.assertEquals(DT, date.parse_dt(date.format_dt(DT)))
+
+    def test_parse_dt_fallback(self):
+        """
+        Test the parse_dt function with other formats strptime accepts.
+        """
+        self.assertEquals(
+            date.datetime.datetime(2015, 12, 17, 15, 48, 18, 500000),
+            date.parse_dt('2015-12-17T15:48:18.5'))
+
+    def test_parse_dt_invalid(self):
+        """
+        Test the parse_dt function with invalid input.
+        """
+        for value in ('', 'now', '2015-12-17', '2015-12-17T15:48:18',
+                      '2015-13-17T15:48:18.710454',
+                      '2015-12-17T15:48:18x710454',
+                      '2015-12-17T15:48:18.71045x'):
+            self.assertRaises(ValueError, date.parse_dt, value)
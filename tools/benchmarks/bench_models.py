@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2017  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Micro-benchmarks for commissaire.models.
+
+Run from the top of the repository:
+
+    PYTHONPATH=src python3 tools/benchmarks/bench_models.py [name ...]
+"""
+
+import argparse
+import copy
+import datetime
+import json
+import re
+import resource
+import subprocess
+import sys
+import timeit
+import tracemalloc
+
+from commissaire import constants as C
+from commissaire import models
+from commissaire.models import identity
+from commissaire.bus import binary
+from commissaire.util import date
+
+
+#: Number of hosts used by the list benchmarks
+HOST_COUNT = 10000
+
+
+def make_hosts(count=HOST_COUNT):
+    """
+    Returns a Hosts instance holding count hosts.
+
+    :param count: The number of hosts to create.
+    :type count: int
+    :returns: A populated Hosts instance.
+    :rtype: commissaire.models.Hosts
+    """
+    hosts = []
+    for i in range(count):
+        hosts.append(models.Host.new(
+            address='10.{}.{}.{}'.format(i >> 16, (i >> 8) & 255, i & 255),
+            status='active' if i % 3 else 'failed',
+            os='fedora' if i % 2 else 'rhel',
+            cpus=4, memory=8192, space=100000,
+            last_check='2017-01-01T00:00:00.000000'))
+    return models.Hosts.new(hosts=hosts)
+
+
+def report(name, seconds, number, baseline=None):
+    """
+    Prints a single benchmark result.
+
+    :param name: The name of the measurement.
+    :type name: str
+    :param seconds: Best total time for number runs.
+    :type seconds: float
+    :param number: How many runs were timed.
+    :type number: int
+    :param baseline: Optional baseline time to compute a speedup against.
+    :type baseline: float
+    """
+    line = '{:<40} {:>10.2f} ms'.format(name, seconds / number * 1000)
+    if baseline:
+        line += '  ({:.1f}x)'.format(baseline / seconds)
+    print(line)
+
+
+def best_of(func, number, repeat=5):
+    """
+    Returns the best total time of func over repeat runs.
+
+    :param func: The callable to time.
+    :type func: callable
+    :param number: How many calls make up a run.
+    :type number: int
+    :param repeat: How many runs to make.
+    :type repeat: int
+    :returns: The best total time in seconds.
+    :rtype: float
+    """
+    return min(timeit.repeat(func, number=number, repeat=repeat))
+
+
+def bench_to_dict():
+    """
+    Compares Hosts.to_dict() against the former JSON round trip.
+    """
+    hosts = make_hosts()
+
+    def legacy_to_dict():
+        # What Model.to_dict() used to do for every instance, with
+        # last_check encoded the way the date codec does it.
+        return [json.loads(json.dumps(
+            {k: getattr(h, k) for k in h._attribute_map},
+            default=date.format_dt))
+            for h in hosts.hosts]
+
+    print('to_dict ({} hosts)'.format(HOST_COUNT))
+    baseline = best_of(legacy_to_dict, 3)
+    report('json round trip', baseline, 3)
+    report('compiled serializer', best_of(hosts.to_dict, 3), 3, baseline)
+    report('compiled serializer (safe)',
+           best_of(hosts.to_dict_safe, 3), 3, baseline)
+    report('to_json', best_of(hosts.to_json, 3), 3)
+
+
+class LegacyHost:
+    """
+    Host equivalent storing its attributes in a per-instance __dict__,
+    the way models did before they were slotted.
+    """
+
+    def __init__(self, **kwargs):
+        for key in models.Host._attribute_map.keys():
+            setattr(self, key, kwargs[key])
+
+
+def allocated_bytes(factory, count):
+    """
+    Returns the bytes allocated per object created by factory.
+
+    :param factory: Callable creating one object.
+    :type factory: callable
+    :param count: The number of objects to create.
+    :type count: int
+    :returns: Bytes allocated per object.
+    :rtype: float
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [factory(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # The list holding the objects is not part of the per-object cost.
+    list_size = objects.__sizeof__()
+    return (after - before - list_size) / count
+
+
+def bench_memory():
+    """
+    Compares per-instance memory of slotted models with __dict__ storage.
+    """
+    data = make_hosts(1).hosts[0].to_dict()
+    print('memory per instance ({} hosts)'.format(HOST_COUNT))
+    # Attribute values are shared so only the instances are measured.
+    legacy = allocated_bytes(lambda i: LegacyHost(**data), HOST_COUNT)
+    slotted = allocated_bytes(lambda i: models.Host(**data), HOST_COUNT)
+    print('{:<40} {:>10.0f} bytes'.format('__dict__ instances', legacy))
+    print('{:<40} {:>10.0f} bytes  ({:.1f}x)'.format(
+        'slotted instances', slotted, legacy / slotted))
+    # Only shared instances carry the slot for weak references.
+    weak_class = models._weak_class(models.Host)
+    weak = allocated_bytes(lambda i: weak_class(**data), HOST_COUNT)
+    print('{:<40} {:>10.0f} bytes  ({:.1f}x)'.format(
+        'identity mapped instances', weak, legacy / weak))
+
+    print('construction ({} hosts)'.format(HOST_COUNT))
+    baseline = best_of(
+        lambda: [LegacyHost(**data) for _ in range(HOST_COUNT)], 3)
+    report('__dict__ __init__', baseline, 3)
+    report('generated __init__', best_of(
+        lambda: [models.Host(**data) for _ in range(HOST_COUNT)], 3),
+        3, baseline)
+
+
+def bench_new():
+    """
+    Compares Model.new() against deep copying the defaults.
+    """
+    def legacy_new(cls, **kwargs):
+        # What Model.new() used to do for every instance.
+        instance = cls.__new__(cls)
+        init_args = copy.deepcopy(cls._attribute_defaults)
+        init_args.update(kwargs)
+        instance.__init__(**init_args)
+        return instance
+
+    number = 20000
+    print('new ({} calls)'.format(number))
+    for cls, kwargs in ((models.Host, {'address': '127.0.0.1'}),
+                        (models.Cluster, {'name': 'honeynut'})):
+        name = cls.__name__
+        baseline = best_of(lambda: legacy_new(cls, **kwargs), number)
+        report('{}.new with deepcopy'.format(name), baseline, 1)
+        report('{}.new with default factories'.format(name),
+               best_of(lambda: cls.new(**kwargs), number), 1, baseline)
+
+
+def bench_validate():
+    """
+    Compares ListModel._validate_items() against validating each item
+    the way Model._validate() used to.
+    """
+    hosts = make_hosts()
+
+    def legacy_validate(model):
+        # What Model._validate() used to do for every instance.
+        errors = []
+        for attr, spec in model._attribute_map.items():
+            value = getattr(model, attr)
+            if not isinstance(value, spec['type']):
+                errors.append('{}.{}'.format(model.__class__.__name__, attr))
+            try:
+                if spec.get('regex') and not re.match(spec['regex'], value):
+                    errors.append(attr)
+            except TypeError:
+                errors.append(attr)
+        if errors:
+            raise models.ValidationError(errors)
+
+    def per_item():
+        for host in hosts.hosts:
+            legacy_validate(host)
+
+    print('validate ({} hosts)'.format(HOST_COUNT))
+    baseline = best_of(per_item, 3)
+    report('legacy _validate per item', baseline, 3)
+    report('_validate_items', best_of(hosts._validate_items, 3), 3, baseline)
+
+
+def bench_columnar():
+    """
+    Compares fleet aggregations over Host objects and a columnar view.
+    """
+    hosts = make_hosts()
+    columns = hosts.to_columns()
+
+    def memory_per_status():
+        totals = {}
+        for host in hosts.hosts:
+            totals[host.status] = totals.get(host.status, 0) + host.memory
+        return totals
+
+    def count_by_os():
+        counts = {}
+        for host in hosts.hosts:
+            counts[host.os] = counts.get(host.os, 0) + 1
+        return counts
+
+    print('columnar ({} hosts)'.format(HOST_COUNT))
+    report('to_columns', best_of(hosts.to_columns, 3), 3)
+    baseline = best_of(memory_per_status, 10)
+    report('memory per status (objects)', baseline, 10)
+    report('memory per status (columnar)', best_of(
+        lambda: columns.sum_by('memory', 'status'), 10), 10, baseline)
+    baseline = best_of(count_by_os, 10)
+    report('count by os (objects)', baseline, 10)
+    report('count by os (columnar)', best_of(
+        lambda: columns.count_by('os'), 10), 10, baseline)
+
+
+def bench_frozen():
+    """
+    Compares repeated serialization of regular and frozen instances.
+    """
+    host = make_hosts(1).hosts[0]
+    frozen = host.thaw().freeze()
+    number = 100000
+    print('repeated serialization ({} calls)'.format(number))
+    for method in ('to_json', 'to_dict_safe'):
+        baseline = best_of(getattr(host, method), number)
+        report('Host.{}'.format(method), baseline, 1)
+        report('frozen Host.{}'.format(method),
+               best_of(getattr(frozen, method), number), 1, baseline)
+
+
+def bench_fields():
+    """
+    Compares serializing whole hosts with a fields projection.
+    """
+    hosts = make_hosts()
+    fields = ['address', 'status']
+    print('fields projection ({} hosts)'.format(HOST_COUNT))
+    print('{:<40} {:>10} bytes'.format('to_json', len(hosts.to_json())))
+    print('{:<40} {:>10} bytes'.format(
+        'to_json with fields', len(hosts.to_json(fields=fields))))
+    baseline = best_of(hosts.to_json, 3)
+    report('to_json', baseline, 3)
+    report('to_json with fields', best_of(
+        lambda: hosts.to_json(fields=fields), 3), 3, baseline)
+
+
+def bench_datetime():
+    """
+    Compares the fixed format datetime parser and formatter with
+    strptime and strftime.
+    """
+    value = '2017-01-01T12:34:56.789012'
+    dt = date.parse_dt(value)
+    number = 100000
+    print('datetime ({} calls)'.format(number))
+    baseline = best_of(
+        lambda: datetime.datetime.strptime(value, C.DATE_FORMAT), number)
+    report('strptime', baseline, 1)
+    report('parse_dt', best_of(lambda: date.parse_dt(value), number),
+           1, baseline)
+    baseline = best_of(lambda: dt.strftime(C.DATE_FORMAT), number)
+    report('strftime', baseline, 1)
+    report('format_dt', best_of(lambda: date.format_dt(dt), number),
+           1, baseline)
+
+
+def bench_binary():
+    """
+    Compares payload size and round trip time of the binary bus encoding
+    with JSON for a storage.save request of many hosts.
+    """
+    params = {
+        'model_type_name': 'Host',
+        'model_json_data': make_hosts().to_dict(),
+    }
+    encoded_json = json.dumps(params)
+    encoded_binary = binary.dumps(params)
+    print('bus encoding ({} hosts)'.format(HOST_COUNT))
+    print('{:<40} {:>10} bytes'.format('json', len(encoded_json)))
+    print('{:<40} {:>10} bytes  ({:.1f}x smaller)'.format(
+        'binary', len(encoded_binary),
+        len(encoded_json) / len(encoded_binary)))
+    for name, dumps, loads in (('json', json.dumps, json.loads),
+                               ('binary', binary.dumps, binary.loads)):
+        report('{} encode'.format(name), best_of(
+            lambda: dumps(params), 3), 3)
+        encoded = dumps(params)
+        report('{} decode'.format(name), best_of(
+            lambda: loads(encoded), 3), 3)
+
+
+def bench_lazy():
+    """
+    Compares building a host list from a decoded bus response eagerly,
+    as StorageClient.list() does, against lazily with some or all of the
+    items read afterwards.
+    """
+    data = make_hosts().to_dict()
+
+    def eager():
+        hosts = models.Hosts.new(
+            hosts=[models.Host.new(**x) for x in data])
+        hosts._validate_items(fail_fast=True)
+        return hosts
+
+    def lazy(every):
+        hosts = [models.Host.new_lazy(x) for x in data]
+        for host in hosts[::every]:
+            host.address
+        return hosts
+
+    print('lazy list ({} decoded hosts)'.format(HOST_COUNT))
+    baseline = best_of(eager, 3)
+    report('eager with validation', baseline, 3)
+    report('lazy, none read', best_of(lambda: lazy(len(data) + 1), 3), 3,
+           baseline)
+    report('lazy, 1 in 10 read', best_of(lambda: lazy(10), 3), 3, baseline)
+    report('lazy, all read', best_of(lambda: lazy(1), 3), 3, baseline)
+
+
+def bench_identity():
+    """
+    Compares repeatedly loading the same hosts with and without an
+    identity map, keeping every result alive like a long running watcher
+    holding on to earlier lookups.
+    """
+    data = make_hosts().to_dict()
+    rounds = 5
+
+    def load_plain(i):
+        return [models.Host.new(**x) for x in data]
+
+    identity_map = identity.IdentityMap()
+
+    def load_shared(i):
+        return [identity_map.load(models.Host, x) for x in data]
+
+    print('identity map ({} hosts, {} loads)'.format(HOST_COUNT, rounds))
+    for name, factory in (('new instances', load_plain),
+                          ('identity map', load_shared)):
+        retained = allocated_bytes(factory, rounds) * rounds
+        print('{:<40} {:>10.0f} KiB retained'.format(name, retained / 1024))
+    baseline = best_of(lambda: load_plain(0), 3)
+    report('load with new instances', baseline, 3)
+    report('load through identity map', best_of(
+        lambda: load_shared(0), 3), 3, baseline)
+
+
+#: Number of hosts used by the streaming benchmark
+STREAM_HOST_COUNT = 50000
+
+
+def stream_child(mode):
+    """
+    Serializes STREAM_HOST_COUNT hosts and prints the growth of peak RSS
+    in KiB. Runs in a child process so each mode starts from scratch.
+
+    :param mode: Either "to_json" or "iter_json".
+    :type mode: str
+    """
+    hosts = make_hosts(STREAM_HOST_COUNT)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    size = 0
+    if mode == 'to_json':
+        size = len(hosts.to_json())
+    else:
+        for chunk in hosts.iter_json():
+            size += len(chunk)
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(after - before, size)
+
+
+def bench_stream():
+    """
+    Compares peak RSS of ListModel.to_json() and ListModel.iter_json().
+    """
+    print('peak RSS growth ({} hosts)'.format(STREAM_HOST_COUNT))
+    for mode in ('to_json', 'iter_json'):
+        output = subprocess.check_output(
+            [sys.executable, __file__, '--stream-child', mode])
+        growth, size = output.decode().split()
+        print('{:<40} {:>10} KiB  ({} bytes of JSON)'.format(
+            mode, growth, size))
+    hosts = make_hosts()
+    print('encoding time ({} hosts)'.format(HOST_COUNT))
+    baseline = best_of(hosts.to_json, 3)
+    report('to_json', baseline, 3)
+    report('iter_json', best_of(
+        lambda: sum(len(x) for x in hosts.iter_json()), 3), 3, baseline)
+
+
+#: All known benchmarks by name
+BENCHMARKS = {
+    'stream': bench_stream,
+    'frozen': bench_frozen,
+    'identity': bench_identity,
+    'lazy': bench_lazy,
+    'binary': bench_binary,
+    'datetime': bench_datetime,
+    'fields': bench_fields,
+    'columnar': bench_columnar,
+    'validate': bench_validate,
+    'new': bench_new,
+    'memory': bench_memory,
+    'to_dict': bench_to_dict,
+}
+
+
+def main():
+    """
+    Runs the requested benchmarks.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument(
+        'names', nargs='*', metavar='name',
+        help='Benchmarks to run: {} (default: all)'.format(
+            ', '.join(sorted(BENCHMARKS.keys()))))
+    parser.add_argument('--stream-child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.stream_child:
+        return stream_child(args.stream_child)
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error('Unknown benchmark "{}"'.format(name))
+    for name in args.names or sorted(BENCHMARKS.keys()):
+        BENCHMARKS[name]()
+        print()
+
+
+if __name__ == '__main__':
+    main()